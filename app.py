@@ -1,15 +1,16 @@
 import os
-import json
-import re
-import uuid
-from pathlib import Path
-import numpy as np
+import time
 import streamlit as st
-import chromadb
-from chromadb.utils import embedding_functions
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from sentence_transformers import SentenceTransformer
+
+from askads.config import (
+    CHROMA_DIR, META_PATH,
+    STREAM_ANSWERS, FAKE_LLM, TRACE_ENABLED, TRACE_LOG_PATH, METRICS_HOST, METRICS_PORT, ENGINE_URL,
+)
+from askads.aio import background_loop
+from askads import metrics
+from askads.client import EngineClient
+from askads.engine import AnswerParams, Engine
+from askads.tracing import configure_trace_logging
 
 # Page configuration
 st.set_page_config(
@@ -1012,323 +1013,20 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Paths
-ART_DIR = Path("rag_index")
-CHROMA_DIR = ART_DIR / "chroma_db"
-META_PATH = ART_DIR / "meta.jsonl"
-
-# Model configuration
-EMBED_MODEL_NAME = "intfloat/e5-base-v2"
-RERANKER_NAME = "BAAI/bge-reranker-base"
-
-# Priority hints for boosting
-EDU_PRIORITY_HINTS = [
-    "/education/masters-programs/ms-in-applied-data-science",
-    "/education/masters-programs",
-    "/education/",
-]
-
-LOW_PRIORITY_HINTS = [
-    "/news-events/news/",
-    "/news-events/events/",
-    "/news-events/insights/",
-    "/research/",
-    "/people/",
-]
-
-INTENT_KEYWORDS = {
-    "admissions": ["admission", "admissions", "apply", "application", "requirements", "prereq", "prerequisite", "deadline", "GRE", "TOEFL", "IELTS", "resume", "statement", "letters"],
-    "curriculum": ["core", "course", "courses", "curriculum", "credit", "unit", "track", "specialization", "elective"],
-    "capstone": ["capstone", "project", "showcase", "practicum"],
-}
-
-# PII regex patterns
-PII_EMAIL = re.compile(r'[\w\.-]+@[\w\.-]+\.\w+')
-PII_PHONE = re.compile(r'\b(?:\+?\d{1,2}\s*)?(?:\(?\d{3}\)?[\s.-]*)?\d{3}[\s.-]?\d{4}\b')
-
-# System prompt
-SYSTEM_PROMPT = """You are a helpful assistant for the University of Chicago MS in Applied Data Science.
-Answer ONLY from the provided context. Prefer content from the Education section and the program page.
-If top results are news, events, insights, research, or people pages, treat them as lower priority unless the question asks for them.
-If the required information is not present in the provided context, say you don't know and suggest checking the official MS-ADS page.
-Keep answers specific and concise. Always include bracketed citations like [1], [2] with URLs.
-Redact personal emails/phones if present in context.
-"""
-
-
-# Optional reranker (lazy loading)
-_reranker = None
-def get_reranker(name=RERANKER_NAME):
-    global _reranker
-    if _reranker is None:
-        try:
-            from sentence_transformers import CrossEncoder
-            _reranker = CrossEncoder(name)
-        except Exception as e:
-            _reranker = False
-            st.sidebar.warning(f"Reranker could not be loaded: {e}")
-    return _reranker if _reranker else None
-
-
-# E5 Embedder class for ChromaDB
-class E5Embedder(embedding_functions.EmbeddingFunction):
-    def __init__(self, model):
-        self.model = model
-    
-    def __call__(self, input: list[str]) -> list[list[float]]:
-        v = self.model.encode(["passage: " + x for x in input],
-                             normalize_embeddings=True, convert_to_numpy=True)
-        return v.tolist()
-
-
 @st.cache_resource(show_spinner="Loading RAG index and models...")
-def load_chroma_and_meta(chroma_dir: Path, embed_model_name: str):
-    """Load ChromaDB collection, metadata, embedding model, and TF-IDF vectorizer."""
-    if not chroma_dir.exists():
-        raise FileNotFoundError(
-            f"Missing ChromaDB directory. "
-            f"Ensure {chroma_dir} exists in the rag_index/ folder."
-        )
-    
-    # Load embedding model
-    model = SentenceTransformer(embed_model_name)
-    
-    # Setup ChromaDB
-    CHROMA_DIR.mkdir(parents=True, exist_ok=True)
-    client = chromadb.PersistentClient(path=str(chroma_dir))
-    
-    # Create or get collection
-    collection = client.get_or_create_collection(
-        name="msads_e5",
-        metadata={"hnsw:space": "cosine"},
-        embedding_function=E5Embedder(model)
-    )
-    
-    # Load metadata if available
-    META = []
-    id_to_meta = {}
-    id_order = []
-    
-    if META_PATH.exists():
-        with open(META_PATH, "r", encoding="utf-8") as f:
-            meta_list = [json.loads(line) for line in f]
-        
-        for i, m in enumerate(meta_list):
-            doc_id = m.get("id", str(uuid.uuid4()))
-            m["text"] = m.get("text", "")
-            m["_id"] = doc_id
-            META.append(m)
-            id_to_meta[doc_id] = m
-            id_order.append(doc_id)
-    else:
-        # Build from ChromaDB if meta.jsonl doesn't exist
-        all_data = collection.get(include=["metadatas", "documents", "ids"])
-        for i, doc_id in enumerate(all_data["ids"]):
-            meta = all_data["metadatas"][i] if all_data["metadatas"] else {}
-            meta["text"] = all_data["documents"][i] if all_data["documents"] else ""
-            meta["_id"] = doc_id
-            META.append(meta)
-            id_to_meta[doc_id] = meta
-            id_order.append(doc_id)
-    
-    # Build TF-IDF vectorizer
-    DOC_TEXTS = [
-        ((m.get("title", "") + " " + m.get("section", "") + " " + 
-          m.get("url", "") + " " + m.get("text", "")).strip())
-        for m in META
-    ]
-    tfidf = TfidfVectorizer(max_df=0.9, min_df=2, ngram_range=(1, 2))
-    X = tfidf.fit_transform(DOC_TEXTS)
-    
-    return collection, META, id_to_meta, id_order, model, tfidf, X
-
-
-def ann_dense_chroma(query: str, collection, model, topn: int):
-    """Dense retrieval using ChromaDB."""
-    qvec = model.encode(["query: " + query], normalize_embeddings=True, convert_to_numpy=True)[0].tolist()
-    res = collection.query(
-        query_embeddings=[qvec],
-        n_results=topn,
-        include=["metadatas", "documents", "distances"]
-    )
-    ids = res["ids"][0]
-    sims = [1.0 - d for d in res["distances"][0]]  # cosine similarity
-    return ids, sims
-
-
-def bm25_like_indices(query: str, tfidf, X, id_order, topn: int):
-    """Sparse retrieval using TF-IDF."""
-    qv = tfidf.transform([query])
-    sims = cosine_similarity(qv, X).ravel()
-    idx = np.argsort(-sims)[:topn]
-    return [id_order[i] for i in idx], sims[idx]
-
-
-def mmr_select(q_vec: np.ndarray, cand_vecs: np.ndarray, cand_ids: list[str], k: int = 6, lambda_: float = 0.55):
-    """Maximal Marginal Relevance for diversity."""
-    selected, pool = [], list(range(len(cand_ids)))
-    sim_q = (cand_vecs @ q_vec.reshape(-1, 1)).ravel()
-    while len(selected) < min(k, len(pool)):
-        if not selected:
-            i = int(np.argmax(sim_q[pool]))
-            selected.append(pool[i])
-            pool.pop(i)
-            continue
-        sel_vecs = cand_vecs[selected]
-        cand_idx = np.array(pool)
-        diversity = (cand_vecs[cand_idx] @ sel_vecs.T).max(axis=1)
-        scores = lambda_ * sim_q[cand_idx] - (1 - lambda_) * diversity
-        i = int(np.argmax(scores))
-        selected.append(cand_idx[i])
-        pool.remove(cand_idx[i])
-    return [cand_ids[i] for i in selected]
-
-
-def _boost_score(url: str, section: str, base: float) -> float:
-    """Boost scores based on URL patterns and section."""
-    b = base
-    if any(h in url for h in EDU_PRIORITY_HINTS):
-        b += 0.20
-    if section == "education":
-        b += 0.10
-    if any(h in url for h in LOW_PRIORITY_HINTS):
-        b -= 0.20
-    return b
-
-
-def _intent(query: str):
-    """Detect query intent from keywords."""
-    ql = query.lower()
-    for k, toks in INTENT_KEYWORDS.items():
-        if any(t in ql for t in toks):
-            return k
-    return None
-
-
-def retrieve_hybrid(query: str, collection, id_to_meta, id_order, model, 
-                    tfidf, X, k: int, shortlist: int, use_reranker: bool):
-    """Hybrid retrieval combining dense (ChromaDB) and sparse (TF-IDF) methods with MMR."""
-    # Dense retrieval (ChromaDB)
-    dense_ids, _ = ann_dense_chroma(query, collection, model, topn=shortlist)
-    
-    # Sparse retrieval (TF-IDF)
-    sparse_ids, _ = bm25_like_indices(query, tfidf, X, id_order, topn=shortlist)
-    
-    # Reciprocal Rank Fusion
-    def rrf(id_lists, c=60):
-        score = {}
-        for lst in id_lists:
-            for r, did in enumerate(lst):
-                score[did] = score.get(did, 0.0) + 1.0 / (c + r + 1)
-        return score
-    
-    fused = rrf([list(dense_ids), list(sparse_ids)])
-    
-    # Apply boosts based on intent and URL patterns
-    want = _intent(query)
-    items = []
-    for did, base in fused.items():
-        m = id_to_meta.get(did, {})
-        url = m.get("url", "") or ""
-        sec = m.get("section", "") or ""
-        if want not in ("capstone",) and ("/news-events/" in url or "/research/" in url):
-            base -= 0.25
-        boosted = _boost_score(url, sec, base)
-        items.append((did, boosted))
-    
-    items.sort(key=lambda x: -x[1])
-    
-    # MMR on a larger pool
-    pool = [did for did, _ in items[:max(k, 30)]]
-    cand_texts = [id_to_meta[did].get("text", "") for did in pool]
-    cand_vecs = model.encode(["passage: " + t for t in cand_texts], normalize_embeddings=True, convert_to_numpy=True)
-    q_vec = model.encode(["query: " + query], normalize_embeddings=True, convert_to_numpy=True).ravel().astype(np.float32)
-    mmr_ids = mmr_select(q_vec, cand_vecs, pool, k=max(k, 10), lambda_=0.55)
-    
-    hits = [dict(id_to_meta[did]) | {"_id": did} for did in mmr_ids]
-    
-    # Apply reranker if enabled
-    if use_reranker:
-        rr = get_reranker()
-        if rr:
-            pairs = [(query, h.get("text", "")) for h in hits]
-            scores = rr.predict(pairs)
-            for h, s in zip(hits, scores):
-                h["rerank_score"] = float(s)
-            hits.sort(key=lambda x: -x["rerank_score"])
-    
-    return hits[:k]
-
+def load_engine(api_key: str | None):
+    """In-process engine (index, models, caches) shared by all sessions."""
+    if TRACE_ENABLED:
+        configure_trace_logging(TRACE_LOG_PATH)
+    if METRICS_PORT:
+        metrics.start_metrics_server(METRICS_PORT, METRICS_HOST)
+    return Engine(api_key=api_key)
 
-def scrub(text: str) -> str:
-    """Redact PII from text."""
-    text = PII_EMAIL.sub("[redacted-email]", text)
-    text = PII_PHONE.sub("[redacted-phone]", text)
-    return text
 
-
-_SENT_SPLIT = re.compile(r'(?<=[\.\?!])\s+(?=[A-Z0-9])')
-
-
-def compress_text_for_query(text: str, query: str, model, top_sentences: int = 8):
-    """Compress text by selecting most relevant sentences."""
-    sents = [s.strip() for s in _SENT_SPLIT.split((text or "").strip()) if s.strip()]
-    if not sents:
-        return text or ""
-    qv = model.encode(["query: " + query], normalize_embeddings=True, convert_to_numpy=True)
-    sv = model.encode(["passage: " + s for s in sents], normalize_embeddings=True, convert_to_numpy=True)
-    sims = (sv @ qv.T).ravel()
-    keep = np.argsort(-sims)[:min(top_sentences, len(sents))]
-    keep.sort()
-    return " ".join(sents[i] for i in keep)
-
-
-def long_context_reorder(hits):
-    """Reorder hits for better context placement."""
-    if len(hits) <= 2:
-        return hits
-    L, R, out = 0, len(hits) - 1, []
-    while L <= R:
-        out.append(hits[L])
-        L += 1
-        if L <= R:
-            out.append(hits[R])
-            R -= 1
-    return out
-
-
-def build_context(hits, query: str, model):
-    """Build context string from retrieved hits with compression."""
-    hits = long_context_reorder(hits)
-    blocks = []
-    for i, h in enumerate(hits, 1):
-        title = (h.get('title', '') or '').strip()
-        url = (h.get('url', '') or '').strip()
-        sect = (h.get('section', '') or '').strip()
-        txt = compress_text_for_query(h.get('text', '') or '', query, model, top_sentences=8)
-        txt = scrub(txt)
-        blocks.append(f"[{i}] {title} • {sect} | {url}\n{txt}")
-    return "\n\n---\n\n".join(blocks)
-
-
-def generate_answer(query: str, hits, oai_client, model, temperature: float = 0.2, 
-                    model_name: str = "gpt-4o-mini"):
-    """Generate answer using OpenAI API."""
-    context = build_context(hits, query, model)
-    user_prompt = f"Question: {query}\n\nUse the context to answer with bracket citations.\n\nContext:\n{context}"
-    
-    try:
-        resp = oai_client.chat.completions.create(
-            model=model_name,
-            temperature=temperature,
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": user_prompt}
-            ]
-        )
-        return resp.choices[0].message.content.strip(), context
-    except Exception as e:
-        return f"Error generating answer: {str(e)}", None
+@st.cache_resource(show_spinner=False)
+def load_engine_client(url: str):
+    """HTTP client for a remote engine (askads.api)."""
+    return EngineClient(url)
 
 
 # Sidebar configuration with maroon gradient styling
@@ -1338,9 +1036,9 @@ st.sidebar.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-# Check for OpenAI API key
+# Check for OpenAI API key (not needed with the local fake client or a remote engine)
 api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
+if not api_key and not FAKE_LLM and not ENGINE_URL:
     api_key = st.sidebar.text_input(
         "OpenAI API Key",
         type="password",
@@ -1349,20 +1047,13 @@ if not api_key:
     if api_key:
         os.environ["OPENAI_API_KEY"] = api_key
 
-if not api_key:
+if not api_key and not FAKE_LLM and not ENGINE_URL:
     st.sidebar.error("⚠️ Please provide an OpenAI API key to use this app.")
     st.stop()
 
-try:
-    from openai import OpenAI
-    if api_key:
-        oai = OpenAI(api_key=api_key)
-    else:
-        oai = None
-except Exception as e:
-    st.sidebar.error(f"OpenAI client initialization error: {e}")
-    oai = None
-    st.stop()
+if FAKE_LLM and not ENGINE_URL:
+    st.sidebar.info("Using the local fake LLM client (ASKADS_FAKE_LLM).")
+bg = background_loop()
 
 # Model settings with maroon gradient styling
 st.sidebar.markdown("""
@@ -1375,12 +1066,16 @@ TEMPERATURE = st.sidebar.slider("Generation temperature", 0.0, 1.0, 0.2, 0.1)
 TOP_K = st.sidebar.slider("k (final retrieved)", 3, 12, 6, 1)
 SHORTLIST = st.sidebar.slider("Shortlist (pre-rerank)", 10, 100, 60, 5)
 
-# Load ChromaDB and models
+# Load the engine (in-process, or a remote askads.api when ASKADS_ENGINE_URL is set)
 try:
-    collection, META, id_to_meta, id_order, embed_model, tfidf, X = load_chroma_and_meta(
-        CHROMA_DIR, EMBED_MODEL_NAME
-    )
-    doc_count = collection.count()
+    if ENGINE_URL:
+        engine = load_engine_client(ENGINE_URL)
+    else:
+        engine = load_engine(api_key)
+    engine_info = engine.info()
+    for warning in engine_info["warnings"]:
+        st.sidebar.warning(warning)
+    doc_count = engine_info["documents"]
     st.sidebar.markdown(f"""
     <div style='background: linear-gradient(135deg, #800020 0%, #a00030 50%, #c00040 100%); color: white; padding: 1.25rem; border-radius: 12px; text-align: center; margin-top: 1rem; border: 2px solid rgba(255,255,255,0.2); box-shadow: 0 4px 15px rgba(128,0,32,0.3);'>
         <strong style='font-size: 1.1rem;'>✅ Loaded {doc_count} documents</strong>
@@ -1393,6 +1088,7 @@ except Exception as e:
         f"- {CHROMA_DIR} (ChromaDB directory)\n"
         f"- {META_PATH} (optional, metadata file)\n"
         "in the `rag_index/` folder."
+        + (f"\n\nEngine URL: {ENGINE_URL}" if ENGINE_URL else "")
     )
     st.stop()
 
@@ -1406,6 +1102,23 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
+def render_citations(sources):
+    """Subtle citations block (top 5 sources)."""
+    if not sources:
+        return
+    citations_html = '<div class="citation-section">'
+    citations_html += '<div class="citation-header">📚 References</div>'
+    for i, src in enumerate(sources[:5], 1):
+        title = (src.get('title') or '(no title)')
+        url = src.get('url') or ''
+        citations_html += '<div class="citation-item">'
+        citations_html += f'<span class="citation-number">{i}</span>'
+        citations_html += f'<a class="citation-link" href="{url}" target="_blank">{title}</a>'
+        citations_html += '</div>'
+    citations_html += '</div>'
+    st.markdown(citations_html, unsafe_allow_html=True)
+
+
 # Initialize chat history
 if "messages" not in st.session_state:
     st.session_state.messages = []
@@ -1419,19 +1132,7 @@ for message in st.session_state.messages:
                 {message["content"]}
             </div>
             """, unsafe_allow_html=True)
-            srcs = (message.get("sources") or [])[:5]
-            if srcs:
-                citations_html = '<div class="citation-section">'
-                citations_html += '<div class="citation-header">📚 References</div>'
-                for i, s in enumerate(srcs, 1):
-                    title = s.get('title') or '(no title)'
-                    url = s.get('url') or ''
-                    citations_html += '<div class="citation-item">'
-                    citations_html += f'<span class="citation-number">{i}</span>'
-                    citations_html += f'<a class="citation-link" href="{url}" target="_blank">{title}</a>'
-                    citations_html += '</div>'
-                citations_html += '</div>'
-                st.markdown(citations_html, unsafe_allow_html=True)
+            render_citations(message.get("sources") or [])
         else:
             st.markdown(message["content"])
 
@@ -1444,69 +1145,60 @@ if prompt:
     with st.chat_message("user"):
         st.markdown(prompt)
     
-    # Retrieve relevant documents
+    params = AnswerParams(k=TOP_K, shortlist=SHORTLIST, use_reranker=USE_RERANKER,
+                          temperature=TEMPERATURE, stream=STREAM_ANSWERS)
+    if ENGINE_URL:
+        events = engine.stream(prompt, **vars(params))
+    else:
+        events = bg.iterate(engine.astream(prompt, params))
+    
     with st.chat_message("assistant"):
-        with st.spinner("🔍 Searching knowledge base..."):
-            hits = retrieve_hybrid(
-                prompt,
-                collection,
-                id_to_meta,
-                id_order,
-                embed_model,
-                tfidf,
-                X,
-                k=TOP_K,
-                shortlist=SHORTLIST,
-                use_reranker=USE_RERANKER
-            )
-            
-            # Query augmentation if no education pages found
-            if not any(("/education/" in (h.get("url", "") or "") or 
-                       "ms-in-applied-data-science" in (h.get("url", "") or "")) 
-                      for h in hits):
-                aug = prompt + ' program site education admissions curriculum "MS in Applied Data Science"'
-                hits = retrieve_hybrid(
-                    aug,
-                    collection,
-                    id_to_meta,
-                    id_order,
-                    embed_model,
-                    tfidf,
-                    X,
-                    k=TOP_K,
-                    shortlist=SHORTLIST,
-                    use_reranker=USE_RERANKER
-                )
-        
-        with st.spinner("🤖 Generating answer..."):
-            ans, _ctx = generate_answer(prompt, hits, oai, embed_model, temperature=TEMPERATURE)
-            st.markdown(f"""
-            <div class="answer-container">
-                {ans}
-            </div>
-            """, unsafe_allow_html=True)
-        
-        # Subtle citations (top 5)
-        top5 = hits[:5]
-        if top5:
-            citations_html = '<div class="citation-section">'
-            citations_html += '<div class="citation-header">📚 References</div>'
-            for i, h in enumerate(top5, 1):
-                title = (h.get('title') or '(no title)')
-                url = h.get('url') or ''
-                citations_html += '<div class="citation-item">'
-                citations_html += f'<span class="citation-number">{i}</span>'
-                citations_html += f'<a class="citation-link" href="{url}" target="_blank">{title}</a>'
-                citations_html += '</div>'
-            citations_html += '</div>'
-            st.markdown(citations_html, unsafe_allow_html=True)
+        # Answer bubble above, sources rendered below as soon as retrieval is done
+        answer_slot = st.empty()
+        pieces, sources, done = [], [], None
+        try:
+            with st.spinner("🔍 Searching knowledge base..."):
+                event = next(events)
+            sources = event["sources"]
+            cached = event["cached"] in ("answer", "semantic")
+            render_citations(sources)
+            if not cached:
+                answer_slot.markdown('<div class="answer-container">🤖 Generating answer...</div>',
+                                     unsafe_allow_html=True)
+            last_paint = 0.0
+            gen_start = time.perf_counter()
+            for event in events:
+                if event["event"] == "done":
+                    done = event
+                    continue
+                if not pieces and not cached:
+                    st.session_state.last_ttft_ms = (time.perf_counter() - gen_start) * 1000
+                pieces.append(event["text"])
+                now = time.perf_counter()
+                if STREAM_ANSWERS and now - last_paint > 0.05:
+                    answer_slot.markdown(f"""
+                    <div class="answer-container">
+                        {"".join(pieces)}▌
+                    </div>
+                    """, unsafe_allow_html=True)
+                    last_paint = now
+            ans = done["answer"]
+        except Exception as e:
+            ans = f"Error generating answer: {str(e)}"
+        answer_slot.markdown(f"""
+        <div class="answer-container">
+            {ans}
+        </div>
+        """, unsafe_allow_html=True)
+    
+    if TRACE_ENABLED and done and done.get("trace"):
+        st.session_state.last_trace = done["trace"]
     
     # Add assistant response to history
     st.session_state.messages.append({
         "role": "assistant",
         "content": ans,
-        "sources": [{"title": h.get("title", ""), "url": h.get("url", ""), 
-                     "section": h.get("section", "")} for h in hits[:5]]
+        "sources": sources
     })
 
 # Sidebar info with styling
@@ -1515,10 +1207,57 @@ st.sidebar.markdown("""
 <div style='background: white; padding: 1.25rem; border-radius: 12px; box-shadow: 0 4px 15px rgba(128,0,32,0.15); border: 2px solid rgba(128,0,32,0.1);'>
     <h3 style='background: linear-gradient(135deg, #800020 0%, #a00030 50%, #c00040 100%); -webkit-background-clip: text; -webkit-text-fill-color: transparent; background-clip: text; margin-top: 0; font-weight: 700;'>📊 Index Info</h3>
     <p style='color: #333;'><strong>Documents:</strong> {}</p>
-    <p style='color: #333;'><strong>Database:</strong> ChromaDB</p>
-    <p style='color: #333;'><strong>Collection:</strong> msads_e5</p>
+    <p style='color: #333;'><strong>Dense backend:</strong> {}</p>
+    <p style='color: #333;'><strong>Inference:</strong> {}</p>
+    <p style='color: #333;'><strong>Collection:</strong> {}</p>
 </div>
-""".format(collection.count()), unsafe_allow_html=True)
+""".format(engine_info["documents"], "FAISS" if engine_info["dense_backend"] == "faiss" else "ChromaDB",
+           engine_info["inference_backend"], engine_info["collection"]), unsafe_allow_html=True)
+if ENGINE_URL:
+    st.sidebar.caption(f"Engine: {ENGINE_URL}")
+
+if "last_ttft_ms" in st.session_state:
+    st.sidebar.caption(f"Last time to first token: {st.session_state.last_ttft_ms:.0f} ms")
+
+if "last_trace" in st.session_state:
+    with st.sidebar.expander("Last request trace"):
+        trace = st.session_state.last_trace
+        st.caption(
+            f"Request {trace['request_id']}: {trace['total_ms']:.0f} ms total, "
+            f"{trace['wall_ms']:.0f} ms across stages (overlapping rows ran concurrently)"
+        )
+        if trace["counts"]:
+            st.caption(" · ".join(f"{k}: {v}" for k, v in trace["counts"].items()))
+        st.dataframe(
+            [{"stage": r["stage"], "start ms": r["start_ms"], "ms": r["ms"], "thread": r["thread"],
+              "details": ", ".join(f"{k}={v}" for k, v in r.items()
+                                   if k not in ("stage", "start_ms", "ms", "thread"))}
+             for r in trace["spans"]],
+            hide_index=True,
+        )
+        st.json(trace["attrs"], expanded=False)
+
+engine_stats = engine.stats()
+if engine_stats["reranker_error"]:
+    st.sidebar.warning(f"Reranker could not be loaded: {engine_stats['reranker_error']}")
+elif USE_RERANKER:
+    rr_stats = engine_stats["reranker"]
+    if rr_stats["batches"]:
+        st.sidebar.caption(
+            f"Reranker: {rr_stats['pairs']} pairs in {rr_stats['batches']} batches "
+            f"(avg {rr_stats['avg_batch']}), {rr_stats['queued']} queued"
+        )
+    if rr_stats["cache"]["hits"] or rr_stats["cache"]["misses"]:
+        rc = rr_stats["cache"]
+        st.sidebar.caption(
+            f"Rerank score cache: {rc['hits']} hits / {rc['misses']} misses "
+            f"({rc['hit_rate']:.0%}), {rc['size']} scores held"
+        )
+
+cache_stats = {name: engine_stats[name] for name in ("retrieval", "answer", "semantic") if name in engine_stats}
+if cache_stats:
+    with st.sidebar.expander("Cache stats"):
+        st.json(cache_stats)
 
 # Footer
 st.markdown("""
@@ -0,0 +1 @@
+"""AskADS retrieval pipeline helpers shared by the Streamlit app and offline tools."""
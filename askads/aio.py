@@ -0,0 +1,65 @@
+"""A process-wide asyncio loop running in a daemon thread.
+
+Streamlit scripts are synchronous and rerun from the top on every
+interaction, so async clients (AsyncOpenAI) are kept on one long-lived loop
+where their connection pools survive between requests.  ``run`` waits for a
+coroutine, ``submit`` fires one off, and ``iterate`` turns an async generator
+into a plain iterator for the calling thread.
+"""
+import asyncio
+import queue
+import threading
+
+_DONE = object()
+
+
+class BackgroundLoop:
+    """An event loop served by a dedicated daemon thread."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="askads-aio", daemon=True)
+        self.thread.start()
+
+    def submit(self, coro):
+        """Schedule coro on the loop; returns a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout: float | None = None):
+        """Run coro on the loop and wait for its result."""
+        return self.submit(coro).result(timeout)
+
+    def iterate(self, agen):
+        """Consume an async generator on the loop, yielding its items in this thread."""
+        q = queue.Queue()
+
+        async def pump():
+            try:
+                async for item in agen:
+                    q.put((True, item))
+            except BaseException as e:  # re-raised in the consuming thread
+                q.put((False, e))
+            else:
+                q.put((True, _DONE))
+
+        self.submit(pump())
+        while True:
+            ok, item = q.get()
+            if not ok:
+                raise item
+            if item is _DONE:
+                return
+            yield item
+
+
+_background = None
+_background_lock = threading.Lock()
+
+
+def background_loop() -> BackgroundLoop:
+    """The shared background loop, started on first use."""
+    global _background
+    with _background_lock:
+        if _background is None:
+            _background = BackgroundLoop()
+        return _background
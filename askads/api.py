@@ -0,0 +1,106 @@
+"""HTTP API for the engine: async ``/retrieve`` and ``/answer`` endpoints.
+
+One Engine (index, embedder, reranker service, caches) is loaded per worker
+process at startup and shared by all requests; blocking work runs on the
+engine's thread pool so handlers never stall the event loop.  ``/answer``
+returns the final answer; ``/answer/stream`` sends the engine's events as
+newline-delimited JSON.  ``stream`` in the body controls the OpenAI call.
+
+    python -m askads.api --host 127.0.0.1 --port 8000
+    ASKADS_ENGINE_URL=http://127.0.0.1:8000 streamlit run app.py
+"""
+import argparse
+import json
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+
+from askads import metrics
+from askads.config import METRICS_HOST, METRICS_PORT, STREAM_ANSWERS, TRACE_ENABLED, TRACE_LOG_PATH
+from askads.engine import AnswerParams, Engine
+from askads.tracing import configure_trace_logging
+
+
+class RetrieveRequest(BaseModel):
+    question: str = Field(min_length=1)
+    k: int = Field(6, ge=1, le=50)
+    shortlist: int = Field(60, ge=1, le=500)
+    use_reranker: bool = True
+
+
+class AnswerRequest(RetrieveRequest):
+    temperature: float = Field(0.2, ge=0.0, le=2.0)
+    stream: bool = STREAM_ANSWERS
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if TRACE_ENABLED:
+        configure_trace_logging(TRACE_LOG_PATH)
+    if METRICS_PORT:
+        metrics.start_metrics_server(METRICS_PORT, METRICS_HOST)
+    app.state.engine = Engine(api_key=os.getenv("OPENAI_API_KEY"))
+    yield
+
+
+app = FastAPI(title="AskADS engine", lifespan=lifespan)
+
+
+def _params(body: RetrieveRequest) -> AnswerParams:
+    return AnswerParams(**body.model_dump(exclude={"question"}))
+
+
+@app.get("/healthz")
+async def healthz():
+    return {"ok": True}
+
+
+@app.get("/info")
+async def info(request: Request):
+    return request.app.state.engine.info()
+
+
+@app.get("/stats")
+async def stats(request: Request):
+    return request.app.state.engine.stats()
+
+
+@app.post("/retrieve")
+async def retrieve(body: RetrieveRequest, request: Request):
+    return await request.app.state.engine.aretrieve(body.question, _params(body))
+
+
+@app.post("/answer")
+async def answer(body: AnswerRequest, request: Request):
+    """The final answer, sources and trace as one JSON object."""
+    return await request.app.state.engine.aanswer(body.question, _params(body))
+
+
+@app.post("/answer/stream")
+async def answer_stream(body: AnswerRequest, request: Request):
+    """Sources, tokens and the final answer as newline-delimited JSON events."""
+    engine = request.app.state.engine
+
+    async def ndjson():
+        async for event in engine.astream(body.question, _params(body)):
+            yield json.dumps(event, ensure_ascii=False, default=str) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+def main(argv=None):
+    import uvicorn
+
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8000)
+    ap.add_argument("--workers", type=int, default=1, help="processes, each with its own engine")
+    args = ap.parse_args(argv)
+    uvicorn.run("askads.api:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Answer a JSONL file of questions in bulk (precomputed FAQ answers).
+
+Each input line is ``{"question": ...}`` with an optional ``"id"``.  Every
+stage runs once for the whole batch instead of once per question: a single
+batched encode, one matrix product each for dense and BM25 search, MMR
+over all candidate pools at once, one rerank request for every
+(question, passage) pair, then ``AsyncOpenAI`` calls with bounded
+concurrency.  Questions with no program pages go through a second, smaller
+round with the augmented query (the ``sequential`` fallback).  Output
+lines are written as answers complete and hold the answer, its citations
+and the question's stage timings: an even share of each batched retrieval
+stage (across the questions in that round) plus its own generation stages.
+Batch-wide stage totals are printed at the end.
+
+    python -m askads.batch questions.jsonl --out answers.jsonl --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+
+from askads.config import CHROMA_DIR, EMBED_MODEL_NAME, SENT_INDEX_DIR
+from askads.pipeline import (
+    _POOL, agenerate_answer, augment_query, fuse_candidates, gather_passage_vecs, has_program_hit,
+    make_query_contexts, mmr_select_many, rerank_many,
+)
+from askads.timing import StageTimer, stage
+
+
+@dataclass
+class BatchItem:
+    id: str
+    question: str
+    timer: StageTimer = field(default_factory=StageTimer)
+    qctx: object = None
+    hits: list = field(default_factory=list)
+    used_fallback: bool = False
+
+
+def load_questions(path: Path) -> list[BatchItem]:
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            if line.strip():
+                row = json.loads(line)
+                items.append(BatchItem(id=str(row.get("id", n)), question=row["question"]))
+    return items
+
+
+def retrieve_round(qctxs, resources, k: int, shortlist: int, use_reranker: bool, timer: StageTimer):
+    """Hits for every query context: vectorized dense and sparse search, per-query MMR, one rerank."""
+    (collection, dense, problems, id_to_meta, id_order,
+     model, tfidf, bm25, emb, id_to_row) = resources
+
+    def dense_search():
+        with stage(timer, "dense", queries=len(qctxs)):
+            return dense.search_many(np.stack([c.vec for c in qctxs]), shortlist)
+
+    # One dense matrix product overlapped with one sparse one
+    dense_future = _POOL.submit(dense_search)
+    with stage(timer, "sparse", queries=len(qctxs)):
+        sparse_res = bm25.search_many([c.term_ids for c in qctxs], shortlist)
+    dense_res = dense_future.result()
+    pools = [
+        fuse_candidates(c, [d_ids], [[id_order[i] for i in s_rows]], id_to_meta)[:max(k, 30)]
+        for c, (d_ids, _), (s_rows, _) in zip(qctxs, dense_res, sparse_res)
+    ]
+    with stage(timer, "mmr", queries=len(qctxs)):
+        cand_vecs = [gather_passage_vecs(pool, emb, id_to_row, id_to_meta, model) for pool in pools]
+        selections = mmr_select_many(np.stack([c.vec for c in qctxs]), cand_vecs, pools, k=max(k, 10), lambda_=0.55)
+    hit_lists = [[dict(id_to_meta[did]) | {"_id": did} for did in ids] for ids in selections]
+    if use_reranker:
+        # No timeout: a bulk run waits for the reranker instead of skipping it
+        rerank_many(qctxs, hit_lists, timeout=None, timer=timer)
+    return [hits[:k] for hits in hit_lists]
+
+
+def retrieve_batch(items: list[BatchItem], resources, k: int = 6, shortlist: int = 60,
+                   use_reranker: bool = True, timer: StageTimer | None = None):
+    """Fill in qctx, hits and used_fallback for every item.
+    
+    Batched stages are timed once on timer; each item's timer gets its share.
+    """
+    model, tfidf = resources[5], resources[6]
+    timer = timer if timer is not None else StageTimer()
+    start = len(timer.records)
+    qctxs = make_query_contexts([it.question for it in items], model, tfidf, timer)
+    for it, qctx in zip(items, qctxs):
+        qctx.timer = it.timer
+        it.qctx = qctx
+    for it, hits in zip(items, retrieve_round(qctxs, resources, k, shortlist, use_reranker, timer)):
+        it.hits = hits
+    for it in items:
+        it.timer.share(timer, start, len(items))
+    misses = [it for it in items if not has_program_hit(it.hits)]
+    if misses:
+        start = len(timer.records)
+        aug = make_query_contexts([augment_query(it.question) for it in misses], model, tfidf, timer)
+        for it, qctx in zip(misses, aug):
+            qctx.timer = it.timer
+        for it, hits in zip(misses, retrieve_round(aug, resources, k, shortlist, use_reranker, timer)):
+            it.hits, it.used_fallback = hits, True
+        for it in misses:
+            it.timer.share(timer, start, len(misses))
+
+
+async def answer_batch(items: list[BatchItem], llm, model, sent_index=None, temperature: float = 0.2,
+                       concurrency: int = 8, on_done=None):
+    """Generate answers with at most ``concurrency`` LLM calls in flight; on_done(item, answer, ok) per item."""
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(it: BatchItem):
+        async with sem:
+            answer, context = await agenerate_answer(it.qctx, it.hits, llm, model,
+                                                     temperature=temperature, sent_index=sent_index)
+        if on_done:
+            on_done(it, answer, context is not None)
+
+    await asyncio.gather(*(one(it) for it in items))
+
+
+def result_row(it: BatchItem, answer: str, ok: bool) -> dict:
+    return {
+        "id": it.id,
+        "question": it.question,
+        "answer": answer,
+        "ok": ok,
+        "sources": [{"title": h.get("title", ""), "url": h.get("url", ""),
+                     "section": h.get("section", "")} for h in it.hits[:5]],
+        "used_fallback": it.used_fallback,
+        "timings_ms": {name: round(ms, 2) for name, ms in it.timer.summary().items()},
+        "counts": dict(it.timer.counts),
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    ap.add_argument("questions", type=Path, help="JSONL with a 'question' (and optional 'id') per line")
+    ap.add_argument("--out", type=Path, default=Path("answers.jsonl"))
+    ap.add_argument("--k", type=int, default=6)
+    ap.add_argument("--shortlist", type=int, default=60)
+    ap.add_argument("--no-reranker", action="store_true")
+    ap.add_argument("--temperature", type=float, default=0.2)
+    ap.add_argument("--concurrency", type=int, default=8, help="LLM calls in flight")
+    args = ap.parse_args(argv)
+
+    from askads.engine import make_llm_client
+    from askads.resources import load_index, load_sentence_index, open_index_bundle
+
+    items = load_questions(args.questions)
+    if not items:
+        print(f"No questions in {args.questions}", file=sys.stderr)
+        return 1
+    bundle = open_index_bundle(EMBED_MODEL_NAME)
+    resources = load_index(CHROMA_DIR, EMBED_MODEL_NAME, bundle)
+    try:
+        sent_index = load_sentence_index(EMBED_MODEL_NAME, SENT_INDEX_DIR, bundle)
+    except (OSError, ValueError, KeyError):
+        sent_index = None
+
+    timer = StageTimer()
+    t0 = time.perf_counter()
+    retrieve_batch(items, resources, k=args.k, shortlist=args.shortlist,
+                   use_reranker=not args.no_reranker, timer=timer)
+    retrieval_s = time.perf_counter() - t0
+
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    failed = 0
+    with open(args.out, "w", encoding="utf-8") as out:
+        def write(it, answer, ok):
+            nonlocal failed
+            failed += not ok
+            out.write(json.dumps(result_row(it, answer, ok), ensure_ascii=False) + "\n")
+
+        with stage(timer, "answer", concurrency=args.concurrency):
+            asyncio.run(answer_batch(items, make_llm_client(), resources[5], sent_index,
+                                     temperature=args.temperature, concurrency=args.concurrency,
+                                     on_done=write))
+    total_s = time.perf_counter() - t0
+
+    print(json.dumps({
+        "questions": len(items),
+        "fallbacks": sum(it.used_fallback for it in items),
+        "failed": failed,
+        "retrieval_s": round(retrieval_s, 3),
+        "total_s": round(total_s, 3),
+        "questions_per_s": round(len(items) / total_s, 2),
+        "stage_ms": {name: round(ms, 2) for name, ms in timer.summary().items()},
+    }))
+    return 0 if not failed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
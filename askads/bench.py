@@ -0,0 +1,196 @@
+"""Offline retrieval benchmark: answer quality and per-stage latency on a gold set.
+
+Each line of the gold file is ``{"question": ..., "relevant_urls": [...]}``.
+Every question runs through the same pipeline as the app (query encoding,
+hybrid retrieval with the augmented-query fallback, context compression and
+generation) with the LLM replaced by ``FakeChatClient``.  Ranked hits are
+collapsed to distinct URLs and scored with recall@k, MRR and nDCG@k, and the
+StageTimer records give p50/p95/p99 per stage.  The report is written as
+JSON; gate flags turn it into a pass/fail exit code for CI.
+
+    python -m askads.bench --gold bench/gold.jsonl --out bench/results.json --min-recall 0.6
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from askads.config import CHROMA_DIR, EMBED_MODEL_NAME, FALLBACK_MODE, INFERENCE_BACKEND, SENT_INDEX_DIR
+from askads.llm import FakeChatClient
+from askads.pipeline import augment_query, generate_answer, make_query_contexts, retrieve_with_fallback
+from askads.reranker import reranker_service
+from askads.timing import StageTimer
+
+PERCENTILES = (50, 95, 99)
+
+
+def load_gold(path: Path) -> list[dict]:
+    """Gold questions with their relevant URLs."""
+    with open(path, "r", encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    for r in rows:
+        if not r.get("question") or not r.get("relevant_urls"):
+            raise ValueError(f"Gold row needs question and relevant_urls: {r}")
+    return rows
+
+
+def ranked_urls(hits) -> list[str]:
+    """Distinct URLs in rank order (several chunks of one page count once)."""
+    return list(dict.fromkeys(h.get("url", "") for h in hits))
+
+
+def recall_at_k(urls: list[str], relevant: set, k: int) -> float:
+    return len(set(urls[:k]) & relevant) / len(relevant)
+
+
+def reciprocal_rank(urls: list[str], relevant: set) -> float:
+    for i, u in enumerate(urls, 1):
+        if u in relevant:
+            return 1.0 / i
+    return 0.0
+
+
+def ndcg_at_k(urls: list[str], relevant: set, k: int) -> float:
+    dcg = sum(1.0 / np.log2(i + 1) for i, u in enumerate(urls[:k], 1) if u in relevant)
+    ideal = sum(1.0 / np.log2(i + 1) for i in range(1, min(len(relevant), k) + 1))
+    return float(dcg / ideal)
+
+
+def latency_summary(samples: dict[str, list[float]]) -> dict:
+    """p50/p95/p99/mean milliseconds per stage."""
+    out = {}
+    for name, values in samples.items():
+        v = np.asarray(values, dtype=np.float64)
+        out[name] = {f"p{p}": round(float(np.percentile(v, p)), 2) for p in PERCENTILES}
+        out[name]["mean"] = round(float(v.mean()), 2)
+        out[name]["n"] = int(v.size)
+    return out
+
+
+def run_benchmark(gold: list[dict], resources, sent_index=None, k: int = 6, shortlist: int = 60,
+                  use_reranker: bool = True, mode: str = FALLBACK_MODE, repeat: int = 1,
+                  warmup: int = 1) -> dict:
+    """Run every gold question ``repeat`` times and score the last run of each."""
+    (collection, dense, problems, id_to_meta, id_order,
+     model, tfidf, bm25, emb, id_to_row) = resources
+    llm = FakeChatClient()
+
+    def run_one(question: str):
+        # Score every pair afresh so repeats measure the model, not the score cache
+        reranker_service().cache.clear()
+        timer = StageTimer()
+        t0 = time.perf_counter()
+        if mode == "sequential":
+            qctx, = make_query_contexts([question], model, tfidf, timer)
+            aug_qctx = None
+        else:
+            qctx, aug_qctx = make_query_contexts([question, augment_query(question)], model, tfidf, timer)
+        hits, used_fallback = retrieve_with_fallback(
+            qctx, dense, id_to_meta, id_order, model, bm25, emb, id_to_row,
+            k=k, shortlist=shortlist, use_reranker=use_reranker, tfidf=tfidf, aug_qctx=aug_qctx, mode=mode,
+        )
+        generate_answer(qctx, hits, llm, model, sent_index=sent_index)
+        total_ms = (time.perf_counter() - t0) * 1000
+        return hits, used_fallback, timer, total_ms
+
+    # Load models and touch caches before timing
+    for g in gold[:warmup]:
+        run_one(g["question"])
+
+    samples = {"total": []}
+    per_question = []
+    for g in gold:
+        for _ in range(max(1, repeat)):
+            hits, used_fallback, timer, total_ms = run_one(g["question"])
+            samples["total"].append(total_ms)
+            for name, ms in timer.summary().items():
+                samples.setdefault(name, []).append(ms)
+        urls = ranked_urls(hits)
+        relevant = set(g["relevant_urls"])
+        per_question.append({
+            "question": g["question"],
+            "recall": recall_at_k(urls, relevant, k),
+            "rr": reciprocal_rank(urls, relevant),
+            "ndcg": ndcg_at_k(urls, relevant, k),
+            "used_fallback": used_fallback,
+            "urls": urls,
+        })
+
+    n = len(per_question)
+    return {
+        "config": {
+            "questions": n, "k": k, "shortlist": shortlist, "use_reranker": use_reranker,
+            "fallback_mode": mode, "repeat": repeat, "inference_backend": INFERENCE_BACKEND,
+            "dense_backend": dense.name, "docs": len(id_order),
+        },
+        "quality": {
+            f"recall@{k}": round(sum(q["recall"] for q in per_question) / n, 4),
+            "mrr": round(sum(q["rr"] for q in per_question) / n, 4),
+            f"ndcg@{k}": round(sum(q["ndcg"] for q in per_question) / n, 4),
+        },
+        "latency_ms": latency_summary(samples),
+        "per_question": per_question,
+    }
+
+
+def check_gates(report: dict, min_recall=None, min_mrr=None, min_ndcg=None, max_p95_ms=None) -> list[str]:
+    """Failed gate descriptions (empty when every configured gate passes)."""
+    k = report["config"]["k"]
+    q = report["quality"]
+    failures = []
+    for name, value, floor in ((f"recall@{k}", q[f"recall@{k}"], min_recall),
+                               ("mrr", q["mrr"], min_mrr),
+                               (f"ndcg@{k}", q[f"ndcg@{k}"], min_ndcg)):
+        if floor is not None and value < floor:
+            failures.append(f"{name} {value:.4f} < {floor}")
+    p95 = report["latency_ms"]["total"]["p95"]
+    if max_p95_ms is not None and p95 > max_p95_ms:
+        failures.append(f"total p95 {p95:.1f} ms > {max_p95_ms} ms")
+    return failures
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    ap.add_argument("--gold", type=Path, default=Path("bench/gold.jsonl"))
+    ap.add_argument("--out", type=Path, default=Path("bench/results.json"))
+    ap.add_argument("--k", type=int, default=6)
+    ap.add_argument("--shortlist", type=int, default=60)
+    ap.add_argument("--no-reranker", action="store_true")
+    ap.add_argument("--fallback-mode", default=FALLBACK_MODE, choices=["speculative", "merged", "sequential"])
+    ap.add_argument("--repeat", type=int, default=3, help="timed runs per question")
+    ap.add_argument("--min-recall", type=float)
+    ap.add_argument("--min-mrr", type=float)
+    ap.add_argument("--min-ndcg", type=float)
+    ap.add_argument("--max-p95-ms", type=float, help="ceiling on end-to-end p95 latency")
+    args = ap.parse_args(argv)
+
+    from askads.resources import load_index, load_sentence_index, open_index_bundle
+
+    gold = load_gold(args.gold)
+    bundle = open_index_bundle(EMBED_MODEL_NAME)
+    resources = load_index(CHROMA_DIR, EMBED_MODEL_NAME, bundle)
+    try:
+        sent_index = load_sentence_index(EMBED_MODEL_NAME, SENT_INDEX_DIR, bundle)
+    except (OSError, ValueError, KeyError):
+        sent_index = None
+
+    report = run_benchmark(gold, resources, sent_index, k=args.k, shortlist=args.shortlist,
+                           use_reranker=not args.no_reranker, mode=args.fallback_mode, repeat=args.repeat)
+    failures = check_gates(report, args.min_recall, args.min_mrr, args.min_ndcg, args.max_p95_ms)
+    report["gates"] = {"failures": failures, "passed": not failures}
+
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    args.out.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(json.dumps(report["quality"]))
+    for name, row in report["latency_ms"].items():
+        print(f"{name:>14}  p50 {row['p50']:8.1f}  p95 {row['p95']:8.1f}  p99 {row['p99']:8.1f} ms")
+    for f in failures:
+        print(f"GATE FAILED: {f}", file=sys.stderr)
+    return 0 if not failures else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""Okapi BM25 over an inverted index (postings lists keyed by term id).
+
+Postings are stored term-major in CSC layout: the documents containing
+term ``t`` are ``docs[indptr[t]:indptr[t + 1]]``.  Each posting carries its
+precomputed BM25 contribution, so a query only touches the postings of its
+own terms: gather, sum per document, then top-k with ``argpartition``.
+"""
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer
+
+K1 = 1.2
+B = 0.75
+
+
+class BM25Index:
+    """Impact-scored postings lists for BM25 retrieval."""
+
+    def __init__(self, indptr: np.ndarray, docs: np.ndarray, weights: np.ndarray, n_docs: int):
+        self.indptr = indptr
+        self.docs = docs
+        self.weights = weights
+        self.n_docs = int(n_docs)
+        self._postings = None  # CSR (terms x docs) view, built on first search_many
+
+    @classmethod
+    def from_counts(cls, counts, k1: float = K1, b: float = B):
+        """Build from a (docs x terms) term-count matrix."""
+        counts = sparse.csr_matrix(counts, dtype=np.float32)
+        n_docs = counts.shape[0]
+        doc_len = np.asarray(counts.sum(axis=1)).ravel()
+        avgdl = float(doc_len.mean()) if n_docs else 0.0
+        norm = k1 * (1.0 - b + b * doc_len / (avgdl or 1.0))
+
+        # Per-posting BM25 term weight, computed while still doc-major
+        tf = counts.data
+        row_of = np.repeat(np.arange(n_docs), np.diff(counts.indptr))
+        impact = counts.copy()
+        impact.data = (tf * (k1 + 1.0) / (tf + norm[row_of])).astype(np.float32)
+
+        post = impact.tocsc()
+        post.sort_indices()
+        df = np.diff(post.indptr)
+        idf = np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        post.data *= np.repeat(idf, df)
+        return cls(post.indptr.astype(np.int64), post.indices.astype(np.int32),
+                   post.data.astype(np.float32), n_docs)
+
+    @classmethod
+    def from_texts(cls, doc_texts: list[str], vocabulary: dict, ngram_range=(1, 2)):
+        """Count terms of doc_texts over a fixed vocabulary and build the index."""
+        cv = CountVectorizer(vocabulary=vocabulary, ngram_range=ngram_range)
+        return cls.from_counts(cv.transform(doc_texts))
+
+    def search(self, term_ids, topn: int):
+        """Return (rows, scores) of the topn documents sharing a term with the query."""
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        if term_ids.size == 0 or topn <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        # Repeated query terms count once per occurrence
+        terms, qtf = np.unique(term_ids, return_counts=True)
+        starts, ends = self.indptr[terms], self.indptr[terms + 1]
+        lens = ends - starts
+        if lens.sum() == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        pos = np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)])
+        rows = self.docs[pos]
+        contrib = self.weights[pos] * np.repeat(qtf, lens).astype(np.float32)
+
+        uniq, inv = np.unique(rows, return_inverse=True)
+        scores = np.bincount(inv, weights=contrib).astype(np.float32)
+        return _top(uniq, scores, topn)
+
+    def search_many(self, term_id_lists, topn: int):
+        """``search`` for several queries at once: one (queries x terms) @ (terms x docs) product."""
+        if self._postings is None:
+            self._postings = sparse.csr_matrix((self.weights, self.docs, self.indptr),
+                                               shape=(len(self.indptr) - 1, self.n_docs))
+        lists = [np.asarray(t, dtype=np.int64) for t in term_id_lists]
+        # Duplicate (query, term) entries are summed, i.e. repeated terms count once per occurrence
+        q = sparse.csr_matrix(
+            (np.ones(sum(len(t) for t in lists)),
+             (np.repeat(np.arange(len(lists)), [len(t) for t in lists]), np.concatenate(lists or [[]]))),
+            shape=(len(lists), self._postings.shape[0]),
+        )
+        scores = (q @ self._postings).tocsr()
+        scores.sort_indices()
+        out = []
+        for i in range(len(lists)):
+            lo, hi = scores.indptr[i], scores.indptr[i + 1]
+            if topn <= 0 or lo == hi:
+                out.append((np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)))
+                continue
+            out.append(_top(scores.indices[lo:hi].astype(np.int64), scores.data[lo:hi].astype(np.float32), topn))
+        return out
+
+
+def _top(rows: np.ndarray, scores: np.ndarray, topn: int):
+    """The topn (rows, scores), highest score first."""
+    if len(rows) > topn:
+        part = np.sort(np.argpartition(-scores, topn - 1)[:topn])
+    else:
+        part = np.arange(len(rows))
+    order = part[np.argsort(-scores[part], kind="stable")]
+    return rows[order], scores[order]
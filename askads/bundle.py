@@ -0,0 +1,271 @@
+"""Packed index bundle: every query-time artifact in one memory-mappable file.
+
+``rag_index/index.bundle`` holds the passage-embedding matrix, the metadata
+store (id table, columns and text blob), the sparse index (TF-IDF
+vocabulary, CSR matrix and BM25 postings) and, if built, the sentence
+index.  Arrays are stored raw at 64-byte aligned offsets and viewed straight
+out of one read-only ``mmap``, so opening the bundle costs a header read
+and several worker processes share the same page cache.  Cold start skips
+JSONL parsing, TF-IDF fitting and the Chroma client entirely.
+
+Layout::
+
+    "ASKADSBN" | u32 version | u32 0 | u64 manifest offset | u64 manifest size
+    section ... section                        (64-byte aligned)
+    manifest (JSON)
+
+The manifest records the format version, the embedding and reranker model
+names, the fingerprint of the ``meta.jsonl`` the bundle was built from and,
+for each section, its offset, size, dtype/shape and sha256.  A bundle for
+another model or an older ``meta.jsonl`` is stale and ignored.  Opening only
+checks that every section lies within the file (a truncated copy is
+rejected); the sha256s are checked by ``verify``, which reads every byte.
+
+    python -m askads.bundle build
+    python -m askads.bundle verify
+"""
+import argparse
+import hashlib
+import json
+import os
+import struct
+import time
+from pathlib import Path
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from askads.bm25 import BM25Index
+from askads.config import (
+    BUNDLE_PATH, EMBED_MODEL_NAME, FAISS_PATH, META_PATH, RERANKER_NAME, SENT_INDEX_DIR, SPARSE_INDEX_DIR,
+)
+from askads.corpus import iter_meta, meta_fingerprint
+from askads.dense import read_flat_faiss
+from askads.meta_store import MetaStore
+from askads.sentence_index import INDEX_VERSION as SENT_INDEX_VERSION
+from askads.sentence_index import SentenceIndex
+from askads.sparse_index import INDEX_FILE as SPARSE_INDEX_FILE
+from askads.sparse_index import BM25_ARRAYS, load_sparse_index
+
+BUNDLE_VERSION = 1
+MAGIC = b"ASKADSBN"
+HEADER = struct.Struct("<8sIIQQ")
+ALIGN = 64
+
+
+class IndexBundle:
+    """A read-only, memory-mapped view of an index bundle."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            head = f.read(HEADER.size)
+            if len(head) < HEADER.size:
+                raise ValueError(f"{self.path} is not an index bundle")
+            magic, version, _, offset, size = HEADER.unpack(head)
+            if magic != MAGIC:
+                raise ValueError(f"{self.path} is not an index bundle")
+            if version != BUNDLE_VERSION:
+                raise ValueError(f"Unsupported index bundle version: {version}")
+            if offset + size > os.fstat(f.fileno()).st_size:
+                raise ValueError(f"{self.path} is truncated (manifest)")
+            f.seek(offset)
+            self.manifest = json.loads(f.read(size).decode("utf-8"))
+        self.sections = self.manifest["sections"]
+        self._mm = np.memmap(self.path, dtype=np.uint8, mode="r")
+        for name, s in self.sections.items():
+            if s["offset"] + s["nbytes"] > len(self._mm):
+                raise ValueError(f"{self.path} is truncated (section {name})")
+
+    def _bytes(self, name: str) -> np.ndarray:
+        s = self.sections[name]
+        return self._mm[s["offset"]:s["offset"] + s["nbytes"]]
+
+    def array(self, name: str) -> np.ndarray:
+        """A section as a zero-copy array view."""
+        s = self.sections[name]
+        if not s["nbytes"]:
+            return np.zeros(s["shape"], dtype=s["dtype"])
+        return self._bytes(name).view(s["dtype"]).reshape(s["shape"])
+
+    def json(self, name: str):
+        return json.loads(bytes(self._bytes(name)).decode("utf-8"))
+
+    def has(self, name: str) -> bool:
+        return name in self.sections
+
+    def stale_reason(self, model_name: str, meta_path: Path | None = None) -> str | None:
+        """Why the bundle does not match the configured model and meta.jsonl, or None if it does."""
+        if self.manifest.get("embed_model") != model_name:
+            return f"built for {self.manifest.get('embed_model')}, not {model_name}"
+        if meta_path is not None and Path(meta_path).exists():
+            if self.manifest.get("meta_fingerprint") != meta_fingerprint(meta_path):
+                return f"older than {meta_path}"
+        return None
+
+    def verify(self) -> list[str]:
+        """Sections whose sha256 does not match the manifest (reads the whole file)."""
+        problems = []
+        for name, s in self.sections.items():
+            if hashlib.sha256(self._bytes(name)).hexdigest() != s["sha256"]:
+                problems.append(f"{name}: checksum mismatch")
+        return problems
+
+    def vectors(self) -> np.ndarray:
+        """Passage embeddings, float32, rows in id order."""
+        return self.array("vectors")
+
+    def meta_store(self) -> MetaStore:
+        info = self.json("meta")
+        return MetaStore(info["fields"], info["values"], self.array("meta_codes"),
+                         self.array("meta_offsets"), self.array("meta_texts"))
+
+    def sparse_index(self):
+        """(tfidf, X, bm25) over the bundle's arrays, as ``read_sparse_index`` returns them."""
+        info = self.json("tfidf")
+        X = sparse.csr_matrix(tuple(self.array(f"X_{n}") for n in ("data", "indices", "indptr")),
+                              shape=tuple(info["shape"]), copy=False)
+        bm25 = BM25Index(*(self.array(f"bm25_{n}") for n in BM25_ARRAYS), n_docs=info["shape"][0])
+        params = {k: tuple(v) if isinstance(v, list) else v for k, v in info["params"].items()}
+        tfidf = TfidfVectorizer(**params)
+        # Terms are newline-separated in id order: much faster to load than a JSON object
+        terms = bytes(self._bytes("tfidf_terms")).decode("utf-8")
+        tfidf.vocabulary_ = dict(zip(terms.split("\n"), range(len(self.array("tfidf_idf"))))) if terms else {}
+        tfidf.idf_ = np.asarray(self.array("tfidf_idf"), dtype=np.float64)
+        return tfidf, X, bm25
+
+    def sentence_index(self) -> SentenceIndex | None:
+        if not self.has("sentences"):
+            return None
+        return SentenceIndex.from_parts(self.json("sentences"), self.array("sent_vectors"))
+
+
+def open_bundle(path: Path = BUNDLE_PATH, model_name: str = EMBED_MODEL_NAME, meta_path: Path | None = META_PATH):
+    """(bundle, problem): the bundle if it exists and is current, else None and why not."""
+    if not Path(path).exists():
+        return None, None
+    try:
+        bundle = IndexBundle(path)
+    except (OSError, ValueError, KeyError) as e:
+        return None, f"Index bundle could not be opened: {e}"
+    reason = bundle.stale_reason(model_name, meta_path)
+    if reason:
+        return None, f"Index bundle is stale ({reason}); rebuild it with python -m askads.bundle build"
+    return bundle, None
+
+
+def write_bundle(path: Path, arrays: dict, blobs: dict, manifest: dict):
+    """Write arrays and JSON blobs as aligned sections, then the manifest; swap the file in."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    sections = {}
+    with open(tmp, "wb") as f:
+        f.write(b"\0" * ALIGN)
+        items = [(n, np.ascontiguousarray(a)) for n, a in arrays.items()]
+        items += [(n, np.frombuffer(json.dumps(b, ensure_ascii=False).encode("utf-8"), dtype=np.uint8))
+                  for n, b in blobs.items()]
+        for name, a in items:
+            f.write(b"\0" * (-f.tell() % ALIGN))
+            data = a.tobytes()
+            sections[name] = {"offset": f.tell(), "nbytes": len(data), "dtype": a.dtype.str,
+                              "shape": list(a.shape), "sha256": hashlib.sha256(data).hexdigest()}
+            if name in blobs:
+                sections[name]["kind"] = "json"
+            f.write(data)
+        f.write(b"\0" * (-f.tell() % ALIGN))
+        body = json.dumps(dict(manifest, version=BUNDLE_VERSION, sections=sections)).encode("utf-8")
+        offset = f.tell()
+        f.write(body)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, BUNDLE_VERSION, 0, offset, len(body)))
+    os.replace(tmp, path)
+    return sections
+
+
+def build_bundle(out_path: Path = BUNDLE_PATH, meta_path: Path = META_PATH, faiss_path: Path = FAISS_PATH,
+                 sparse_dir: Path = SPARSE_INDEX_DIR, sent_dir: Path | None = SENT_INDEX_DIR,
+                 model_name: str = EMBED_MODEL_NAME) -> dict:
+    """Pack meta.jsonl, the FAISS vectors, the sparse index and the sentence index into one bundle."""
+    t0 = time.perf_counter()
+    fingerprint = meta_fingerprint(meta_path)
+    store = MetaStore.from_records(iter_meta(meta_path))
+    vectors = read_flat_faiss(faiss_path)
+    if vectors.shape[0] != len(store):
+        raise ValueError(f"FAISS index has {vectors.shape[0]} vectors but {meta_path} has {len(store)} rows")
+    tfidf, X, bm25 = load_sparse_index(sparse_dir, meta_path)
+    sparse_path = Path(sparse_dir) / SPARSE_INDEX_FILE
+    if not sparse_path.exists():
+        # load_sparse_index keeps a freshly fitted index in memory when it cannot save it
+        raise FileNotFoundError(f"{sparse_path} is missing and could not be written; "
+                                f"build it with python -m askads.sparse_index --out {sparse_dir}")
+    with open(sparse_path, "r", encoding="utf-8") as f:
+        sparse_info = json.load(f)
+
+    arrays = {
+        "vectors": np.asarray(vectors, dtype="<f4"),
+        "meta_codes": np.asarray(store.codes, dtype="<i4"),
+        "meta_offsets": np.asarray(store.offsets, dtype="<i8"),
+        "meta_texts": np.asarray(store.texts, dtype=np.uint8),
+        **{f"X_{n}": np.asarray(getattr(X, n)) for n in ("data", "indices", "indptr")},
+        **{f"bm25_{n}": np.asarray(getattr(bm25, n)) for n in BM25_ARRAYS},
+        "tfidf_idf": np.asarray(tfidf.idf_, dtype="<f8"),
+        "tfidf_terms": np.frombuffer("\n".join(sorted(tfidf.vocabulary_, key=tfidf.vocabulary_.get))
+                                     .encode("utf-8"), dtype=np.uint8),
+    }
+    blobs = {
+        "meta": {"fields": store.fields, "values": store.values},
+        "tfidf": {k: sparse_info[k] for k in ("shape", "bm25", "params")},
+    }
+    sent = SentenceIndex.open(sent_dir, model_name) if sent_dir is not None else None
+    if sent is not None:
+        arrays["sent_vectors"] = np.asarray(sent.vectors, dtype="<f2")
+        blobs["sentences"] = {"version": SENT_INDEX_VERSION, "model": sent.model_name, "dim": sent.dim,
+                              "count": sent.count, "chunks": sent.chunks}
+    manifest = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "embed_model": model_name,
+        "reranker_model": RERANKER_NAME,
+        "meta_fingerprint": fingerprint,
+        "rows": len(store),
+        "dim": int(vectors.shape[1]),
+    }
+    sections = write_bundle(out_path, arrays, blobs, manifest)
+    return {"rows": len(store), "sections": len(sections), "sentences": sent is not None,
+            "bytes": Path(out_path).stat().st_size, "seconds": round(time.perf_counter() - t0, 2)}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Build, verify or describe the packed index bundle.")
+    ap.add_argument("command", choices=("build", "verify", "info"))
+    ap.add_argument("--out", type=Path, default=BUNDLE_PATH)
+    ap.add_argument("--meta", type=Path, default=META_PATH)
+    ap.add_argument("--faiss", type=Path, default=FAISS_PATH)
+    ap.add_argument("--sparse", type=Path, default=SPARSE_INDEX_DIR)
+    ap.add_argument("--sentences", type=Path, default=SENT_INDEX_DIR)
+    ap.add_argument("--no-sentences", action="store_true", help="leave the sentence index out")
+    ap.add_argument("--model", default=EMBED_MODEL_NAME)
+    args = ap.parse_args(argv)
+    if args.command == "build":
+        print(json.dumps(build_bundle(args.out, args.meta, args.faiss, args.sparse,
+                                      None if args.no_sentences else args.sentences, args.model)))
+        return
+    try:
+        bundle = IndexBundle(args.out)
+    except (OSError, ValueError, KeyError) as e:
+        print(json.dumps({"ok": False, "problems": [str(e)]}))
+        raise SystemExit(1)
+    if args.command == "info":
+        print(json.dumps({k: v for k, v in bundle.manifest.items() if k != "sections"}
+                         | {"sections": {n: s["nbytes"] for n, s in bundle.sections.items()},
+                            "stale": bundle.stale_reason(args.model, args.meta)}))
+        return
+    problems = bundle.verify()
+    print(json.dumps({"ok": not problems, "sections": len(bundle.sections), "problems": problems}))
+    if problems:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""Two-level (memory + SQLite) cache for retrieval hits and final answers.
+
+The memory tier is a per-process LRU with TTL.  The SQLite tier lives in one
+file per host (WAL mode), so entries survive restarts and are shared by all
+Streamlit workers on the machine.  Values must be JSON-serializable.
+"""
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+_WS = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Case-fold, collapse whitespace and drop surrounding punctuation."""
+    return _WS.sub(" ", (query or "").lower()).strip(" \t\n?!.,;:")
+
+
+def make_key(*parts) -> str:
+    """Stable cache key for a tuple of JSON-serializable parts."""
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TTLCache:
+    """Thread-safe in-memory LRU cache whose entries expire after ttl seconds."""
+
+    def __init__(self, max_items: int = 512, ttl: float = 24 * 3600):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, ttl: float | None = None):
+        with self._lock:
+            self._data[key] = (time.time() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteCache:
+    """On-disk cache table shared by processes on one host, with TTL and LRU eviction."""
+
+    def __init__(self, path: Path, max_rows: int = 10000, ttl: float = 24 * 3600):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_rows = max_rows
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=10, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL, last_access REAL NOT NULL,"
+            " PRIMARY KEY (ns, key))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_last_access ON cache (last_access)")
+        self._writes = 0
+
+    def get(self, ns: str, key: str):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE ns = ? AND key = ?", (ns, key)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM cache WHERE ns = ? AND key = ?", (ns, key))
+                return None
+            self._conn.execute("UPDATE cache SET last_access = ? WHERE ns = ? AND key = ?", (now, ns, key))
+        return json.loads(row[0])
+
+    def set(self, ns: str, key: str, value, ttl: float | None = None):
+        now = time.time()
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (ns, key, value, expires_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (ns, key, payload, now + (self.ttl if ttl is None else ttl), now),
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._evict(now)
+
+    def _evict(self, now: float):
+        """Drop expired rows, then the least recently used rows above max_rows."""
+        self._conn.execute("DELETE FROM cache WHERE expires_at < ?", (now,))
+        self._conn.execute(
+            "DELETE FROM cache WHERE rowid IN ("
+            " SELECT rowid FROM cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_rows,),
+        )
+
+    def clear(self, ns: str | None = None):
+        with self._lock:
+            if ns is None:
+                self._conn.execute("DELETE FROM cache")
+            else:
+                self._conn.execute("DELETE FROM cache WHERE ns = ?", (ns,))
+
+
+class TieredCache:
+    """One cache namespace backed by a memory tier and an optional shared SQLite tier."""
+
+    def __init__(self, ns: str, memory: TTLCache, disk: SQLiteCache | None = None):
+        self.ns = ns
+        self.memory = memory
+        self.disk = disk
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            try:
+                value = self.disk.get(self.ns, key)
+            except sqlite3.Error:
+                value = None
+            if value is not None:
+                self.memory.set(key, value)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            try:
+                self.disk.set(self.ns, key, value)
+            except sqlite3.Error:
+                pass  # the disk tier is best effort; the memory tier still holds the entry
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0, "memory_items": len(self.memory)}
@@ -0,0 +1,39 @@
+"""Synchronous client for ``askads.api``, used by the app when ASKADS_ENGINE_URL is set."""
+import json
+
+import httpx
+
+
+class EngineClient:
+    """Talks to a remote engine; mirrors Engine.info/stats and the astream event protocol."""
+
+    def __init__(self, base_url: str, timeout: float = 120.0):
+        self.http = httpx.Client(base_url=base_url.rstrip("/"), timeout=timeout)
+
+    def info(self) -> dict:
+        r = self.http.get("/info")
+        r.raise_for_status()
+        return r.json()
+
+    def stats(self) -> dict:
+        r = self.http.get("/stats")
+        r.raise_for_status()
+        return r.json()
+
+    def retrieve(self, question: str, **params) -> dict:
+        r = self.http.post("/retrieve", json={"question": question, **params})
+        r.raise_for_status()
+        return r.json()
+
+    def answer(self, question: str, **params) -> dict:
+        r = self.http.post("/answer", json={"question": question, **params})
+        r.raise_for_status()
+        return r.json()
+
+    def stream(self, question: str, **params):
+        """Yield the engine's sources/token/done events as they arrive."""
+        with self.http.stream("POST", "/answer/stream", json={"question": question, **params}) as r:
+            r.raise_for_status()
+            for line in r.iter_lines():
+                if line:
+                    yield json.loads(line)
@@ -0,0 +1,76 @@
+"""Paths and model names shared by the app and the offline index builders."""
+import os
+from pathlib import Path
+
+# Paths
+ART_DIR = Path("rag_index")
+CHROMA_DIR = ART_DIR / "chroma_db"
+META_PATH = ART_DIR / "meta.jsonl"
+FAISS_PATH = ART_DIR / "faiss_e5.index"
+SENT_INDEX_DIR = ART_DIR / "sentences"
+SPARSE_INDEX_DIR = ART_DIR / "sparse"
+META_STORE_DIR = ART_DIR / "meta_store"
+BUNDLE_PATH = ART_DIR / "index.bundle"
+ONNX_DIR = ART_DIR / "onnx"
+
+# Crawled HTML (askads.crawler), the pages and chunks extracted from it (askads.extract)
+# and the chunks the index is built from (askads.indexer)
+HTML_DIR = Path("msads_data") / "html"
+CRAWL_STATE_PATH = Path("msads_data") / "crawl_state.json"
+RAW_PAGES_PATH = Path("data_dsi") / "raw_pages.jsonl"
+CHUNKS_PATH = Path("data_dsi") / "chunks.jsonl"
+
+# Model configuration
+EMBED_MODEL_NAME = "intfloat/e5-base-v2"
+RERANKER_NAME = "BAAI/bge-reranker-base"
+
+# Inference backend for both models: "torch" (fp32), "onnx" or "onnx-int8" (rag_index/onnx/)
+INFERENCE_BACKEND = os.getenv("ASKADS_INFERENCE_BACKEND", "torch").lower()
+
+# Dense retrieval backend: "faiss" (rag_index/faiss_e5.index) or "chroma"
+DENSE_BACKEND = os.getenv("ASKADS_DENSE_BACKEND", "faiss").lower()
+
+# Serve the index from the packed bundle (rag_index/index.bundle) when it is present and current
+BUNDLE_ENABLED = os.getenv("ASKADS_BUNDLE", "1") != "0"
+
+# Answer / retrieval cache (memory LRU + SQLite file shared by workers on one host)
+CACHE_ENABLED = os.getenv("ASKADS_CACHE", "1") != "0"
+CACHE_PATH = Path(os.getenv("ASKADS_CACHE_PATH", ".cache/askads_cache.sqlite3"))
+CACHE_TTL = float(os.getenv("ASKADS_CACHE_TTL", str(24 * 3600)))
+CACHE_MAX_ITEMS = int(os.getenv("ASKADS_CACHE_MAX_ITEMS", "512"))
+CACHE_MAX_ROWS = int(os.getenv("ASKADS_CACHE_MAX_ROWS", "10000"))
+
+# Semantic cache: reuse answers of paraphrased questions above a cosine threshold
+SEMANTIC_CACHE_ENABLED = os.getenv("ASKADS_SEMANTIC_CACHE", "0") == "1"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("ASKADS_SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_MAX_ITEMS = int(os.getenv("ASKADS_SEMANTIC_CACHE_MAX_ITEMS", "2000"))
+
+# Answer generation: stream tokens into the chat bubble; ASKADS_FAKE_LLM=1 answers locally
+STREAM_ANSWERS = os.getenv("ASKADS_STREAM", "1") != "0"
+FAKE_LLM = os.getenv("ASKADS_FAKE_LLM", "0") == "1"
+# The LLM connection is re-warmed only after this much idle time (httpx's keep-alive expiry)
+LLM_KEEPALIVE_S = float(os.getenv("ASKADS_LLM_KEEPALIVE_S", "5"))
+
+# Thread pool size for concurrent pipeline stages (dense/sparse search, compression)
+PIPELINE_WORKERS = int(os.getenv("ASKADS_PIPELINE_WORKERS", "4"))
+
+# Augmented-query fallback: "sequential" (retry on a miss), "speculative" (parallel) or "merged" (one fused pool)
+FALLBACK_MODE = os.getenv("ASKADS_FALLBACK_MODE", "sequential").lower()
+
+# Shared reranker: pairs from concurrent requests are scored in micro-batches
+RERANK_MAX_BATCH = int(os.getenv("ASKADS_RERANK_MAX_BATCH", "64"))
+RERANK_WINDOW_MS = float(os.getenv("ASKADS_RERANK_WINDOW_MS", "5"))
+RERANK_QUEUE_SIZE = int(os.getenv("ASKADS_RERANK_QUEUE_SIZE", "64"))
+RERANK_CACHE_MAX_ITEMS = int(os.getenv("ASKADS_RERANK_CACHE_MAX_ITEMS", "20000"))
+
+# Per-request tracing: one JSON line per chat turn (stderr, or ASKADS_TRACE_LOG) and a sidebar panel
+TRACE_ENABLED = os.getenv("ASKADS_TRACE", "1") != "0"
+TRACE_LOG_PATH = os.getenv("ASKADS_TRACE_LOG") or None
+
+# Prometheus-style /metrics endpoint served by a sidecar thread; port 0 disables it
+METRICS_PORT = int(os.getenv("ASKADS_METRICS_PORT", "9464"))
+METRICS_HOST = os.getenv("ASKADS_METRICS_HOST", "127.0.0.1")
+
+# Engine: worker threads for blocking request work; ASKADS_ENGINE_URL makes the app a client of askads.api
+ENGINE_WORKERS = int(os.getenv("ASKADS_ENGINE_WORKERS", "8"))
+ENGINE_URL = os.getenv("ASKADS_ENGINE_URL") or None
@@ -0,0 +1,28 @@
+"""Reading the chunk metadata written next to the index (meta.jsonl)."""
+import hashlib
+import json
+from pathlib import Path
+
+
+def iter_meta(path: Path):
+    """Yield one metadata dict per line of a meta.jsonl file."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def meta_fingerprint(path: Path) -> str:
+    """sha256 of the meta.jsonl bytes; changes whenever any chunk changes."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def doc_text(m: dict) -> str:
+    """Text indexed by the sparse retriever: title, section, url and chunk text."""
+    return ((m.get("title", "") + " " + m.get("section", "") + " " +
+             m.get("url", "") + " " + m.get("text", "")).strip())
@@ -0,0 +1,459 @@
+"""Concurrent, polite crawler for the DSI site (replaces ``crawl_and_build`` in scraper.ipynb).
+
+Pages are fetched with one shared ``httpx.AsyncClient`` (keep-alive
+connections are reused) by a pool of asyncio workers.  Each host gets a
+concurrency limit and a minimum interval between request starts, and
+robots.txt is honoured.  Validators from the previous crawl (ETag and
+Last-Modified, kept in ``crawl_state.json``) go out as ``If-None-Match`` /
+``If-Modified-Since``; a 304 reuses the saved HTML and the links recorded
+for it, so unchanged pages are neither downloaded nor re-parsed.
+After a complete crawl (every reachable page visited within ``max_pages``
+and no fetch errors; a 404 or 410 only means the page is gone), pages it no
+longer reaches or that are gone are dropped from the state and their saved
+HTML is deleted, so they leave the index on the next extraction.  After a partial crawl they are only marked ``stale`` in the
+state and their HTML is kept.
+
+Raw HTML is saved as ``<quoted url>.html`` (the ``msads_data/html/`` layout)
+for extraction and chunking (``askads.extract``).  ``serve`` runs a local server over saved HTML
+that answers conditional requests, so a crawl can be exercised offline:
+
+    python -m askads.crawler serve --html msads_data/html --port 8765
+    python -m askads.crawler crawl --fetch-base http://127.0.0.1:8765 --out /tmp/html
+    python -m askads.crawler crawl --out msads_data/html --max-pages 400
+"""
+import argparse
+import asyncio
+import email.utils
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.robotparser
+from datetime import datetime, timezone
+from html.parser import HTMLParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import httpx
+
+from askads.config import CRAWL_STATE_PATH, HTML_DIR
+
+SITE = "https://datascience.uchicago.edu"
+ALLOWED_HOST = "datascience.uchicago.edu"
+SEEDS = [
+    "https://datascience.uchicago.edu/about/",
+    "https://datascience.uchicago.edu/education/",
+    "https://datascience.uchicago.edu/research/",
+    "https://datascience.uchicago.edu/people/",
+    "https://datascience.uchicago.edu/news-events/news/",
+    "https://datascience.uchicago.edu/news-events/events/",
+    "https://datascience.uchicago.edu/news-events/insights/",
+]
+MAX_PAGES = 400
+PER_HOST = 4          # requests in flight per host
+RATE = 4.0            # request starts per second per host
+TIMEOUT_SEC = 20
+RETRIES = 2
+GONE_STATUS = (404, 410)  # the page no longer exists; not a failed fetch
+UA = "Mozilla/5.0 (RAG-Bot-Scraper; askads)"
+STATE_VERSION = 1
+
+logger = logging.getLogger(__name__)
+BAD_EXT = (".pdf", ".xml", ".jpg", ".jpeg", ".png", ".gif", ".webp", ".svg", ".mp4", ".mov", ".zip", ".ics",
+           ".doc", ".ppt", ".pptx", ".xls", ".xlsx")
+
+
+def normalize_url(base: str, href: str | None) -> str | None:
+    """Absolute on-site URL without fragment or tracking parameters, else None."""
+    if not href:
+        return None
+    href = href.split("#")[0].strip()
+    if not href:
+        return None
+    u = urllib.parse.urlparse(urllib.parse.urljoin(base, href))
+    if u.scheme not in ("http", "https") or u.netloc != ALLOWED_HOST:
+        return None
+    clean_q = urllib.parse.urlencode(
+        [(k, v) for k, v in urllib.parse.parse_qsl(u.query, keep_blank_values=False)
+         if not k.lower().startswith(("utm_", "fbclid", "gclid"))]
+    )
+    return urllib.parse.urlunparse(u._replace(query=clean_q))
+
+
+def looks_like_html(url: str) -> bool:
+    path = urllib.parse.urlparse(url).path.lower()
+    return not path.endswith(BAD_EXT)
+
+
+def page_file(html_dir: Path, url: str) -> Path:
+    """Where the raw HTML of url is saved (over-long names get a hash suffix)."""
+    name = urllib.parse.quote(url, safe="")
+    if len(name) > 200:
+        name = name[:180] + "-" + hashlib.sha256(url.encode("utf-8")).hexdigest()[:16]
+    return Path(html_dir) / (name + ".html")
+
+
+class _LinkParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.hrefs = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            href = dict(attrs).get("href")
+            if href:
+                self.hrefs.append(href)
+
+
+def extract_links(url: str, html: str) -> list[str]:
+    """On-site HTML links of a page, normalized, in document order without repeats."""
+    parser = _LinkParser()
+    parser.feed(html)
+    out, seen = [], set()
+    for href in parser.hrefs:
+        nxt = normalize_url(url, href)
+        if nxt and nxt not in seen and looks_like_html(nxt):
+            seen.add(nxt)
+            out.append(nxt)
+    return out
+
+
+def load_state(path: Path) -> dict:
+    """{url: {etag, last_modified, sha256, links, ...}} from the last crawl (empty if none)."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return state.get("pages", {}) if state.get("version") == STATE_VERSION else {}
+
+
+def save_state(path: Path, pages: dict):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": STATE_VERSION, "pages": pages}, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+class HostLimiter:
+    """At most ``concurrency`` requests in flight, and request starts spaced 1/rate seconds apart."""
+
+    def __init__(self, concurrency: int = PER_HOST, rate: float = RATE):
+        self._sem = asyncio.Semaphore(max(1, concurrency))
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    def slow_down(self, seconds: float):
+        """Push the next start back (Retry-After, 429/503)."""
+        self._next = max(self._next, asyncio.get_running_loop().time() + seconds)
+
+    async def __aenter__(self):
+        await self._sem.acquire()
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    async def __aexit__(self, *exc):
+        self._sem.release()
+
+
+class Crawler:
+    """Breadth-first crawl from the seeds with conditional GETs against the previous crawl's state."""
+
+    def __init__(self, out_dir: Path = HTML_DIR, state_path: Path = CRAWL_STATE_PATH, seeds=SEEDS,
+                 max_pages: int = MAX_PAGES, per_host: int = PER_HOST, rate: float = RATE,
+                 fetch_base: str | None = None, timeout: float = TIMEOUT_SEC, respect_robots: bool = True):
+        self.out_dir = Path(out_dir)
+        self.state_path = Path(state_path)
+        self.seeds = list(seeds)
+        self.max_pages = max_pages
+        self.per_host, self.rate = per_host, rate
+        # Logical URLs stay on the real site; requests may go to a mirror (e.g. the local test server)
+        self.fetch_base = fetch_base.rstrip("/") if fetch_base else None
+        self.timeout = timeout
+        self.respect_robots = respect_robots
+        self.previous = load_state(self.state_path)
+        self.pages = dict(self.previous)
+        self.limiters = {}
+        self.robots = {}
+        self.stats = {"downloaded": 0, "not_modified": 0, "errors": 0, "skipped": 0, "gone": 0, "dropped": 0,
+                      "stale": 0, "bytes": 0}
+
+    def fetch_url(self, url: str) -> str:
+        if not self.fetch_base:
+            return url
+        u = urllib.parse.urlparse(url)
+        return self.fetch_base + urllib.parse.urlunparse(u._replace(scheme="", netloc=""))
+
+    def limiter(self, url: str) -> HostLimiter:
+        host = urllib.parse.urlparse(self.fetch_url(url)).netloc
+        if host not in self.limiters:
+            self.limiters[host] = HostLimiter(self.per_host, self.rate)
+        return self.limiters[host]
+
+    async def allowed(self, client: httpx.AsyncClient, url: str) -> bool:
+        if not self.respect_robots:
+            return True
+        host = urllib.parse.urlparse(url).netloc
+        if host not in self.robots:
+            # One fetch per host, shared by every worker that asks meanwhile
+            self.robots[host] = asyncio.ensure_future(self._robots(client, url, host))
+        return (await self.robots[host]).can_fetch(UA, url)
+
+    async def _robots(self, client: httpx.AsyncClient, url: str, host: str):
+        rp = urllib.robotparser.RobotFileParser()
+        try:
+            async with self.limiter(url):
+                r = await client.get(self.fetch_url(f"https://{host}/robots.txt"))
+            rp.parse(r.text.splitlines() if r.status_code == 200 else [])
+        except httpx.HTTPError:
+            rp.parse([])
+        return rp
+
+    def conditional_headers(self, url: str) -> dict:
+        prev = self.previous.get(url)
+        if not prev or not page_file(self.out_dir, url).exists():
+            return {}
+        headers = {}
+        if prev.get("etag"):
+            headers["If-None-Match"] = prev["etag"]
+        if prev.get("last_modified"):
+            headers["If-Modified-Since"] = prev["last_modified"]
+        return headers
+
+    async def get(self, client: httpx.AsyncClient, url: str, conditional: bool = True) -> httpx.Response:
+        """GET with per-host limits, retrying network errors, 429 and 5xx with backoff."""
+        limiter = self.limiter(url)
+        headers = self.conditional_headers(url) if conditional else {}
+        for attempt in range(RETRIES + 1):
+            try:
+                async with limiter:
+                    r = await client.get(self.fetch_url(url), headers=headers)
+            except httpx.TransportError:
+                if attempt == RETRIES:
+                    raise
+                await asyncio.sleep(2 ** attempt)
+                continue
+            if r.status_code in (429, 503) or r.status_code >= 500:
+                if attempt < RETRIES:
+                    retry_after = r.headers.get("retry-after", "")
+                    limiter.slow_down(float(retry_after) if retry_after.isdigit() else 2 ** attempt)
+                    continue
+            return r
+        return r
+
+    async def visit(self, client: httpx.AsyncClient, url: str) -> list[str]:
+        """Fetch one page (or confirm it unchanged); return its links."""
+        if not await self.allowed(client, url):
+            self.stats["skipped"] += 1
+            return []
+        r = await self.get(client, url)
+        prev = self.previous.get(url)
+        if r.status_code == 304 and prev is None:
+            # Nothing to reuse (e.g. a server answering 304 unasked): fetch the page outright
+            r = await self.get(client, url, conditional=False)
+        now = datetime.now(timezone.utc).isoformat()
+        if r.status_code == 304 and prev is not None:
+            self.stats["not_modified"] += 1
+            self.pages[url] = dict(prev, checked_at=now, status=304)
+            self.pages[url].pop("stale", None)
+            return prev.get("links", [])
+        r.raise_for_status()
+        ctype = (r.headers.get("content-type") or "").split(";")[0].strip().lower()
+        if "text/html" not in ctype:
+            raise ValueError(f"non-HTML content-type {ctype!r}")
+        body = r.content
+        html = r.text
+        links = extract_links(url, html)
+        tmp = page_file(self.out_dir, url).with_suffix(".tmp")
+        tmp.write_bytes(body)
+        os.replace(tmp, page_file(self.out_dir, url))
+        self.stats["downloaded"] += 1
+        self.stats["bytes"] += len(body)
+        self.pages[url] = {
+            "etag": r.headers.get("etag"),
+            "last_modified": r.headers.get("last-modified"),
+            "sha256": hashlib.sha256(body).hexdigest(),
+            "links": links,
+            "status": r.status_code,
+            "fetched_at": now,
+            "checked_at": now,
+        }
+        return links
+
+    async def run(self) -> dict:
+        t0 = time.perf_counter()
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        queue = asyncio.Queue()
+        seen, gone = set(), set()
+        budget = [self.max_pages]
+        truncated = [False]
+
+        def enqueue(url):
+            if url in seen or not looks_like_html(url):
+                return
+            if budget[0] <= 0:
+                truncated[0] = True  # a link was left unvisited
+                return
+            seen.add(url)
+            budget[0] -= 1
+            queue.put_nowait(url)
+
+        for url in self.seeds:
+            enqueue(url)
+
+        async def worker(client):
+            while True:
+                url = await queue.get()
+                try:
+                    for nxt in await self.visit(client, url):
+                        enqueue(nxt)
+                except httpx.HTTPStatusError as e:
+                    status = e.response.status_code
+                    if status in GONE_STATUS:
+                        gone.add(url)
+                        self.stats["gone"] += 1
+                    else:
+                        self.stats["errors"] += 1
+                    logger.warning("skip %s: HTTP %s", url, status)
+                except Exception as e:
+                    # Any failure costs this page only; the worker keeps draining the queue
+                    self.stats["errors"] += 1
+                    logger.warning("skip %s: %s: %s", url, type(e).__name__, e)
+                finally:
+                    queue.task_done()
+
+        limits = httpx.Limits(max_connections=self.per_host * 4, max_keepalive_connections=self.per_host * 4)
+        async with httpx.AsyncClient(headers={"User-Agent": UA}, timeout=self.timeout, limits=limits,
+                                     follow_redirects=True) as client:
+            workers = [asyncio.create_task(worker(client)) for _ in range(self.per_host * 2)]
+            await queue.join()
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        # Only a complete crawl proves a page is gone; after a partial one, unreached pages are kept
+        complete = not truncated[0] and not self.stats["errors"]
+        if complete:
+            self.stats["dropped"] = self.drop_unreached(seen - gone)
+        else:
+            self.stats["stale"] = self.mark_unreached(seen - gone)
+        save_state(self.state_path, self.pages)
+        return {"pages": len(seen), "complete": complete, **self.stats,
+                "seconds": round(time.perf_counter() - t0, 2)}
+
+    def drop_unreached(self, reached: set) -> int:
+        """Forget pages this crawl did not reach (and delete their saved HTML) so they leave the index."""
+        gone = [url for url in self.pages if url not in reached]
+        for url in gone:
+            del self.pages[url]
+            page_file(self.out_dir, url).unlink(missing_ok=True)
+        return len(gone)
+
+    def mark_unreached(self, reached: set) -> int:
+        """Flag pages this crawl did not reach as stale, keeping their state and saved HTML."""
+        stale = [url for url in self.pages if url not in reached]
+        for url in stale:
+            self.pages[url] = dict(self.pages[url], stale=True)
+        return len(stale)
+
+
+class _SavedPageHandler(BaseHTTPRequestHandler):
+    """Serves ``<quoted SITE + path>.html`` with ETag / Last-Modified and 304 responses."""
+
+    html_dir = HTML_DIR
+
+    def do_GET(self):
+        path = page_file(self.html_dir, SITE + self.path)
+        if not path.exists():
+            self.send_error(404)
+            return
+        body = path.read_bytes()
+        etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+        mtime = int(path.stat().st_mtime)
+        last_modified = email.utils.formatdate(mtime, usegmt=True)
+        if self._not_modified(etag, mtime):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _not_modified(self, etag: str, mtime: int) -> bool:
+        inm = self.headers.get("If-None-Match")
+        if inm is not None:
+            return etag in [t.strip() for t in inm.split(",")] or inm.strip() == "*"
+        ims = self.headers.get("If-Modified-Since")
+        if ims:
+            try:
+                return mtime <= email.utils.parsedate_to_datetime(ims).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def log_message(self, *args):
+        pass
+
+
+def serve_saved_pages(html_dir: Path = HTML_DIR, host: str = "127.0.0.1", port: int = 8765,
+                      background: bool = False) -> ThreadingHTTPServer:
+    """HTTP server over saved HTML (conditional GETs supported); runs in a daemon thread if background."""
+    handler = type("SavedPageHandler", (_SavedPageHandler,), {"html_dir": Path(html_dir)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    if background:
+        threading.Thread(target=server.serve_forever, name="askads-saved-pages", daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    c = sub.add_parser("crawl", help="crawl the site (or a mirror) into an HTML directory")
+    c.add_argument("--out", type=Path, default=HTML_DIR)
+    c.add_argument("--state", type=Path, default=CRAWL_STATE_PATH)
+    c.add_argument("--seed", action="append", help="start URL (repeatable; default: the site sections)")
+    c.add_argument("--max-pages", type=int, default=MAX_PAGES)
+    c.add_argument("--per-host", type=int, default=PER_HOST, help="requests in flight per host")
+    c.add_argument("--rate", type=float, default=RATE, help="request starts per second per host")
+    c.add_argument("--fetch-base", help="send requests to this origin instead (e.g. the local server)")
+    c.add_argument("--ignore-robots", action="store_true")
+    s = sub.add_parser("serve", help="serve saved HTML locally with ETag / Last-Modified")
+    s.add_argument("--html", type=Path, default=HTML_DIR)
+    s.add_argument("--host", default="127.0.0.1")
+    s.add_argument("--port", type=int, default=8765)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "serve":
+        server = serve_saved_pages(args.html, args.host, args.port)
+        print(f"Serving {args.html} on http://{args.host}:{args.port}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    crawler = Crawler(args.out, args.state, seeds=args.seed or SEEDS, max_pages=args.max_pages,
+                      per_host=args.per_host, rate=args.rate, fetch_base=args.fetch_base,
+                      respect_robots=not args.ignore_robots)
+    print(json.dumps(asyncio.run(crawler.run())))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""Pluggable dense retrieval backends: the Chroma collection or the shipped FAISS index.
+
+Both backends expose ``search(q_vec, topn) -> (ids, sims)`` with cosine
+similarities, ``count()`` and ``ids()``.  The FAISS index stores one row per
+line of meta.jsonl, so its row numbers map to ids through ``id_order``.
+"""
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import faiss
+except ImportError:  # faiss-cpu is optional; flat indexes are searched with numpy
+    faiss = None
+
+
+def read_flat_faiss(path: Path) -> np.ndarray:
+    """Read the vectors of a flat FAISS index (IndexFlatIP / IndexFlatL2) without faiss."""
+    with open(path, "rb") as f:
+        head = f.read(37)
+        if len(head) < 37 or head[:4] not in (b"IxFI", b"IxF2"):
+            raise ValueError(f"{path} is not a flat FAISS index")
+        d = int(np.frombuffer(head, dtype="<i4", count=1, offset=4)[0])
+        ntotal = int(np.frombuffer(head, dtype="<i8", count=1, offset=8)[0])
+        metric = int(np.frombuffer(head, dtype="<i4", count=1, offset=33)[0])
+        offset = 37 + (4 if metric > 1 else 0)
+        f.seek(offset)
+        size = int(np.frombuffer(f.read(8), dtype="<u8")[0])
+    if size != d * ntotal:
+        raise ValueError(f"{path}: unexpected vector block size {size}")
+    return np.memmap(path, dtype="<f4", mode="r", offset=offset + 8, shape=(ntotal, d))
+
+
+def write_flat_faiss(path: Path, vectors: np.ndarray):
+    """Write vectors as a flat inner-product FAISS index (IndexFlatIP), readable with or without faiss."""
+    vectors = np.ascontiguousarray(vectors, dtype="<f4")
+    ntotal, d = vectors.shape
+    with open(path, "wb") as f:
+        f.write(b"IxFI")
+        f.write(np.array([d], dtype="<i4").tobytes())
+        f.write(np.array([ntotal, 1 << 20, 1 << 20], dtype="<i8").tobytes())
+        f.write(b"\x01")                                   # is_trained
+        f.write(np.array([0], dtype="<i4").tobytes())     # METRIC_INNER_PRODUCT
+        f.write(np.array([d * ntotal], dtype="<u8").tobytes())
+        f.write(vectors.tobytes())
+
+
+class ChromaDense:
+    """Dense search through a Chroma collection (cosine space)."""
+    name = "chroma"
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def search(self, q_vec: np.ndarray, topn: int):
+        res = self.collection.query(
+            query_embeddings=[np.asarray(q_vec, dtype=np.float32).tolist()],
+            n_results=topn,
+            include=["distances"]
+        )
+        ids = res["ids"][0]
+        sims = [1.0 - d for d in res["distances"][0]]  # cosine similarity
+        return ids, sims
+
+    def search_many(self, q_vecs: np.ndarray, topn: int):
+        """``search`` for a batch of query vectors in one Chroma query."""
+        res = self.collection.query(
+            query_embeddings=np.asarray(q_vecs, dtype=np.float32).tolist(),
+            n_results=topn,
+            include=["distances"]
+        )
+        return [(ids, [1.0 - d for d in dists]) for ids, dists in zip(res["ids"], res["distances"])]
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def ids(self) -> list[str]:
+        return list(self.collection.get(include=[])["ids"])
+
+
+class FaissDense:
+    """Inner-product search over normalized vectors in a FAISS index.
+
+    Uses faiss when it is installed, otherwise reads the flat index and
+    scores it with a single matrix-vector product (same results).  Given a
+    ``matrix`` (the index bundle's memory-mapped vectors) it always uses
+    numpy, so processes share those pages instead of copying them into faiss.
+    """
+    name = "faiss"
+
+    def __init__(self, path: Path | None, id_order: list[str], matrix: np.ndarray | None = None):
+        self.path = Path(path) if path is not None else None
+        self.id_order = list(id_order)
+        if matrix is not None:
+            self.index = None
+            self.matrix = matrix
+        elif faiss is not None:
+            self.index = faiss.read_index(str(self.path))
+            self.matrix = None
+        else:
+            self.index = None
+            self.matrix = read_flat_faiss(self.path)
+
+    def search(self, q_vec: np.ndarray, topn: int):
+        q = np.asarray(q_vec, dtype=np.float32).reshape(1, -1)
+        n = self.count()
+        topn = min(topn, n)
+        if topn <= 0:
+            return [], []
+        if self.index is not None:
+            sims, rows = self.index.search(q, topn)
+            sims, rows = sims[0], rows[0]
+        else:
+            scores = self.matrix @ q[0]
+            rows = np.argpartition(-scores, topn - 1)[:topn]
+            rows = rows[np.argsort(-scores[rows], kind="stable")]
+            sims = scores[rows]
+        return self._ids_and_sims(rows, sims)
+
+    def search_many(self, q_vecs: np.ndarray, topn: int):
+        """``search`` for a batch of query vectors with one matrix-matrix product."""
+        q = np.asarray(q_vecs, dtype=np.float32).reshape(len(q_vecs), -1)
+        topn = min(topn, self.count())
+        if topn <= 0 or not len(q):
+            return [([], []) for _ in range(len(q))]
+        if self.index is not None:
+            sims, rows = self.index.search(q, topn)
+        else:
+            scores = q @ self.matrix.T
+            rows = np.argpartition(-scores, topn - 1, axis=1)[:, :topn]
+            top = np.take_along_axis(scores, rows, axis=1)
+            order = np.argsort(-top, axis=1, kind="stable")
+            rows = np.take_along_axis(rows, order, axis=1)
+            sims = np.take_along_axis(top, order, axis=1)
+        return [self._ids_and_sims(r, s) for r, s in zip(rows, sims)]
+
+    def _ids_and_sims(self, rows, sims):
+        keep = [(int(r), float(s)) for r, s in zip(rows, sims) if 0 <= r < len(self.id_order)]
+        return [self.id_order[r] for r, _ in keep], [s for _, s in keep]
+
+    def count(self) -> int:
+        return int(self.index.ntotal) if self.index is not None else int(self.matrix.shape[0])
+
+    def ids(self) -> list[str]:
+        return self.id_order[:self.count()]
+
+    def vectors(self) -> np.ndarray:
+        """All stored vectors as a float32 matrix (rows follow id_order)."""
+        if self.index is not None:
+            return self.index.reconstruct_n(0, self.index.ntotal)
+        return np.array(self.matrix, dtype=np.float32)
+
+
+def check_consistency(id_order: list[str], faiss_dense: FaissDense | None = None,
+                      collection=None) -> list[str]:
+    """Compare the FAISS index, the Chroma collection and meta.jsonl; return a list of problems."""
+    problems = []
+    meta_ids = set(id_order)
+    if faiss_dense is not None and faiss_dense.count() != len(id_order):
+        problems.append(f"FAISS index has {faiss_dense.count()} vectors but meta.jsonl has {len(id_order)} rows")
+    if collection is not None:
+        chroma_ids = set(ChromaDense(collection).ids())
+        if len(chroma_ids) != len(meta_ids):
+            problems.append(f"Chroma collection has {len(chroma_ids)} ids but meta.jsonl has {len(meta_ids)}")
+        missing, extra = meta_ids - chroma_ids, chroma_ids - meta_ids
+        if missing or extra:
+            problems.append(f"Chroma and meta.jsonl disagree on ids ({len(missing)} missing, {len(extra)} extra)")
+    return problems
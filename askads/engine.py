@@ -0,0 +1,264 @@
+"""The RAG engine: index, models, caches and the per-request flow, without any UI.
+
+An ``Engine`` loads everything once per process and serves any number of
+concurrent requests.  The Streamlit app drives one in-process (on the
+background event loop), and ``askads.api`` puts one behind HTTP so the UI
+can run as a thin client and the engine can be scaled and load-tested on
+its own.
+
+``astream`` is the single request path.  It yields events:
+
+- ``{"event": "sources", "sources": [...], "cached": ...}``
+- ``{"event": "token", "text": ...}`` (a cached answer arrives as one token)
+- ``{"event": "done", "answer": ..., "sources": [...], "ok": ..., "cached": ..., "trace": ...}``
+"""
+import asyncio
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from askads import metrics
+from askads.cache import SQLiteCache, TieredCache, TTLCache, make_key, normalize_query
+from askads.config import (
+    CACHE_ENABLED, CACHE_MAX_ITEMS, CACHE_MAX_ROWS, CACHE_PATH, CACHE_TTL, CHROMA_DIR, EMBED_MODEL_NAME,
+    ENGINE_WORKERS, FAKE_LLM, FALLBACK_MODE, LLM_KEEPALIVE_S, META_PATH, METRICS_PORT, SEMANTIC_CACHE_ENABLED,
+    SEMANTIC_CACHE_MAX_ITEMS, SEMANTIC_CACHE_THRESHOLD, SENT_INDEX_DIR, STREAM_ANSWERS, TRACE_ENABLED,
+)
+from askads.corpus import meta_fingerprint
+from askads.llm import FakeAsyncChatClient
+from askads.models import backend_name
+from askads import pipeline
+from askads.pipeline import (
+    agenerate_answer, astream_answer, augment_query, make_query_contexts, retrieve_with_fallback, warm_llm,
+)
+from askads.reranker import reranker_service
+from askads.resources import load_index, load_sentence_index, open_index_bundle
+from askads.semantic_cache import SemanticCache
+from askads.tracing import new_trace
+
+
+@dataclass
+class AnswerParams:
+    """Per-request knobs (the sidebar sliders in the app)."""
+    k: int = 6
+    shortlist: int = 60
+    use_reranker: bool = True
+    temperature: float = 0.2
+    stream: bool = STREAM_ANSWERS
+
+
+def make_llm_client(api_key: str | None = None, fake: bool = FAKE_LLM):
+    """AsyncOpenAI client, or the local fake one."""
+    if fake:
+        return FakeAsyncChatClient(delay=0.02)
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(api_key=api_key)
+
+
+def index_fingerprint(meta_path: Path, doc_count: int) -> str:
+    """Identifies the index contents, so cached entries die with an index refresh."""
+    if meta_path.exists():
+        return meta_fingerprint(meta_path)
+    return f"chroma:{doc_count}"
+
+
+def sources_of(hits) -> list[dict]:
+    """Citation entries for the top 5 hits."""
+    return [{"title": h.get("title", ""), "url": h.get("url", ""),
+             "section": h.get("section", "")} for h in hits[:5]]
+
+
+class Engine:
+    """Shared index, models and caches plus the retrieve/answer flow."""
+
+    def __init__(self, chroma_dir: Path = CHROMA_DIR, embed_model_name: str = EMBED_MODEL_NAME,
+                 llm=None, api_key: str | None = None, cache_path: Path = CACHE_PATH,
+                 workers: int = ENGINE_WORKERS):
+        self.warnings = []
+        bundle = open_index_bundle(embed_model_name)
+        (self.collection, self.dense, problems, self.id_to_meta, self.id_order,
+         self.model, self.tfidf, self.bm25, self.emb, self.id_to_row) = load_index(chroma_dir, embed_model_name, bundle)
+        self.warnings += [f"Index consistency: {p}" for p in problems]
+        try:
+            self.sent_index = load_sentence_index(embed_model_name, SENT_INDEX_DIR, bundle)
+        except (OSError, ValueError, KeyError) as e:
+            self.sent_index = None
+            self.warnings.append(f"Sentence index could not be loaded: {e}")
+        self.index_fp = index_fingerprint(META_PATH, self.dense.count())
+        self.retrieval_cache, self.answer_cache = self._open_caches(cache_path) if CACHE_ENABLED else (None, None)
+        self.semantic_cache = self._open_semantic_cache(cache_path) if SEMANTIC_CACHE_ENABLED else None
+        self.llm = llm if llm is not None else make_llm_client(api_key)
+        self._llm_used = float("-inf")  # monotonic time of the last LLM call or warm-up
+        # Blocking work (encoding, retrieval, SQLite) runs here, off the event loop;
+        # it fans out to the pipeline's own pools underneath
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="askads-engine")
+
+    def _warm_llm_if_idle(self):
+        """Start warming the LLM connection, unless it was used within the keep-alive window (then None)."""
+        now = time.monotonic()
+        idle = now - self._llm_used > LLM_KEEPALIVE_S
+        self._llm_used = now
+        return asyncio.ensure_future(warm_llm(self.llm)) if idle else None
+
+    def _open_caches(self, cache_path: Path):
+        disk = None
+        try:
+            disk = SQLiteCache(cache_path, max_rows=CACHE_MAX_ROWS, ttl=CACHE_TTL)
+        except (OSError, sqlite3.Error) as e:
+            self.warnings.append(f"On-disk cache unavailable, using memory only: {e}")
+        return (TieredCache("retrieval", TTLCache(CACHE_MAX_ITEMS, CACHE_TTL), disk),
+                TieredCache("answer", TTLCache(CACHE_MAX_ITEMS, CACHE_TTL), disk))
+
+    def _open_semantic_cache(self, cache_path: Path):
+        dim = self.emb.shape[1]
+        try:
+            return SemanticCache(dim, threshold=SEMANTIC_CACHE_THRESHOLD, max_items=SEMANTIC_CACHE_MAX_ITEMS,
+                                 path=cache_path, ttl=CACHE_TTL)
+        except (OSError, sqlite3.Error) as e:
+            self.warnings.append(f"On-disk semantic cache unavailable, using memory only: {e}")
+            return SemanticCache(dim, threshold=SEMANTIC_CACHE_THRESHOLD, max_items=SEMANTIC_CACHE_MAX_ITEMS,
+                                 ttl=CACHE_TTL)
+
+    def _keys(self, question: str, p: AnswerParams):
+        norm_q = normalize_query(question)
+        return (make_key(norm_q, p.k, p.shortlist, p.use_reranker, self.index_fp),
+                make_key(norm_q, p.k, p.shortlist, p.use_reranker, p.temperature, self.index_fp),
+                make_key(p.k, p.shortlist, p.use_reranker, p.temperature))
+
+    def query_contexts(self, question: str, trace=None):
+        """(qctx, aug_qctx); the augmented one is encoded in the same batch unless the fallback is sequential."""
+        if FALLBACK_MODE == "sequential":
+            qctx, = make_query_contexts([question], self.model, self.tfidf, trace)
+            return qctx, None
+        return tuple(make_query_contexts([question, augment_query(question)], self.model, self.tfidf, trace))
+
+    def retrieve(self, question: str, params: AnswerParams | None = None, trace=None, qctxs=None):
+        """Ranked hits for question; returns (hits, qctx, info) with the cache outcome and fallback use."""
+        params = params or AnswerParams()
+        retrieval_key = self._keys(question, params)[0]
+        qctx, aug_qctx = qctxs or self.query_contexts(question, trace)
+        hits = self.retrieval_cache.get(retrieval_key) if self.retrieval_cache else None
+        if hits is not None:
+            return hits, qctx, {"cache": "retrieval", "fallback": None}
+        # Falls back to an augmented query if no education pages are found
+        hits, used_fallback = retrieve_with_fallback(
+            qctx, self.dense, self.id_to_meta, self.id_order, self.model, self.bm25, self.emb, self.id_to_row,
+            k=params.k, shortlist=params.shortlist, use_reranker=params.use_reranker,
+            tfidf=self.tfidf, aug_qctx=aug_qctx, mode=FALLBACK_MODE,
+        )
+        if self.retrieval_cache:
+            self.retrieval_cache.set(retrieval_key, hits)
+        return hits, qctx, {"cache": None, "fallback": used_fallback}
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def aretrieve(self, question: str, params: AnswerParams | None = None) -> dict:
+        """Retrieval only: hits (with metadata and scores), cache outcome, fallback use and trace."""
+        params = params or AnswerParams()
+        trace = new_trace(TRACE_ENABLED or bool(METRICS_PORT), endpoint="retrieve", k=params.k)
+        hits, _qctx, info = await self._run(self.retrieve, question, params, trace)
+        out = {"hits": hits, **info, "trace": None}
+        if trace is not None:
+            trace.set(**info)
+            out["trace"] = trace.emit(log=TRACE_ENABLED)
+        return out
+
+    async def astream(self, question: str, params: AnswerParams | None = None):
+        """Answer question, yielding sources, tokens and a final done event."""
+        params = params or AnswerParams()
+        trace = new_trace(TRACE_ENABLED or bool(METRICS_PORT), endpoint="answer", k=params.k,
+                          shortlist=params.shortlist, reranker=params.use_reranker)
+        _, answer_key, semantic_params = self._keys(question, params)
+        info = {"cache": None, "fallback": None}
+        cached = self.answer_cache.get(answer_key) if self.answer_cache else None
+        if cached:
+            info["cache"] = "answer"
+        else:
+            qctxs = await self._run(self.query_contexts, question, trace)
+            if self.semantic_cache:
+                # Paraphrase of an earlier question, answered from unchanged chunks
+                # SQLite refresh and a matrix product: off the event loop like the other blocking steps
+                cached = await self._run(self.semantic_cache.lookup, qctxs[0].vec, semantic_params,
+                                         lambda cid: self.id_to_meta.get(cid, {}).get("sha256"))
+                if cached:
+                    info["cache"] = "semantic"
+
+        ok = True
+        if cached:
+            answer, sources = cached["answer"], cached["sources"]
+            yield {"event": "sources", "sources": sources, "cached": info["cache"]}
+            yield {"event": "token", "text": answer}
+        else:
+            # Reopen an idle LLM connection while retrieval runs
+            warm = self._warm_llm_if_idle()
+            hits, qctx, retrieved = await self._run(self.retrieve, question, params, trace, qctxs)
+            info.update(retrieved)
+            sources = sources_of(hits)
+            yield {"event": "sources", "sources": sources, "cached": info["cache"]}
+            if warm is not None:
+                await warm
+            if params.stream:
+                pieces = []
+                try:
+                    async for piece in astream_answer(qctx, hits, self.llm, self.model,
+                                                      temperature=params.temperature, sent_index=self.sent_index):
+                        pieces.append(piece)
+                        yield {"event": "token", "text": piece}
+                    answer = "".join(pieces).strip()
+                except Exception as e:
+                    answer, ok = f"Error generating answer: {str(e)}", False
+            else:
+                answer, context = await agenerate_answer(qctx, hits, self.llm, self.model,
+                                                         temperature=params.temperature, sent_index=self.sent_index)
+                ok = context is not None
+                yield {"event": "token", "text": answer}
+            self._llm_used = time.monotonic()
+            # Only successful answers are cached
+            if ok:
+                await self._run(self._remember, answer_key, semantic_params, qctx, answer, sources, hits)
+
+        done = {"event": "done", "answer": answer, "sources": sources, "ok": ok, "cached": info["cache"],
+                "trace": None}
+        if trace is not None:
+            trace.set(stream=params.stream, **info)
+            done["trace"] = trace.emit(log=TRACE_ENABLED)
+            if METRICS_PORT:
+                metrics.observe_request(done["trace"], ok)
+        yield done
+
+    def _remember(self, answer_key, semantic_params, qctx, answer, sources, hits):
+        if self.answer_cache:
+            self.answer_cache.set(answer_key, {"answer": answer, "sources": sources})
+        if self.semantic_cache:
+            self.semantic_cache.add(qctx.vec, semantic_params, answer, sources,
+                                    {h["_id"]: h.get("sha256") for h in hits})
+
+    async def aanswer(self, question: str, params: AnswerParams | None = None) -> dict:
+        """Non-streaming answer: the final done event."""
+        async for event in self.astream(question, params):
+            if event["event"] == "done":
+                return event
+
+    def info(self) -> dict:
+        """What the sidebar shows about the loaded index."""
+        return {
+            "documents": self.dense.count(),
+            "dense_backend": self.dense.name,
+            "inference_backend": backend_name(self.model),
+            "collection": "msads_e5",
+            "warnings": list(self.warnings),
+        }
+
+    def stats(self) -> dict:
+        """Cache and reranker counters."""
+        out = {"reranker_error": pipeline.reranker_error, "reranker": reranker_service().stats()}
+        if self.answer_cache:
+            out["retrieval"] = self.retrieval_cache.stats()
+            out["answer"] = self.answer_cache.stats()
+        if self.semantic_cache:
+            out["semantic"] = self.semantic_cache.stats()
+        return out
+
@@ -0,0 +1,319 @@
+"""Parallel extraction and chunking of crawled HTML (the parsing half of scraper.ipynb).
+
+Saved pages (``msads_data/html/``, written by ``askads.crawler``) are parsed
+by a ``ProcessPoolExecutor``, one page per task, so re-extracting from the
+local HTML cache needs no network and scales with cores.  Each page is
+parsed with BeautifulSoup once; title, section/type, date and person fields
+are read before the main-text heuristics strip the page chrome.
+
+Results are streamed to JSONL in crawl order as they come back (a bounded
+window of pages in flight keeps memory flat), instead of building the
+notebook's ``df_raw`` / ``df_chunks`` DataFrames: every page's raw record
+goes to ``raw_pages.jsonl`` and its chunks to ``chunks.jsonl``, the input of
+``askads.indexer``.
+
+    python -m askads.extract --html msads_data/html --workers 8
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import urllib.parse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+from askads.config import CHUNKS_PATH, CRAWL_STATE_PATH, HTML_DIR, RAW_PAGES_PATH
+from askads.crawler import load_state, page_file
+
+try:
+    import trafilatura
+except ImportError:  # optional; the BeautifulSoup heuristics are used without it
+    trafilatura = None
+
+logger = logging.getLogger(__name__)
+
+CHUNK_TARGET = 1600
+CHUNK_OVERLAP = 200
+MIN_PAGE_WORDS = 50
+
+
+def sha256(s: str) -> str:
+    return hashlib.sha256(s.encode("utf-8")).hexdigest()
+
+
+def _clean_ws(text: str) -> str:
+    text = re.sub(r"[ \t]+", " ", text)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip()
+
+
+def extract_main_text(url: str, html: str, soup: BeautifulSoup | None = None) -> str:
+    """Main page text: trafilatura if installed, else <p>/<li> text minus the page chrome (mutates soup)."""
+    if trafilatura is not None:
+        try:
+            x = trafilatura.extract(html, include_links=False, include_comments=False, url=url, favor_precision=True)
+            if x and len(x.strip()) > 200:
+                return _clean_ws(x)
+        except Exception:
+            pass
+    soup = soup if soup is not None else BeautifulSoup(html, "lxml")
+    for t in soup.select("script,style,noscript,header,footer,nav,aside"):
+        t.decompose()
+    main = soup.select_one("main") or soup.select_one("article") or soup.body or soup
+    text = "\n".join(
+        el.get_text(" ", strip=True)
+        for el in main.find_all(["p", "li"])
+        if el.get_text(strip=True)
+    )
+    return _clean_ws(text)
+
+
+def get_title_h1_section_type(url: str, soup: BeautifulSoup) -> tuple[str, str, str, str]:
+    """(title tag, h1 text, section, type), the last two from URL patterns."""
+    title_tag = (soup.title.string.strip() if soup.title and soup.title.string else "")
+    h1 = ""
+    h1_el = soup.find("h1")
+    if h1_el:
+        h1 = h1_el.get_text(" ", strip=True)
+
+    segs = [s for s in urllib.parse.urlparse(url).path.split("/") if s]
+    section = segs[0] if segs else "root"
+
+    t = "generic"
+    if len(segs) >= 2 and segs[0] == "people":
+        t = "person"
+    elif len(segs) >= 3 and segs[0] == "news-events" and segs[1] == "news":
+        t = "news"
+    elif len(segs) >= 3 and segs[0] == "news-events" and segs[1] == "events":
+        t = "event"
+    elif len(segs) >= 3 and segs[0] == "news-events" and segs[1] == "insights":
+        t = "insight"
+    return title_tag, h1, section, t
+
+
+def _parse_date_fuzzy(s: str) -> str | None:
+    s = s.strip()
+    for fmt in ("%B %d, %Y", "%b %d, %Y", "%Y-%m-%d", "%m/%d/%Y"):
+        try:
+            return datetime.strptime(s, fmt).isoformat()
+        except ValueError:
+            pass
+    m = re.search(r"\d{4}-\d{2}-\d{2}", s)
+    if m:
+        try:
+            return datetime.strptime(m.group(0), "%Y-%m-%d").isoformat()
+        except ValueError:
+            pass
+    return None
+
+
+def extract_date(soup: BeautifulSoup) -> str:
+    """A visible <time> or meta publication date as an ISO string, or ''."""
+    for t in soup.find_all("time"):
+        if t.get("datetime"):
+            try:
+                return datetime.fromisoformat(t["datetime"].replace("Z", "+00:00")).isoformat()
+            except ValueError:
+                pass
+        iso = _parse_date_fuzzy(t.get_text(" ", strip=True))
+        if iso:
+            return iso
+    meta_sel = [
+        ('meta[property="article:published_time"]', "content"),
+        ('meta[name="date"]', "content"),
+        ('meta[itemprop="datePublished"]', "content"),
+        ('meta[name="pubdate"]', "content"),
+        ('meta[name="publishdate"]', "content"),
+    ]
+    for sel, key in meta_sel:
+        m = soup.select_one(sel)
+        if m and m.get(key):
+            iso = _parse_date_fuzzy(m[key])
+            if iso:
+                return iso
+    return ""
+
+
+def extract_person_fields(soup: BeautifulSoup) -> dict:
+    """Best-effort role (first short line after the h1) and email of a people page."""
+    role = ""
+    email = ""
+    h1 = soup.find("h1")
+    if h1:
+        sib_texts = []
+        for sib in h1.find_all_next(["p", "div", "span"], limit=6):
+            txt = sib.get_text(" ", strip=True)
+            if txt and len(txt) < 200:
+                sib_texts.append(txt)
+        if sib_texts:
+            role = sib_texts[0]
+    a = soup.find("a", href=re.compile(r"^mailto:", re.I))
+    if a:
+        email = a.get_text(" ", strip=True) or a.get("href", "").replace("mailto:", "")
+    return {"role": role, "email": email}
+
+
+def chunk_text(text: str, target: int = CHUNK_TARGET, overlap: int = CHUNK_OVERLAP) -> list[str]:
+    """Windows of about target characters, cut at a sentence end when one is near."""
+    text = re.sub(r"\s+", " ", text).strip()
+    n = len(text)
+    i, chunks = 0, []
+    while i < n:
+        j = min(i + target, n)
+        window = text[i:j]
+        k = window.rfind(". ")
+        if k != -1 and (j - (i + k)) < 300:
+            j = i + k + 1
+        chunks.append(text[i:j].strip())
+        # As in the notebook, max() means windows never actually overlap
+        i = max(j - overlap, j)
+    return [c for c in chunks if c]
+
+
+def extract_page(url: str, html: str, fetched_at: str = "") -> tuple[dict, list[dict]]:
+    """(raw page record, chunk records) for one page, with the notebook's fields."""
+    soup = BeautifulSoup(html, "lxml")
+    title_tag, h1, section, ptype = get_title_h1_section_type(url, soup)
+    date_iso = extract_date(soup) if ptype in ("news", "event", "insight") else ""
+    extra = extract_person_fields(soup) if ptype == "person" else {}
+    # Last: the fallback strips the page chrome out of soup
+    text = extract_main_text(url, html, soup)
+
+    raw = {
+        "url": url,
+        "title": title_tag,
+        "h1": h1,
+        "section": section,
+        "type": ptype,
+        "date": date_iso,
+        "text": text,
+        "extra": extra,
+        "word_count": len(text.split()) if text else 0,
+        "fetched_at": fetched_at,
+    }
+    chunks = []
+    if text and len(text.split()) >= MIN_PAGE_WORDS:
+        page_hash = sha256(url)[:10]
+        for idx, ch in enumerate(chunk_text(text)):
+            chunks.append({
+                "id": f"{page_hash}-{idx:04d}",
+                "url": url,
+                "title": h1 or title_tag,
+                "section": section,
+                "type": ptype,
+                "date": date_iso,
+                "chunk_id": idx,
+                "text": ch,
+                "sha256": sha256(ch),
+            })
+    return raw, chunks
+
+
+def _extract_file(job: tuple[str, str, str]):
+    """Worker task: (url, path, fetched_at) -> (url, raw, chunks, error)."""
+    url, path, fetched_at = job
+    try:
+        html = Path(path).read_text(encoding="utf-8", errors="replace")
+        raw, chunks = extract_page(url, html, fetched_at)
+        return url, raw, chunks, None
+    except Exception as e:
+        return url, None, [], f"{type(e).__name__}: {e}"
+
+
+def list_pages(html_dir: Path, state_path: Path | None = CRAWL_STATE_PATH) -> list[tuple[str, str, str]]:
+    """(url, file, fetched_at) for every saved page: crawl order first, then other files by name."""
+    html_dir = Path(html_dir)
+    jobs, seen = [], set()
+    for url, rec in (load_state(state_path) if state_path else {}).items():
+        path = page_file(html_dir, url)
+        if path.exists():
+            jobs.append((url, str(path), rec.get("fetched_at", "")))
+            seen.add(path.name)
+    for path in sorted(html_dir.glob("*.html")):
+        if path.name in seen:
+            continue
+        url = urllib.parse.unquote(path.name[:-len(".html")])
+        if not url.startswith(("http://", "https://")):
+            # Hash-suffixed names cannot be mapped back without the crawl state
+            continue
+        mtime = datetime.fromtimestamp(path.stat().st_mtime, timezone.utc).isoformat()
+        jobs.append((url, str(path), mtime))
+    return jobs
+
+
+def _in_order(pool, fn, jobs, window: int):
+    """pool.map that keeps at most window tasks in flight, so results never pile up."""
+    pending = deque()
+    for job in jobs:
+        pending.append(pool.submit(fn, job))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def extract_all(jobs: list[tuple[str, str, str]], raw_path: Path = RAW_PAGES_PATH, chunks_path: Path = CHUNKS_PATH,
+                workers: int | None = None) -> dict:
+    """Extract every page across worker processes, streaming both JSONL files; returns a report."""
+    if not jobs:
+        raise ValueError("No saved pages to extract")
+    t0 = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    raw_path, chunks_path = Path(raw_path), Path(chunks_path)
+    raw_path.parent.mkdir(parents=True, exist_ok=True)
+    chunks_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_raw = raw_path.with_name(raw_path.name + ".tmp")
+    tmp_chunks = chunks_path.with_name(chunks_path.name + ".tmp")
+    report = {"pages": 0, "chunks": 0, "errors": 0, "workers": workers}
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    done = False
+    try:
+        results = _in_order(pool, _extract_file, jobs, workers * 4) if pool else map(_extract_file, jobs)
+        with open(tmp_raw, "w", encoding="utf-8") as fr, open(tmp_chunks, "w", encoding="utf-8") as fc:
+            for url, raw, chunks, error in results:
+                if error:
+                    report["errors"] += 1
+                    logger.warning("Skipping %s: %s", url, error)
+                    continue
+                fr.write(json.dumps(raw, ensure_ascii=False) + "\n")
+                for c in chunks:
+                    fc.write(json.dumps(c, ensure_ascii=False) + "\n")
+                report["pages"] += 1
+                report["chunks"] += len(chunks)
+        # Swap in only complete files, so the indexer never sees a half-written scrape
+        os.replace(tmp_raw, raw_path)
+        os.replace(tmp_chunks, chunks_path)
+        done = True
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+        if not done:
+            # A crashed worker (BrokenProcessPool) or any other error leaves no partial files behind
+            for tmp in (tmp_raw, tmp_chunks):
+                tmp.unlink(missing_ok=True)
+    report["seconds"] = round(time.perf_counter() - t0, 2)
+    return report
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Extract and chunk crawled HTML into raw_pages.jsonl and chunks.jsonl.")
+    ap.add_argument("--html", type=Path, default=HTML_DIR)
+    ap.add_argument("--state", type=Path, default=CRAWL_STATE_PATH, help="crawl state, for URLs and crawl order")
+    ap.add_argument("--raw-out", type=Path, default=RAW_PAGES_PATH)
+    ap.add_argument("--chunks-out", type=Path, default=CHUNKS_PATH)
+    ap.add_argument("--workers", type=int, default=None, help="processes (default: all cores; 1 runs inline)")
+    args = ap.parse_args(argv)
+    jobs = list_pages(args.html, args.state)
+    print(json.dumps(extract_all(jobs, args.raw_out, args.chunks_out, args.workers)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""Incremental index refresh from the scraped chunks (replaces the notebook's rebuild).
+
+Incoming chunks (``data_dsi/chunks.jsonl``) are cleaned the way ``RAG BOT.ipynb``
+did it (text longer than 180 characters, duplicate texts dropped) and diffed
+against ``meta.jsonl`` by id and ``sha256``.  Only new or changed chunks are
+embedded, in large batches; unchanged chunks keep their stored FAISS
+vectors.  The stores are then updated together:
+
+- FAISS flat index and ``meta.jsonl``: rewritten with rows in the new chunk
+  order (temp files, then replaced back to back);
+- Chroma: upserts with the precomputed vectors and deletes, diffed against
+  the ``sha256`` stored in its own metadata, so it converges even after an
+  interrupted run;
+- sparse index: refit (TF-IDF document-frequency cuts are corpus-wide, and
+  no embeddings are involved);
+- metadata store: rebuilt from ``meta.jsonl`` (cheap, no embeddings);
+- sentence index: refreshed, re-encoding only changed chunks;
+- index bundle: repacked from the stores above (``askads.bundle``).
+
+With no changes nothing is written.  The run prints a JSON report of the
+work done and skipped.
+
+    python -m askads.indexer --chunks data_dsi/chunks.jsonl --dry-run
+    python -m askads.indexer --chunks data_dsi/chunks.jsonl
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+from askads.config import (
+    BUNDLE_PATH, CHROMA_DIR, CHUNKS_PATH, EMBED_MODEL_NAME, FAISS_PATH, META_PATH, META_STORE_DIR, SENT_INDEX_DIR,
+    SPARSE_INDEX_DIR,
+)
+from askads.bundle import build_bundle
+from askads.corpus import iter_meta
+from askads.dense import read_flat_faiss, write_flat_faiss
+from askads.meta_store import build_meta_store
+from askads.sentence_index import INDEX_FILE as SENT_INDEX_FILE
+from askads.sentence_index import build_sentence_index
+from askads.sparse_index import build_sparse_index
+
+MIN_TEXT_CHARS = 180
+META_FIELDS = ("id", "url", "title", "section", "type", "date")
+CHROMA_META_FIELDS = ("url", "title", "section", "type", "date", "sha256")
+
+
+def load_chunks(path: Path) -> list[dict]:
+    """Chunks worth indexing, in file order: long enough, first occurrence of each text."""
+    chunks, seen_text, seen_id = [], set(), set()
+    for c in iter_meta(path):
+        text = (c.get("text") or "").strip()
+        if len(text) <= MIN_TEXT_CHARS or text in seen_text or c.get("id") in seen_id:
+            continue
+        seen_text.add(text)
+        seen_id.add(c.get("id"))
+        for field in META_FIELDS:
+            c.setdefault(field, "")
+        c["id"] = str(c["id"])
+        if not c.get("sha256"):
+            c["sha256"] = hashlib.sha256(c.get("text", "").encode("utf-8")).hexdigest()
+        chunks.append(c)
+    return chunks
+
+
+def diff_chunks(old: list[dict], new: list[dict]) -> dict:
+    """Ids of added, changed, unchanged and removed chunks (by id, then sha256)."""
+    old_sha = {m["id"]: m.get("sha256") for m in old}
+    new_ids = {c["id"] for c in new}
+    out = {"added": [], "changed": [], "unchanged": [],
+           "removed": [m["id"] for m in old if m["id"] not in new_ids]}
+    for c in new:
+        if c["id"] not in old_sha:
+            out["added"].append(c["id"])
+        elif old_sha[c["id"]] != c["sha256"]:
+            out["changed"].append(c["id"])
+        else:
+            out["unchanged"].append(c["id"])
+    return out
+
+
+def stored_vectors(meta_path: Path, faiss_path: Path):
+    """(old meta, {id: FAISS row}, vectors) for the current index; empty if it is missing or misaligned."""
+    old = list(iter_meta(meta_path)) if meta_path.exists() else []
+    if not old or not faiss_path.exists():
+        return old, {}, None
+    try:
+        vectors = read_flat_faiss(faiss_path)
+    except (OSError, ValueError):
+        return old, {}, None
+    if vectors.shape[0] != len(old):
+        return old, {}, None
+    return old, {m["id"]: i for i, m in enumerate(old)}, vectors
+
+
+def embed_passages(model, texts: list[str], batch_size: int) -> np.ndarray:
+    return model.encode(["passage: " + t for t in texts], batch_size=batch_size,
+                        normalize_embeddings=True, convert_to_numpy=True).astype(np.float32)
+
+
+def write_index_files(chunks: list[dict], vectors: np.ndarray, meta_path: Path, faiss_path: Path):
+    """Write FAISS and meta.jsonl via temp files, then swap both in (rows stay aligned)."""
+    tmp_faiss = faiss_path.with_name(faiss_path.name + ".tmp")
+    tmp_meta = meta_path.with_name(meta_path.name + ".tmp")
+    write_flat_faiss(tmp_faiss, vectors)
+    with open(tmp_meta, "w", encoding="utf-8") as f:
+        for c in chunks:
+            f.write(json.dumps(c, ensure_ascii=False) + "\n")
+    os.replace(tmp_faiss, faiss_path)
+    os.replace(tmp_meta, meta_path)
+
+
+def sync_chroma(collection, chunks: list[dict], vectors: np.ndarray, batch_size: int) -> dict:
+    """Upsert chunks whose id/sha256 Chroma lacks and delete ids no longer present."""
+    got = collection.get(include=["metadatas"])
+    metas = got.get("metadatas") or [None] * len(got["ids"])
+    have = {did: (m or {}).get("sha256") for did, m in zip(got["ids"], metas)}
+    todo = [i for i, c in enumerate(chunks) if have.get(c["id"]) != c["sha256"]]
+    keep = {c["id"] for c in chunks}
+    stale = [did for did in have if did not in keep]
+    for s in range(0, len(todo), batch_size):
+        rows = todo[s:s + batch_size]
+        collection.upsert(
+            ids=[chunks[i]["id"] for i in rows],
+            embeddings=vectors[rows].tolist(),
+            documents=[chunks[i].get("text", "") for i in rows],
+            metadatas=[{f: str(chunks[i].get(f, "")) for f in CHROMA_META_FIELDS} for i in rows],
+        )
+    for s in range(0, len(stale), batch_size):
+        collection.delete(ids=stale[s:s + batch_size])
+    return {"upserted": len(todo), "deleted": len(stale), "skipped": len(chunks) - len(todo)}
+
+
+def open_collection(chroma_dir: Path, model):
+    import chromadb
+
+    from askads.resources import E5Embedder
+
+    chroma_dir.mkdir(parents=True, exist_ok=True)
+    client = chromadb.PersistentClient(path=str(chroma_dir))
+    return client.get_or_create_collection(
+        name="msads_e5",
+        metadata={"hnsw:space": "cosine"},
+        embedding_function=E5Embedder(model)
+    )
+
+
+def refresh_index(chunks_path: Path = CHUNKS_PATH, model=None, model_name: str = EMBED_MODEL_NAME,
+                  meta_path: Path = META_PATH, faiss_path: Path = FAISS_PATH, chroma_dir: Path | None = CHROMA_DIR,
+                  sparse_dir: Path = SPARSE_INDEX_DIR, meta_store_dir: Path = META_STORE_DIR,
+                  sent_dir: Path | None = SENT_INDEX_DIR, bundle_path: Path | None = BUNDLE_PATH,
+                  batch_size: int = 256, dry_run: bool = False) -> dict:
+    """Bring every index store in line with chunks_path; returns a report of work done and skipped."""
+    t0 = time.perf_counter()
+    chunks = load_chunks(chunks_path)
+    if not chunks:
+        # Never let an empty or truncated scrape wipe the index
+        raise ValueError(f"No indexable chunks in {chunks_path}")
+    old, old_row, old_vectors = stored_vectors(meta_path, faiss_path)
+    diff = diff_chunks(old, chunks)
+    changed = (old_vectors is None or bool(diff["added"] or diff["changed"] or diff["removed"])
+               or [m["id"] for m in old] != [c["id"] for c in chunks])
+    rebuild_sentences = sent_dir is not None and (changed or not (Path(sent_dir) / SENT_INDEX_FILE).exists())
+    reusable = set(diff["unchanged"]) if old_vectors is not None else set()
+    to_embed = [i for i, c in enumerate(chunks) if c["id"] not in reusable]
+    report = {
+        "chunks": len(chunks),
+        **{k: len(v) for k, v in diff.items()},
+        "embedded": len(to_embed),
+        "reused_vectors": len(chunks) - len(to_embed),
+        "skipped_embedding_pct": round(100.0 * (len(chunks) - len(to_embed)) / max(1, len(chunks)), 1),
+        "index_files": "rewritten" if changed else "unchanged",
+    }
+    if dry_run:
+        report["dry_run"] = True
+        return report
+    if model is None and (to_embed or rebuild_sentences):
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(model_name)
+
+    dim = old_vectors.shape[1] if old_vectors is not None else model.get_sentence_embedding_dimension()
+    vectors = np.zeros((len(chunks), dim), dtype=np.float32)
+    if reusable:
+        dst = [i for i, c in enumerate(chunks) if c["id"] in reusable]
+        vectors[dst] = old_vectors[[old_row[chunks[i]["id"]] for i in dst]]
+    if to_embed:
+        vectors[to_embed] = embed_passages(model, [chunks[i].get("text", "") for i in to_embed], batch_size)
+    del old_vectors
+
+    if changed:
+        meta_path.parent.mkdir(parents=True, exist_ok=True)
+        write_index_files(chunks, vectors, meta_path, faiss_path)
+        report["sparse"] = build_sparse_index(meta_path, sparse_dir)
+        report["meta_store"] = build_meta_store(meta_path, meta_store_dir)
+    else:
+        report["sparse"] = report["meta_store"] = "unchanged"
+    if chroma_dir is not None:
+        # Vectors are always passed in, so the collection's embedding function is never called
+        report["chroma"] = sync_chroma(open_collection(chroma_dir, model), chunks, vectors, batch_size)
+    if rebuild_sentences:
+        report["sentences"] = build_sentence_index(meta_path, sent_dir, model, model_name, batch_size=batch_size)
+    elif sent_dir is not None:
+        report["sentences"] = "unchanged"
+    if bundle_path is not None and (changed or rebuild_sentences or not Path(bundle_path).exists()):
+        report["bundle"] = build_bundle(bundle_path, meta_path, faiss_path, sparse_dir, sent_dir, model_name)
+    elif bundle_path is not None:
+        report["bundle"] = "unchanged"
+    report["seconds"] = round(time.perf_counter() - t0, 2)
+    return report
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Incrementally refresh the RAG index from chunks.jsonl.")
+    ap.add_argument("--chunks", type=Path, default=CHUNKS_PATH)
+    ap.add_argument("--model", default=EMBED_MODEL_NAME)
+    ap.add_argument("--batch-size", type=int, default=256)
+    ap.add_argument("--no-chroma", action="store_true", help="leave the Chroma collection alone")
+    ap.add_argument("--no-sentences", action="store_true", help="leave the sentence index alone")
+    ap.add_argument("--no-bundle", action="store_true", help="do not repack the index bundle")
+    ap.add_argument("--dry-run", action="store_true", help="only report the diff")
+    args = ap.parse_args(argv)
+    report = refresh_index(args.chunks, model_name=args.model, batch_size=args.batch_size,
+                           chroma_dir=None if args.no_chroma else CHROMA_DIR,
+                           sent_dir=None if args.no_sentences else SENT_INDEX_DIR,
+                           bundle_path=None if args.no_bundle else BUNDLE_PATH, dry_run=args.dry_run)
+    print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main()
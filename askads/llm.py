@@ -0,0 +1,114 @@
+"""Helpers for OpenAI chat completions, plus a local fake client for tests and offline runs."""
+import asyncio
+import time
+from types import SimpleNamespace
+
+
+def iter_stream_text(stream, on_usage=None):
+    """Yield the non-empty text deltas of a streaming chat completion.
+
+    With ``stream_options={"include_usage": True}`` the last chunk carries
+    token usage; it is passed to ``on_usage``.
+    """
+    for chunk in stream:
+        usage = getattr(chunk, "usage", None)
+        if usage is not None and on_usage is not None:
+            on_usage(usage)
+        choices = getattr(chunk, "choices", None) or []
+        if not choices:
+            continue  # e.g. the trailing usage-only chunk
+        text = getattr(choices[0].delta, "content", None)
+        if text:
+            yield text
+
+
+async def aiter_stream_text(stream, on_usage=None):
+    """Async variant of iter_stream_text for AsyncOpenAI streams."""
+    async for chunk in stream:
+        usage = getattr(chunk, "usage", None)
+        if usage is not None and on_usage is not None:
+            on_usage(usage)
+        choices = getattr(chunk, "choices", None) or []
+        if not choices:
+            continue
+        text = getattr(choices[0].delta, "content", None)
+        if text:
+            yield text
+
+
+def _wants_usage(kwargs) -> bool:
+    return bool((kwargs.get("stream_options") or {}).get("include_usage"))
+
+
+class FakeChatClient:
+    """Stand-in for ``openai.OpenAI`` that answers locally, with or without streaming.
+
+    ``answer`` may be a string or a callable ``messages -> str``; streaming
+    splits it into word-sized chunks emitted ``delay`` seconds apart.
+    """
+
+    def __init__(self, answer="This is a stubbed answer [1].", delay: float = 0.0):
+        self.answer = answer
+        self.delay = delay
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _text(self, messages) -> str:
+        return self.answer(messages) if callable(self.answer) else self.answer
+
+    def _create(self, model: str, messages: list, temperature: float = 0.0, stream: bool = False, **kwargs):
+        self.calls.append({"model": model, "messages": messages, "temperature": temperature, "stream": stream})
+        text = self._text(messages)
+        if not stream:
+            message = SimpleNamespace(role="assistant", content=text)
+            return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason="stop")],
+                                   usage=self._usage(messages, text))
+        return self._stream(text, self._usage(messages, text) if _wants_usage(kwargs) else None)
+
+    @staticmethod
+    def _usage(messages, text: str):
+        """Whitespace token counts in the shape of ``CompletionUsage``."""
+        prompt = sum(len(m["content"].split()) for m in messages)
+        completion = len(text.split())
+        return SimpleNamespace(prompt_tokens=prompt, completion_tokens=completion, total_tokens=prompt + completion)
+
+    @staticmethod
+    def _stream_chunks(text: str, usage=None):
+        """OpenAI-shaped streaming chunks, one per word, plus a usage-only chunk if requested."""
+        for i, w in enumerate(text.split(" ")):
+            piece = w if i == 0 else " " + w
+            delta = SimpleNamespace(role="assistant" if i == 0 else None, content=piece)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=None)], usage=None)
+        if usage is not None:
+            yield SimpleNamespace(choices=[], usage=usage)
+
+    def _stream(self, text: str, usage=None):
+        for chunk in self._stream_chunks(text, usage):
+            if self.delay:
+                time.sleep(self.delay)
+            yield chunk
+
+
+class FakeAsyncChatClient(FakeChatClient):
+    """Stand-in for ``openai.AsyncOpenAI`` built on FakeChatClient."""
+
+    def __init__(self, answer="This is a stubbed answer [1].", delay: float = 0.0):
+        super().__init__(answer, delay)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._acreate))
+        self.models = SimpleNamespace(retrieve=self._aretrieve)
+
+    async def _aretrieve(self, model: str):
+        return SimpleNamespace(id=model)
+
+    async def _acreate(self, model: str, messages: list, temperature: float = 0.0, stream: bool = False, **kwargs):
+        if not stream:
+            return self._create(model, messages, temperature, stream=False, **kwargs)
+        self.calls.append({"model": model, "messages": messages, "temperature": temperature, "stream": True})
+        text = self._text(messages)
+        return self._astream(text, self._usage(messages, text) if _wants_usage(kwargs) else None)
+
+    async def _astream(self, text: str, usage=None):
+        for chunk in self._stream_chunks(text, usage):
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            yield chunk
@@ -0,0 +1,216 @@
+"""Columnar chunk metadata, persisted next to meta.jsonl and memory-mapped at load time.
+
+Loading meta.jsonl used to keep every chunk as a dict (several times the
+file size in RSS, growing with the corpus).  Here all field values except
+the text go into one shared table of distinct values (a page's url, title,
+section and type are stored once, not once per chunk), and each row is a
+line of int32 codes into it.  Chunk texts are concatenated into one UTF-8
+blob that is memory-mapped and sliced by an offset index, so a text is only
+decoded when a hit is returned.
+
+``MetaStore`` maps chunk id to a ``MetaRecord``, a read-only mapping that
+is built on lookup and resolves fields on access; ``dict(record)`` gives
+the dict ``load_index`` used to return (``text`` and ``_id`` included).
+Like the sparse index, ``store.json`` records the fingerprint of the
+meta.jsonl the store was built from, and a stale store is rebuilt.
+
+    python -m askads.meta_store --meta rag_index/meta.jsonl --out rag_index/meta_store
+"""
+import argparse
+import json
+import os
+import uuid
+from collections.abc import Mapping
+from pathlib import Path
+
+import numpy as np
+
+from askads.config import META_PATH, META_STORE_DIR
+from askads.corpus import iter_meta, meta_fingerprint
+
+STORE_VERSION = 1
+STORE_FILE = "store.json"
+TEXTS_FILE = "texts.bin"
+ABSENT = -1
+
+
+class MetaRecord(Mapping):
+    """One chunk's metadata, read from the store's columns on access."""
+    __slots__ = ("_store", "_row")
+
+    def __init__(self, store: "MetaStore", row: int):
+        self._store = store
+        self._row = row
+
+    def __getitem__(self, field):
+        return self._store.value(self._row, field)
+
+    def __iter__(self):
+        codes = self._store.codes[self._row]
+        return (f for f, c in zip(self._store.fields, codes) if c != ABSENT or f == "text")
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"MetaRecord({dict(self)!r})"
+
+
+class MetaStore(Mapping):
+    """Chunk id -> MetaRecord over dictionary-encoded columns and a text blob."""
+
+    def __init__(self, fields: list[str], values: list, codes: np.ndarray, offsets: np.ndarray, texts):
+        self.fields = list(fields)
+        self.values = values
+        self.codes = codes
+        self.offsets = offsets
+        self.texts = texts
+        self._col = {f: i for i, f in enumerate(self.fields)}
+        id_col = self.codes[:, self._col["_id"]] if len(self.codes) else []
+        self.ids = [values[c] for c in id_col]
+        self._rows = {did: i for i, did in enumerate(self.ids)}
+
+    # Mapping over ids
+    def __getitem__(self, did):
+        return MetaRecord(self, self._rows[did])
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, did):
+        return did in self._rows
+
+    def record(self, row: int) -> MetaRecord:
+        return MetaRecord(self, row)
+
+    def records(self):
+        """Records in meta.jsonl order."""
+        return (MetaRecord(self, r) for r in range(len(self.ids)))
+
+    def text(self, row: int) -> str:
+        a, b = int(self.offsets[row]), int(self.offsets[row + 1])
+        return bytes(self.texts[a:b]).decode("utf-8")
+
+    def value(self, row: int, field: str):
+        if field == "text":
+            return self.text(row)
+        col = self._col.get(field)
+        code = ABSENT if col is None else self.codes[row, col]
+        if code == ABSENT:
+            raise KeyError(field)
+        return self.values[code]
+
+    @classmethod
+    def from_records(cls, records) -> "MetaStore":
+        """Encode metadata dicts (streamed) into an in-memory store."""
+        fields, col, values, index = [], {}, [], {}
+        rows, blob, offsets = [], bytearray(), [0]
+        for m in records:
+            m = dict(m)
+            m["_id"] = m.get("_id") or m.get("id") or str(uuid.uuid4())
+            blob += (m.get("text") or "").encode("utf-8")
+            offsets.append(len(blob))
+            row = [ABSENT] * len(fields)
+            for f, v in m.items():
+                if f not in col:
+                    col[f] = len(fields)
+                    fields.append(f)
+                    row.append(ABSENT)
+                if f == "text":
+                    continue  # in the blob
+                # Keyed by JSON so 1, 1.0 and True stay distinct values
+                key = json.dumps(v, ensure_ascii=False, sort_keys=True)
+                code = index.get(key)
+                if code is None:
+                    code = index[key] = len(values)
+                    values.append(v)
+                row[col[f]] = code
+            rows.append(row)
+        codes = np.full((len(rows), len(fields)), ABSENT, dtype=np.int32)
+        for r, row in enumerate(rows):
+            codes[r, :len(row)] = row
+        # Field order of load_index's dicts: meta.jsonl fields, "text" (appended if missing), then "_id"
+        order = [f for f in fields if f != "_id"] + ([] if "text" in col else ["text"]) + ["_id"]
+        codes = np.stack([codes[:, col[f]] if f in col else np.full(len(rows), ABSENT, np.int32)
+                          for f in order], axis=1) if rows else np.zeros((0, len(order)), np.int32)
+        return cls(order, values, codes, np.asarray(offsets, dtype=np.int64),
+                   np.frombuffer(bytes(blob), dtype=np.uint8))
+
+    def save(self, out_dir: Path, fingerprint: str):
+        """Write the columns, offsets and text blob to out_dir."""
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        np.save(out_dir / "codes.npy", np.ascontiguousarray(self.codes))
+        np.save(out_dir / "offsets.npy", np.asarray(self.offsets))
+        with open(out_dir / TEXTS_FILE, "wb") as f:
+            f.write(bytes(self.texts))
+        info = {"version": STORE_VERSION, "fingerprint": fingerprint, "rows": len(self.ids),
+                "fields": self.fields, "values": self.values}
+        tmp = out_dir / (STORE_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(info, f, ensure_ascii=False)
+        # The json is written last, so a reader never pairs it with old arrays
+        os.replace(tmp, out_dir / STORE_FILE)
+
+    @classmethod
+    def open(cls, out_dir: Path, fingerprint: str | None = None) -> "MetaStore | None":
+        """The store in out_dir, memory-mapped; None if missing, stale or unreadable."""
+        out_dir = Path(out_dir)
+        try:
+            with open(out_dir / STORE_FILE, "r", encoding="utf-8") as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if info.get("version") != STORE_VERSION:
+            return None
+        if fingerprint is not None and info.get("fingerprint") != fingerprint:
+            return None
+        try:
+            codes = np.load(out_dir / "codes.npy", mmap_mode="r")
+            offsets = np.load(out_dir / "offsets.npy", mmap_mode="r")
+            size = (out_dir / TEXTS_FILE).stat().st_size
+            # np.memmap refuses empty files
+            texts = np.memmap(out_dir / TEXTS_FILE, dtype=np.uint8, mode="r") if size else np.zeros(0, np.uint8)
+        except (OSError, ValueError):
+            return None
+        if codes.shape != (info["rows"], len(info["fields"])) or len(offsets) != info["rows"] + 1:
+            return None
+        return cls(info["fields"], info["values"], codes, offsets, texts)
+
+
+def load_meta_store(out_dir: Path, meta_path: Path) -> MetaStore:
+    """Open the store for meta_path, rebuilding it first if missing or stale."""
+    fingerprint = meta_fingerprint(meta_path)
+    found = MetaStore.open(out_dir, fingerprint)
+    if found is not None:
+        return found
+    store = MetaStore.from_records(iter_meta(meta_path))
+    try:
+        store.save(out_dir, fingerprint)
+    except OSError:
+        return store  # read-only deploy: keep the freshly built store in memory
+    return MetaStore.open(out_dir, fingerprint) or store
+
+
+def build_meta_store(meta_path: Path, out_dir: Path) -> dict:
+    """Build and persist the metadata store for meta_path."""
+    fingerprint = meta_fingerprint(meta_path)
+    store = MetaStore.from_records(iter_meta(meta_path))
+    store.save(out_dir, fingerprint)
+    return {"rows": len(store), "fields": len(store.fields), "values": len(store.values),
+            "text_bytes": int(len(store.texts)), "fingerprint": fingerprint}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Build the columnar metadata store for meta.jsonl.")
+    ap.add_argument("--meta", type=Path, default=META_PATH)
+    ap.add_argument("--out", type=Path, default=META_STORE_DIR)
+    args = ap.parse_args(argv)
+    print(json.dumps(build_meta_store(args.meta, args.out)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Process-wide counters and histograms in the Prometheus text exposition format.
+
+A small in-process registry (no client library needed) plus a sidecar HTTP
+thread serving ``/metrics``.  Chat turns are recorded from their trace
+(``observe_request``); the reranker and pipeline bump their own counters.
+
+    curl -s localhost:9464/metrics
+"""
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _num(v: float) -> str:
+    return repr(float(v)) if v != float("inf") else "+Inf"
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, n: float = 1, **labels):
+        key = tuple(labels.get(k, "") for k in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + n
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(labels.get(k, "") for k in self.labelnames), 0.0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, v in items:
+            yield f"{self.name}{_labels(self.labelnames, key)} {_num(v)}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram with _sum and _count, optionally split by labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(k, "") for k in self.labelnames)
+        with self._lock:
+            counts, total = self._series.get(key, ([0] * len(self.buckets), 0.0))
+            for i, upper in enumerate(self.buckets):
+                if value <= upper:
+                    counts[i] += 1
+                    break
+            self._series[key] = (counts, total + value)
+
+    def samples(self):
+        with self._lock:
+            items = sorted((k, (list(c), s)) for k, (c, s) in self._series.items())
+        for key, (counts, total) in items:
+            running = 0
+            for upper, c in zip(self.buckets, counts):
+                running += c
+                le = f'le="{_num(upper)}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, key, [le])} {running}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {_num(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {running}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for m in self._metrics:
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            lines.extend(m.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+REQUESTS = REGISTRY.register(Counter("askads_requests_total", "Chat turns handled", ["outcome"]))
+CACHE_HITS = REGISTRY.register(Counter("askads_cache_hits_total", "Chat turns served from a cache", ["cache"]))
+FALLBACKS = REGISTRY.register(Counter("askads_fallback_total", "Chat turns answered from the augmented-query fallback"))
+RERANKER_LOAD_FAILURES = REGISTRY.register(Counter("askads_reranker_load_failures_total", "Failed cross-encoder loads"))
+RERANK_BUSY = REGISTRY.register(Counter("askads_rerank_busy_total", "Reranks skipped because the queue was full"))
+LLM_TOKENS_TOTAL = REGISTRY.register(Counter("askads_llm_tokens_total", "OpenAI tokens used", ["kind"]))
+REQUEST_SECONDS = REGISTRY.register(Histogram("askads_request_seconds", "End-to-end chat turn latency"))
+STAGE_SECONDS = REGISTRY.register(Histogram("askads_stage_seconds", "Pipeline stage latency", ["stage"]))
+TTFT_SECONDS = REGISTRY.register(Histogram("askads_time_to_first_token_seconds", "Time to the first streamed token"))
+LLM_TOKENS = REGISTRY.register(Histogram("askads_llm_tokens", "OpenAI tokens per completion", ["kind"],
+                                         buckets=TOKEN_BUCKETS))
+
+
+def observe_request(trace: dict, ok: bool = True):
+    """Fold one RequestTrace.to_dict() into the aggregate metrics."""
+    REQUESTS.inc(outcome="ok" if ok else "error")
+    attrs = trace.get("attrs", {})
+    if attrs.get("cache"):
+        CACHE_HITS.inc(cache=attrs["cache"])
+    if attrs.get("fallback"):
+        FALLBACKS.inc()
+    REQUEST_SECONDS.observe(trace["total_ms"] / 1000)
+    for name, ms in trace["stage_ms"].items():
+        if name != "first_token":
+            STAGE_SECONDS.observe(ms / 1000, stage=name)
+    for span in trace["spans"]:
+        if span["stage"] == "first_token":
+            TTFT_SECONDS.observe(span["start_ms"] / 1000)
+    for kind in ("prompt_tokens", "completion_tokens"):
+        n = trace["counts"].get(kind)
+        if n:
+            LLM_TOKENS.observe(n, kind=kind.split("_")[0])
+            LLM_TOKENS_TOTAL.inc(n, kind=kind.split("_")[0])
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1"):
+    """Serve /metrics from a daemon thread (once per process); None if the port is taken."""
+    global _server
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host, port), _Handler)
+            except OSError as e:
+                logger.warning("Metrics endpoint not started on %s:%s: %s", host, port, e)
+                _server = False  # don't retry on every Streamlit rerun
+                return None
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="askads-metrics", daemon=True).start()
+        return _server or None
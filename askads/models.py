@@ -0,0 +1,50 @@
+"""Model loaders that honour ASKADS_INFERENCE_BACKEND.
+
+``torch`` loads the fp32 SentenceTransformer / CrossEncoder.  ``onnx`` and
+``onnx-int8`` serve the models exported by ``python -m askads.onnx_backend
+export`` through ONNX Runtime; if those artifacts are missing or fail to load,
+the loaders log a warning and fall back to torch.
+"""
+import logging
+from pathlib import Path
+
+from askads.config import INFERENCE_BACKEND, ONNX_DIR
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+def _check(backend: str) -> str:
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+    return backend
+
+
+def load_embedder(name: str, backend: str = INFERENCE_BACKEND, onnx_dir: Path = ONNX_DIR):
+    """E5 embedder for ``name`` on the configured backend."""
+    if _check(backend) != "torch":
+        try:
+            from askads.onnx_backend import OnnxEmbedder
+            return OnnxEmbedder(Path(onnx_dir) / "e5", name, backend)
+        except Exception as e:
+            logger.warning("ONNX embedder unavailable (%s); using torch", e)
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(name)
+
+
+def load_cross_encoder(name: str, backend: str = INFERENCE_BACKEND, onnx_dir: Path = ONNX_DIR):
+    """Cross-encoder reranker for ``name`` on the configured backend."""
+    if _check(backend) != "torch":
+        try:
+            from askads.onnx_backend import OnnxCrossEncoder
+            return OnnxCrossEncoder(Path(onnx_dir) / "reranker", name, backend)
+        except Exception as e:
+            logger.warning("ONNX reranker unavailable (%s); using torch", e)
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(name)
+
+
+def backend_name(model) -> str:
+    """The backend a loaded model actually runs on."""
+    return getattr(model, "backend", "torch")
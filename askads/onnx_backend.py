@@ -0,0 +1,231 @@
+"""ONNX Runtime versions of the E5 embedder and the BGE reranker, with int8 export.
+
+``OnnxEmbedder`` and ``OnnxCrossEncoder`` mirror the parts of the
+SentenceTransformer / CrossEncoder APIs the pipeline uses (``encode`` with
+mean pooling, ``predict`` with a sigmoid over the single logit).  Models are
+exported from the fp32 Hugging Face weights with ``torch.onnx`` and
+optionally quantized with dynamic int8 weights; ``validate`` compares them
+against the fp32 models on the corpus.  Export needs torch and
+transformers; serving needs only onnxruntime and the tokenizer.
+
+    python -m askads.onnx_backend export --out rag_index/onnx
+    python -m askads.onnx_backend validate --backend onnx-int8
+"""
+import argparse
+import json
+import random
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from askads.config import EMBED_MODEL_NAME, META_PATH, ONNX_DIR, RERANKER_NAME
+
+MAX_LENGTH = 512
+MANIFEST = "askads_onnx.json"
+FILES = {"onnx": "model.onnx", "onnx-int8": "model_int8.onnx"}
+
+
+def _open_session(model_dir: Path, model_name: str, backend: str):
+    """Tokenizer and InferenceSession for an exported model, checking it was exported from model_name."""
+    import onnxruntime as ort
+    from transformers import AutoTokenizer
+
+    model_dir = Path(model_dir)
+    manifest = json.loads((model_dir / MANIFEST).read_text(encoding="utf-8"))
+    if manifest.get("model") != model_name:
+        raise ValueError(f"{model_dir} was exported from {manifest.get('model')}, expected {model_name}")
+    path = model_dir / FILES[backend]
+    if not path.exists():
+        raise FileNotFoundError(f"Missing {path}; run `python -m askads.onnx_backend export`")
+    opts = ort.SessionOptions()
+    opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    session = ort.InferenceSession(str(path), opts, providers=["CPUExecutionProvider"])
+    tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+    return tokenizer, session
+
+
+def _feed(session, enc) -> dict:
+    """Only the tokenizer outputs the graph declares (XLM-R has no token_type_ids)."""
+    names = {i.name for i in session.get_inputs()}
+    return {k: v.astype(np.int64) for k, v in enc.items() if k in names}
+
+
+class OnnxEmbedder:
+    """E5 sentence embeddings (mean pooling) served by ONNX Runtime."""
+
+    def __init__(self, model_dir: Path, model_name: str = EMBED_MODEL_NAME, backend: str = "onnx-int8"):
+        self.backend = backend
+        self.tokenizer, self.session = _open_session(model_dir, model_name, backend)
+        self._dim = self.session.get_outputs()[0].shape[-1]
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return int(self._dim)
+
+    def encode(self, sentences, batch_size: int = 32, normalize_embeddings: bool = False,
+               convert_to_numpy: bool = True, show_progress_bar=None, **_):
+        if isinstance(sentences, str):
+            return self.encode([sentences], batch_size, normalize_embeddings)[0]
+        out = np.zeros((len(sentences), self.get_sentence_embedding_dimension()), dtype=np.float32)
+        # Sort by length so each batch pads to a similar size
+        order = np.argsort([-len(s) for s in sentences], kind="stable")
+        for start in range(0, len(sentences), batch_size):
+            idx = order[start:start + batch_size]
+            enc = self.tokenizer([sentences[i] for i in idx], padding=True, truncation=True,
+                                 max_length=MAX_LENGTH, return_tensors="np")
+            hidden = self.session.run(None, _feed(self.session, enc))[0]
+            mask = enc["attention_mask"][..., None].astype(np.float32)
+            out[idx] = (hidden * mask).sum(1) / np.clip(mask.sum(1), 1e-9, None)
+        if normalize_embeddings:
+            out /= np.clip(np.linalg.norm(out, axis=1, keepdims=True), 1e-12, None)
+        return out
+
+
+class OnnxCrossEncoder:
+    """Cross-encoder relevance scores (sigmoid of the single logit) served by ONNX Runtime."""
+
+    def __init__(self, model_dir: Path, model_name: str = RERANKER_NAME, backend: str = "onnx-int8"):
+        self.backend = backend
+        self.tokenizer, self.session = _open_session(model_dir, model_name, backend)
+
+    def predict(self, pairs, batch_size: int = 32, **_):
+        pairs = list(pairs)
+        scores = np.zeros(len(pairs), dtype=np.float32)
+        for start in range(0, len(pairs), batch_size):
+            batch = pairs[start:start + batch_size]
+            enc = self.tokenizer([q for q, _ in batch], [p for _, p in batch], padding=True,
+                                 truncation=True, max_length=MAX_LENGTH, return_tensors="np")
+            logits = self.session.run(None, _feed(self.session, enc))[0]
+            scores[start:start + len(batch)] = 1.0 / (1.0 + np.exp(-logits[:, 0]))
+        return scores
+
+
+def export_model(model_name: str, out_dir: Path, kind: str, quantize: bool = True):
+    """Export model_name ("embedder" or "reranker") to out_dir as fp32 ONNX plus a dynamic int8 copy."""
+    import torch
+    from transformers import AutoModel, AutoModelForSequenceClassification, AutoTokenizer
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    cls = AutoModel if kind == "embedder" else AutoModelForSequenceClassification
+    model = cls.from_pretrained(model_name).eval()
+
+    sample = tokenizer(["query: example", "passage: a longer example passage"], ["x", "y"] if kind == "reranker" else None,
+                       padding=True, return_tensors="pt")
+    names = list(sample.keys())
+    output = "last_hidden_state" if kind == "embedder" else "logits"
+    axes = {n: {0: "batch", 1: "seq"} for n in names}
+    axes[output] = {0: "batch", 1: "seq"} if kind == "embedder" else {0: "batch"}
+
+    class Wrapped(torch.nn.Module):
+        def __init__(self, inner):
+            super().__init__()
+            self.inner = inner
+
+        def forward(self, *args):
+            return self.inner(**dict(zip(names, args)))[0]
+
+    with torch.no_grad():
+        torch.onnx.export(Wrapped(model), tuple(sample[n] for n in names), str(out_dir / FILES["onnx"]),
+                          input_names=names, output_names=[output], dynamic_axes=axes, opset_version=17)
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(str(out_dir / FILES["onnx"]), str(out_dir / FILES["onnx-int8"]), weight_type=QuantType.QInt8)
+    tokenizer.save_pretrained(str(out_dir))
+    (out_dir / MANIFEST).write_text(json.dumps({"model": model_name, "kind": kind}), encoding="utf-8")
+
+
+def _sample_texts(meta_path: Path, n: int, seed: int):
+    from askads.corpus import iter_meta
+    rows = list(iter_meta(meta_path))
+    random.Random(seed).shuffle(rows)
+    rows = rows[:n]
+    passages = ["passage: " + (m.get("text") or "") for m in rows]
+    # Titles and sections stand in for user questions
+    queries = list(dict.fromkeys(f"{m.get('title', '')} {m.get('section', '')}".strip() for m in rows))
+    return passages, [q for q in queries if q]
+
+
+def _topk_overlap(a: np.ndarray, b: np.ndarray, k: int) -> float:
+    """Mean |top-k(a) ∩ top-k(b)| / k over rows of two score matrices."""
+    k = min(k, a.shape[1])
+    ta = np.argpartition(-a, k - 1, axis=1)[:, :k]
+    tb = np.argpartition(-b, k - 1, axis=1)[:, :k]
+    return float(np.mean([len(set(x) & set(y)) / k for x, y in zip(ta, tb)]))
+
+
+def validate(backend: str, onnx_dir: Path = ONNX_DIR, meta_path: Path = META_PATH, n_passages: int = 300,
+             k: int = 10, rerank_queries: int = 20, seed: int = 0) -> dict:
+    """Compare an ONNX backend against the fp32 models on a sample of the corpus."""
+    from sentence_transformers import CrossEncoder, SentenceTransformer
+
+    passages, queries = _sample_texts(meta_path, n_passages, seed)
+    ref = SentenceTransformer(EMBED_MODEL_NAME)
+    cand = OnnxEmbedder(Path(onnx_dir) / "e5", EMBED_MODEL_NAME, backend)
+    kw = dict(batch_size=32, normalize_embeddings=True, convert_to_numpy=True)
+    p_ref, p_cand = ref.encode(passages, **kw), cand.encode(passages, **kw)
+    q_ref = ref.encode(["query: " + q for q in queries], **kw)
+    q_cand = cand.encode(["query: " + q for q in queries], **kw)
+    passage_cos = np.sum(p_ref * p_cand, axis=1)
+    query_cos = np.sum(q_ref * q_cand, axis=1)
+    report = {
+        "backend": backend,
+        "passages": len(passages),
+        "queries": len(queries),
+        "embed_cosine_mean": float(np.mean(np.concatenate([passage_cos, query_cos]))),
+        "embed_cosine_min": float(np.min(np.concatenate([passage_cos, query_cos]))),
+        # Candidate queries against fp32 passages, as served against the stored index
+        f"dense_top{k}_overlap": _topk_overlap(q_ref @ p_ref.T, q_cand @ p_ref.T, k),
+    }
+
+    rr_ref = CrossEncoder(RERANKER_NAME)
+    rr_cand = OnnxCrossEncoder(Path(onnx_dir) / "reranker", RERANKER_NAME, backend)
+    shortlist = max(k * 3, 30)
+    sims = q_ref @ p_ref.T
+    s_ref, s_cand = [], []
+    for qi in range(min(rerank_queries, len(queries))):
+        top = np.argsort(-sims[qi])[:shortlist]
+        pairs = [(queries[qi], passages[j][len("passage: "):]) for j in top]
+        s_ref.append(np.asarray(rr_ref.predict(pairs), dtype=np.float32))
+        s_cand.append(rr_cand.predict(pairs))
+    s_ref, s_cand = np.stack(s_ref), np.stack(s_cand)
+    report["rerank_max_abs_diff"] = float(np.max(np.abs(s_ref - s_cand)))
+    report[f"rerank_top{k}_overlap"] = _topk_overlap(s_ref, s_cand, k)
+    return report
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ex = sub.add_parser("export", help="export the E5 embedder and BGE reranker to ONNX (+ int8)")
+    ex.add_argument("--out", type=Path, default=ONNX_DIR)
+    ex.add_argument("--no-quantize", action="store_true")
+    va = sub.add_parser("validate", help="compare an ONNX backend with the fp32 models on the corpus")
+    va.add_argument("--backend", choices=sorted(FILES), default="onnx-int8")
+    va.add_argument("--onnx-dir", type=Path, default=ONNX_DIR)
+    va.add_argument("--meta", type=Path, default=META_PATH)
+    va.add_argument("--passages", type=int, default=300)
+    va.add_argument("--k", type=int, default=10)
+    va.add_argument("--min-cosine", type=float, default=0.98, help="fail below this mean embedding cosine")
+    va.add_argument("--min-overlap", type=float, default=0.9, help="fail below this top-k overlap")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "export":
+        export_model(EMBED_MODEL_NAME, args.out / "e5", "embedder", quantize=not args.no_quantize)
+        export_model(RERANKER_NAME, args.out / "reranker", "reranker", quantize=not args.no_quantize)
+        print(f"Exported ONNX models to {args.out}")
+        return 0
+
+    report = validate(args.backend, args.onnx_dir, args.meta, args.passages, args.k)
+    print(json.dumps(report, indent=2))
+    ok = (report["embed_cosine_mean"] >= args.min_cosine
+          and report[f"dense_top{args.k}_overlap"] >= args.min_overlap
+          and report[f"rerank_top{args.k}_overlap"] >= args.min_overlap)
+    if not ok:
+        print("Validation failed: agreement with fp32 models is below the thresholds", file=sys.stderr)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,584 @@
+"""Retrieval, context building and answer generation for AskADS.
+
+Independent work runs concurrently: dense and sparse retrieval overlap on a
+shared thread pool, per-hit sentence compression fans out over the same
+pool, and generation uses ``AsyncOpenAI`` so it can run on a background
+event loop.  Every stage is timed through the request's ``StageTimer``.
+"""
+import asyncio
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+
+import numpy as np
+
+from askads.cache import normalize_query
+from askads.config import PIPELINE_WORKERS, RERANKER_NAME
+from askads.llm import aiter_stream_text, iter_stream_text
+from askads.metrics import RERANK_BUSY
+from askads.reranker import RerankerBusy, reranker_service
+from askads.sentence_index import split_sentences
+from askads.timing import StageTimer, add, stage
+
+logger = logging.getLogger(__name__)
+
+# Shared pool for leaf tasks (searches, sentence compression). Tasks submitted
+# here never submit further work to it, so it cannot deadlock on itself.
+_POOL = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="askads")
+# Whole speculative retrievals run here; they submit their leaf tasks to _POOL.
+_SPEC_POOL = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="askads-spec")
+
+
+# Priority hints for boosting
+EDU_PRIORITY_HINTS = [
+    "/education/masters-programs/ms-in-applied-data-science",
+    "/education/masters-programs",
+    "/education/",
+]
+
+LOW_PRIORITY_HINTS = [
+    "/news-events/news/",
+    "/news-events/events/",
+    "/news-events/insights/",
+    "/research/",
+    "/people/",
+]
+
+INTENT_KEYWORDS = {
+    "admissions": ["admission", "admissions", "apply", "application", "requirements", "prereq", "prerequisite", "deadline", "GRE", "TOEFL", "IELTS", "resume", "statement", "letters"],
+    "curriculum": ["core", "course", "courses", "curriculum", "credit", "unit", "track", "specialization", "elective"],
+    "capstone": ["capstone", "project", "showcase", "practicum"],
+}
+
+# Appended to the question when retrieval returns no program pages
+AUG_SUFFIX = ' program site education admissions curriculum "MS in Applied Data Science"'
+
+# PII regex patterns
+PII_EMAIL = re.compile(r'[\w\.-]+@[\w\.-]+\.\w+')
+PII_PHONE = re.compile(r'\b(?:\+?\d{1,2}\s*)?(?:\(?\d{3}\)?[\s.-]*)?\d{3}[\s.-]?\d{4}\b')
+
+# System prompt
+SYSTEM_PROMPT = """You are a helpful assistant for the University of Chicago MS in Applied Data Science.
+Answer ONLY from the provided context. Prefer content from the Education section and the program page.
+If top results are news, events, insights, research, or people pages, treat them as lower priority unless the question asks for them.
+If the required information is not present in the provided context, say you don't know and suggest checking the official MS-ADS page.
+Keep answers specific and concise. Always include bracketed citations like [1], [2] with URLs.
+Redact personal emails/phones if present in context.
+"""
+
+
+# Optional reranker: one shared, micro-batching service per process
+reranker_error = None
+def get_reranker(name=RERANKER_NAME):
+    global reranker_error
+    service = reranker_service(name)
+    if not service.load():
+        reranker_error = service.error
+        return None
+    return service
+
+
+def gather_passage_vecs(ids, emb, id_to_row, id_to_meta, model) -> np.ndarray:
+    """Gather passage vectors for ids from the embedding matrix (encoding only unknown ids)."""
+    rows = [id_to_row.get(did) for did in ids]
+    vecs = np.zeros((len(ids), emb.shape[1]), dtype=np.float32)
+    known = [i for i, r in enumerate(rows) if r is not None]
+    if known:
+        vecs[known] = emb[[rows[i] for i in known]]
+    unknown = [i for i, r in enumerate(rows) if r is None]
+    if unknown:
+        texts = ["passage: " + (id_to_meta.get(ids[i], {}).get("text", "") or "") for i in unknown]
+        vecs[unknown] = model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+    return vecs
+
+
+@dataclass
+class QueryContext:
+    """Per-request query state, computed once and shared by every pipeline stage."""
+    text: str
+    vec: np.ndarray          # normalized E5 "query:" embedding
+    intent: str | None
+    tokens: list[str]        # TF-IDF analyzer output
+    term_ids: np.ndarray     # tokens mapped to sparse-index term ids
+    timer: StageTimer | None = None
+
+
+def make_query_contexts(queries: list[str], model, tfidf, timer: StageTimer | None = None) -> list[QueryContext]:
+    """Encode (in one batched call) and tokenize several queries."""
+    with stage(timer, "encode_query", queries=len(queries)):
+        vecs = model.encode(["query: " + q for q in queries], normalize_embeddings=True, convert_to_numpy=True)
+    analyzer = tfidf.build_analyzer()
+    vocab = tfidf.vocabulary_
+    out = []
+    for query, vec in zip(queries, vecs):
+        tokens = analyzer(query)
+        out.append(QueryContext(
+            text=query,
+            vec=vec.astype(np.float32),
+            intent=_intent(query),
+            tokens=tokens,
+            term_ids=np.array([vocab[t] for t in tokens if t in vocab], dtype=np.int64),
+            timer=timer,
+        ))
+    return out
+
+
+def make_query_context(query: str, model, tfidf, timer: StageTimer | None = None) -> QueryContext:
+    """Encode and tokenize the query once for the whole request."""
+    return make_query_contexts([query], model, tfidf, timer)[0]
+
+
+def ann_dense_chroma(qctx: QueryContext, dense, topn: int):
+    """Dense retrieval using the configured backend (FAISS or ChromaDB)."""
+    with stage(qctx.timer, "dense") as span:
+        ids, scores = dense.search(qctx.vec, topn)
+        span["candidates"] = len(ids)
+        return ids, scores
+
+
+def bm25_like_indices(qctx: QueryContext, bm25, id_order, topn: int):
+    """Sparse retrieval using BM25 over the inverted index (only documents sharing a query term)."""
+    with stage(qctx.timer, "sparse", query_terms=len(qctx.term_ids)) as span:
+        rows, scores = bm25.search(qctx.term_ids, topn)
+        span["candidates"] = len(rows)
+        return [id_order[i] for i in rows], scores
+
+
+def mmr_select(q_vec: np.ndarray, cand_vecs: np.ndarray, cand_ids: list[str], k: int = 6, lambda_: float = 0.55):
+    """Maximal Marginal Relevance for diversity.
+    
+    Each candidate's max similarity to the selected set is kept in a running
+    vector, updated with one matrix-vector product per pick; picked
+    candidates are masked out. Ties go to the lowest index.
+    """
+    n = len(cand_ids)
+    k = _mmr_count(k, n)
+    if k <= 0:
+        return []
+    sim_q = (cand_vecs @ q_vec.reshape(-1, 1)).ravel()
+    max_sim = np.full(n, -np.inf, dtype=sim_q.dtype)
+    taken = np.zeros(n, dtype=bool)
+    selected = []
+    i = int(np.argmax(sim_q))
+    while True:
+        selected.append(i)
+        taken[i] = True
+        if len(selected) == k:
+            break
+        np.maximum(max_sim, cand_vecs @ cand_vecs[i], out=max_sim)
+        scores = lambda_ * sim_q - (1 - lambda_) * max_sim
+        scores[taken] = -np.inf
+        i = int(np.argmax(scores))
+    return [cand_ids[i] for i in selected]
+
+
+def _mmr_count(k: int, n: int) -> int:
+    # The original list-based loop stopped once the selection reached the
+    # shrinking remaining pool, i.e. at ceil(n / 2) picks; kept so results don't move
+    return min(k, (n + 1) // 2)
+
+
+def mmr_select_many(q_vecs: np.ndarray, cand_vecs_list, cand_ids_list, k: int = 6, lambda_: float = 0.55):
+    """mmr_select for many queries at once (same selections).
+    
+    Candidate sets are padded into one (queries x candidates x dim) tensor
+    so each pick is a single batched matrix-vector product; padding starts
+    out masked.
+    """
+    b = len(cand_ids_list)
+    sizes = np.array([len(ids) for ids in cand_ids_list])
+    n = int(sizes.max()) if b else 0
+    if n == 0:
+        return [[] for _ in range(b)]
+    dim = np.asarray(q_vecs).shape[-1]
+    cands = np.zeros((b, n, dim), dtype=np.float32)
+    for j, vecs in enumerate(cand_vecs_list):
+        cands[j, :len(vecs)] = vecs
+    rows = np.arange(b)
+    taken = np.arange(n)[None, :] >= sizes[:, None]
+    sim_q = (cands @ np.asarray(q_vecs, dtype=np.float32)[:, :, None])[:, :, 0]
+    max_sim = np.full((b, n), -np.inf, dtype=np.float32)
+    steps = _mmr_count(k, n)
+    picks = []
+    i = np.argmax(np.where(taken, -np.inf, sim_q), axis=1)
+    for step in range(steps):
+        picks.append(i)
+        taken[rows, i] = True
+        if step == steps - 1:
+            break
+        np.maximum(max_sim, (cands @ cands[rows, i][:, :, None])[:, :, 0], out=max_sim)
+        scores = lambda_ * sim_q - (1 - lambda_) * max_sim
+        scores[taken] = -np.inf
+        i = np.argmax(scores, axis=1)
+    picks = np.stack(picks, axis=1)
+    return [[ids[int(p)] for p in picks[j, :_mmr_count(k, len(ids))]] for j, ids in enumerate(cand_ids_list)]
+
+
+def _boost_score(url: str, section: str, base: float) -> float:
+    """Boost scores based on URL patterns and section."""
+    b = base
+    if any(h in url for h in EDU_PRIORITY_HINTS):
+        b += 0.20
+    if section == "education":
+        b += 0.10
+    if any(h in url for h in LOW_PRIORITY_HINTS):
+        b -= 0.20
+    return b
+
+
+def _intent(query: str):
+    """Detect query intent from keywords."""
+    ql = query.lower()
+    for k, toks in INTENT_KEYWORDS.items():
+        if any(t in ql for t in toks):
+            return k
+    return None
+
+
+def rrf(id_lists, c=60):
+    """Reciprocal Rank Fusion scores for several ranked id lists."""
+    score = {}
+    for lst in id_lists:
+        for r, did in enumerate(lst):
+            score[did] = score.get(did, 0.0) + 1.0 / (c + r + 1)
+    return score
+
+
+def fuse_candidates(qctx: QueryContext, dense_lists, sparse_lists, id_to_meta) -> list[str]:
+    """Fuse candidate lists with RRF and apply intent/URL boosts; ids best first."""
+    with stage(qctx.timer, "fusion") as span:
+        fused = rrf([list(ids) for ids in list(dense_lists) + list(sparse_lists)])
+        
+        # Apply boosts based on intent and URL patterns
+        want = qctx.intent
+        items = []
+        for did, base in fused.items():
+            m = id_to_meta.get(did, {})
+            url = m.get("url", "") or ""
+            sec = m.get("section", "") or ""
+            if want not in ("capstone",) and ("/news-events/" in url or "/research/" in url):
+                base -= 0.25
+            boosted = _boost_score(url, sec, base)
+            items.append((did, boosted))
+        
+        items.sort(key=lambda x: -x[1])
+        span["candidates"] = len(items)
+    return [did for did, _ in items]
+
+
+def fuse_and_select(qctx: QueryContext, dense_lists, sparse_lists, id_to_meta, model, emb, id_to_row, k: int):
+    """Fused candidates narrowed to a diverse pool with MMR."""
+    ranked = fuse_candidates(qctx, dense_lists, sparse_lists, id_to_meta)
+    
+    # MMR on a larger pool
+    with stage(qctx.timer, "mmr") as span:
+        pool = ranked[:max(k, 30)]
+        cand_vecs = gather_passage_vecs(pool, emb, id_to_row, id_to_meta, model)
+        mmr_ids = mmr_select(qctx.vec, cand_vecs, pool, k=max(k, 10), lambda_=0.55)
+        span.update(pool=len(pool), selected=len(mmr_ids),
+                    reencoded=sum(did not in id_to_row for did in pool))
+    
+    return [dict(id_to_meta[did]) | {"_id": did} for did in mmr_ids]
+
+
+def rerank_many(qctxs, hit_lists, timeout: float | None = 30.0, timer: StageTimer | None = None) -> bool:
+    """Rerank each hit list in place with a single scoring request for all pairs.
+    
+    The span goes to timer (default: the first query's). Returns False (lists
+    keep their MMR order) if the reranker is unavailable or busy.
+    """
+    rr = get_reranker()
+    if not rr:
+        return False
+    pairs, keys = [], []
+    for qctx, hits in zip(qctxs, hit_lists):
+        nq = normalize_query(qctx.text)
+        pairs += [(qctx.text, h.get("text", "")) for h in hits]
+        keys += [(nq, h["_id"], h.get("sha256", "")) for h in hits]
+    if timer is None and qctxs:
+        timer = qctxs[0].timer
+    with stage(timer, "rerank", pairs=len(pairs)) as span:
+        try:
+            scores = rr.score_cached(keys, pairs, timeout=timeout)
+        except RerankerBusy as e:
+            # Keep the MMR order rather than queueing behind a backlog
+            logger.warning("Skipping rerank: %s", e)
+            span["skipped"] = "busy"
+            RERANK_BUSY.inc()
+            return False
+    scores = iter(scores)
+    for hits in hit_lists:
+        for h in hits:
+            h["rerank_score"] = float(next(scores))
+        hits.sort(key=lambda x: -x["rerank_score"])
+    return True
+
+
+def retrieve_candidates(qctx: QueryContext, dense, id_to_meta, id_order, model,
+                        bm25, emb, id_to_row, k: int, shortlist: int, extra_qctxs: tuple = ()):
+    """The full MMR selection (at least k hits) that retrieve_hybrid reranks and cuts to k.
+    
+    extra_qctxs contribute their dense/sparse lists to the fused candidate pool;
+    intent and MMR still follow qctx.
+    """
+    # Dense (FAISS or ChromaDB) and sparse (BM25) retrieval are independent: overlap them
+    ctxs = [qctx, *extra_qctxs]
+    dense_futures = [_POOL.submit(ann_dense_chroma, c, dense, shortlist) for c in ctxs]
+    sparse_lists = [bm25_like_indices(c, bm25, id_order, topn=shortlist)[0] for c in ctxs]
+    dense_lists = [f.result()[0] for f in dense_futures]
+    
+    return fuse_and_select(qctx, dense_lists, sparse_lists, id_to_meta, model, emb, id_to_row, k)
+
+
+def retrieve_hybrid(qctx: QueryContext, dense, id_to_meta, id_order, model, 
+                    bm25, emb, id_to_row, k: int, shortlist: int, use_reranker: bool,
+                    extra_qctxs: tuple = ()):
+    """Hybrid retrieval combining dense (FAISS/ChromaDB) and sparse (BM25) methods with MMR.
+    
+    extra_qctxs contribute their dense/sparse lists to the fused candidate pool;
+    intent, MMR and reranking still follow qctx.
+    """
+    hits = retrieve_candidates(qctx, dense, id_to_meta, id_order, model, bm25, emb, id_to_row,
+                               k, shortlist, extra_qctxs)
+    
+    # Apply reranker if enabled
+    if use_reranker:
+        rerank_many([qctx], [hits])
+    
+    return hits[:k]
+
+
+def augment_query(query: str) -> str:
+    """Query steered toward the program pages, used when retrieval misses them."""
+    return query + AUG_SUFFIX
+
+
+def has_program_hit(hits) -> bool:
+    """Whether any hit comes from the Education section or the MS-ADS program pages."""
+    return any(("/education/" in (h.get("url", "") or "") or 
+                "ms-in-applied-data-science" in (h.get("url", "") or "")) 
+               for h in hits)
+
+
+def retrieve_with_fallback(qctx: QueryContext, dense, id_to_meta, id_order, model, 
+                           bm25, emb, id_to_row, k: int, shortlist: int, use_reranker: bool,
+                           tfidf=None, aug_qctx: QueryContext | None = None, mode: str = "sequential"):
+    """retrieve_hybrid with the augmented-query fallback for off-topic results.
+    
+    mode "sequential" retries with the augmented query only after a miss;
+    "speculative" selects the augmented query's candidates (untimed, so its
+    spans stay out of the request's trace) in parallel and keeps them only on
+    a miss, reranking them then (same results as sequential); "merged" fuses
+    both queries' dense/sparse lists into one candidate pool and retrieves
+    once, so the augmented query is always used. Returns (hits, used_fallback).
+    """
+    args = (dense, id_to_meta, id_order, model, bm25, emb, id_to_row)
+    kw = dict(k=k, shortlist=shortlist, use_reranker=use_reranker)
+    
+    def aug_ctx():
+        return aug_qctx or make_query_context(augment_query(qctx.text), model, tfidf, qctx.timer)
+    
+    if mode == "merged":
+        hits = retrieve_hybrid(qctx, *args, **kw, extra_qctxs=(aug_ctx(),))
+        return hits, True
+    
+    if mode == "speculative":
+        aug = aug_ctx()
+        # Rerank capacity is only spent once the miss is known
+        aug_future = _SPEC_POOL.submit(lambda: retrieve_candidates(replace(aug, timer=None), *args,
+                                                                   k=k, shortlist=shortlist))
+        hits = retrieve_hybrid(qctx, *args, **kw)
+        if has_program_hit(hits):
+            aug_future.cancel()  # a no-op once started; its result is simply dropped
+            return hits, False
+        with stage(qctx.timer, "fallback_retrieve", speculative=True):
+            aug_hits = aug_future.result()
+        if use_reranker:
+            rerank_many([aug], [aug_hits], timer=qctx.timer)
+        return aug_hits[:k], True
+    
+    hits = retrieve_hybrid(qctx, *args, **kw)
+    if has_program_hit(hits):
+        return hits, False
+    return retrieve_hybrid(aug_ctx(), *args, **kw), True
+
+
+def scrub(text: str) -> str:
+    """Redact PII from text."""
+    text = PII_EMAIL.sub("[redacted-email]", text)
+    text = PII_PHONE.sub("[redacted-phone]", text)
+    return text
+
+
+def compress_text_for_query(text: str, qctx: QueryContext, model, top_sentences: int = 8,
+                            sent_index=None, doc_id: str | None = None, sha256: str | None = None):
+    """Compress text by selecting most relevant sentences."""
+    found = sent_index.lookup(doc_id, sha256) if sent_index is not None and doc_id else None
+    if found is not None:
+        # Precomputed sentence vectors: a gather plus a dot product
+        spans, sv = found
+        sents = [text[a:b] for a, b in spans]
+        if not sents:
+            return text or ""
+        sims = sv.astype(np.float32) @ qctx.vec
+    else:
+        sents = split_sentences(text)
+        if not sents:
+            return text or ""
+        sv = model.encode(["passage: " + s for s in sents], normalize_embeddings=True, convert_to_numpy=True)
+        sims = sv @ qctx.vec
+    keep = np.argsort(-sims)[:min(top_sentences, len(sents))]
+    keep.sort()
+    return " ".join(sents[i] for i in keep)
+
+
+def long_context_reorder(hits):
+    """Reorder hits for better context placement."""
+    if len(hits) <= 2:
+        return hits
+    L, R, out = 0, len(hits) - 1, []
+    while L <= R:
+        out.append(hits[L])
+        L += 1
+        if L <= R:
+            out.append(hits[R])
+            R -= 1
+    return out
+
+
+def _context_block(i: int, h: dict, qctx: QueryContext, model, sent_index=None) -> str:
+    """One numbered, compressed and scrubbed context block for hit h."""
+    title = (h.get('title', '') or '').strip()
+    url = (h.get('url', '') or '').strip()
+    sect = (h.get('section', '') or '').strip()
+    txt = compress_text_for_query(h.get('text', '') or '', qctx, model, top_sentences=8,
+                                  sent_index=sent_index, doc_id=h.get('_id'), sha256=h.get('sha256'))
+    txt = scrub(txt)
+    return f"[{i}] {title} • {sect} | {url}\n{txt}"
+
+
+def build_context(hits, qctx: QueryContext, model, sent_index=None):
+    """Build context string from retrieved hits, compressing hits concurrently."""
+    hits = long_context_reorder(hits)
+    with stage(qctx.timer, "build_context", hits=len(hits)) as span:
+        blocks = list(_POOL.map(
+            lambda ih: _context_block(ih[0], ih[1], qctx, model, sent_index), enumerate(hits, 1)
+        ))
+        context = "\n\n---\n\n".join(blocks)
+        span["context_chars"] = len(context)
+    return context
+
+
+async def abuild_context(hits, qctx: QueryContext, model, sent_index=None):
+    """Async build_context: per-hit compression runs on the shared pool."""
+    loop = asyncio.get_running_loop()
+    hits = long_context_reorder(hits)
+    with stage(qctx.timer, "build_context", hits=len(hits)) as span:
+        blocks = await asyncio.gather(*[
+            loop.run_in_executor(_POOL, _context_block, i, h, qctx, model, sent_index)
+            for i, h in enumerate(hits, 1)
+        ])
+        context = "\n\n---\n\n".join(blocks)
+        span["context_chars"] = len(context)
+    return context
+
+
+def build_messages(qctx: QueryContext, context: str):
+    """Chat messages for answering qctx from the given context."""
+    user_prompt = f"Question: {qctx.text}\n\nUse the context to answer with bracket citations.\n\nContext:\n{context}"
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt}
+    ]
+
+
+def _record_usage(timer: StageTimer | None, span: dict, usage):
+    """Copy the completion's token usage onto the generate span and the request counters."""
+    if usage is None:
+        return
+    for name in ("prompt_tokens", "completion_tokens"):
+        n = getattr(usage, name, None) or 0
+        span[name] = n
+        add(timer, name, n)
+
+
+def generate_answer(qctx: QueryContext, hits, oai_client, model, temperature: float = 0.2, 
+                    model_name: str = "gpt-4o-mini", sent_index=None):
+    """Generate answer using OpenAI API."""
+    context = build_context(hits, qctx, model, sent_index=sent_index)
+    
+    try:
+        with stage(qctx.timer, "generate", model=model_name) as span:
+            resp = oai_client.chat.completions.create(
+                model=model_name,
+                temperature=temperature,
+                messages=build_messages(qctx, context)
+            )
+            _record_usage(qctx.timer, span, getattr(resp, "usage", None))
+        return resp.choices[0].message.content.strip(), context
+    except Exception as e:
+        return f"Error generating answer: {str(e)}", None
+
+
+def stream_answer(qctx: QueryContext, hits, oai_client, model, temperature: float = 0.2, 
+                  model_name: str = "gpt-4o-mini", sent_index=None):
+    """Yield answer text as it streams from the OpenAI API (errors propagate to the caller)."""
+    context = build_context(hits, qctx, model, sent_index=sent_index)
+    with stage(qctx.timer, "generate", model=model_name) as span:
+        stream = oai_client.chat.completions.create(
+            model=model_name,
+            temperature=temperature,
+            messages=build_messages(qctx, context),
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        yield from iter_stream_text(stream, on_usage=lambda u: _record_usage(qctx.timer, span, u))
+
+
+async def agenerate_answer(qctx: QueryContext, hits, aoai_client, model, temperature: float = 0.2, 
+                           model_name: str = "gpt-4o-mini", sent_index=None):
+    """Generate answer with an AsyncOpenAI client."""
+    context = await abuild_context(hits, qctx, model, sent_index=sent_index)
+    try:
+        with stage(qctx.timer, "generate", model=model_name) as span:
+            resp = await aoai_client.chat.completions.create(
+                model=model_name,
+                temperature=temperature,
+                messages=build_messages(qctx, context)
+            )
+            _record_usage(qctx.timer, span, getattr(resp, "usage", None))
+        return resp.choices[0].message.content.strip(), context
+    except Exception as e:
+        return f"Error generating answer: {str(e)}", None
+
+
+async def astream_answer(qctx: QueryContext, hits, aoai_client, model, temperature: float = 0.2, 
+                         model_name: str = "gpt-4o-mini", sent_index=None):
+    """Async generator of answer text streamed by an AsyncOpenAI client."""
+    context = await abuild_context(hits, qctx, model, sent_index=sent_index)
+    with stage(qctx.timer, "generate", model=model_name) as span:
+        stream = await aoai_client.chat.completions.create(
+            model=model_name,
+            temperature=temperature,
+            messages=build_messages(qctx, context),
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        first = True
+        async for text in aiter_stream_text(stream, on_usage=lambda u: _record_usage(qctx.timer, span, u)):
+            if first and qctx.timer is not None:
+                qctx.timer.mark("first_token")
+            first = False
+            yield text
+
+
+async def warm_llm(aoai_client, model_name: str = "gpt-4o-mini"):
+    """Open (or refresh) the client's HTTPS connection while retrieval is still running."""
+    try:
+        models = getattr(aoai_client, "models", None)
+        if models is not None:
+            await models.retrieve(model_name)
+    except Exception as e:  # warming is best effort
+        logger.debug("LLM warm-up failed: %s", e)
+
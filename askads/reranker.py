@@ -0,0 +1,201 @@
+"""A process-wide CrossEncoder service that micro-batches concurrent requests.
+
+Every Streamlit session reranks its own short candidate list.  Scoring those
+lists one by one leaves the model running many tiny batches, so callers
+instead put their (query, passage) pairs on a bounded queue and a single
+worker thread coalesces whatever arrives within a short window into one
+``predict`` call, then hands each caller back its slice of the scores.  A
+full queue blocks callers (backpressure); a request not scored within
+``timeout`` (queueing and scoring together) is cancelled and raises
+``RerankerBusy`` so the pipeline can fall back to the MMR order.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from askads.cache import TTLCache
+from askads.config import (
+    RERANK_CACHE_MAX_ITEMS, RERANK_MAX_BATCH, RERANK_QUEUE_SIZE, RERANK_WINDOW_MS, RERANKER_NAME,
+)
+from askads.metrics import RERANKER_LOAD_FAILURES
+from askads.models import load_cross_encoder
+
+logger = logging.getLogger(__name__)
+
+
+class RerankerBusy(RuntimeError):
+    """Raised when a request is not scored within the caller's timeout (full queue or slow batch)."""
+
+
+class ScoreCache:
+    """Bounded LRU of cross-encoder scores with hit/miss counters.
+
+    Keys are (normalized query, chunk id, chunk sha256) tuples, so an edited
+    chunk is rescored instead of served stale.
+    """
+
+    def __init__(self, max_items: int = RERANK_CACHE_MAX_ITEMS):
+        self._lru = TTLCache(max_items=max_items, ttl=float("inf"))
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get_many(self, keys) -> list:
+        """Cached score per key, or None where missing."""
+        out = [self._lru.get(repr(k)) for k in keys]
+        found = sum(s is not None for s in out)
+        with self._lock:
+            self.hits += found
+            self.misses += len(out) - found
+        return out
+
+    def set_many(self, keys, scores):
+        for k, s in zip(keys, scores):
+            self._lru.set(repr(k), float(s))
+
+    def clear(self):
+        self._lru.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "size": len(self._lru),
+        }
+
+
+class RerankerService:
+    """Loads a CrossEncoder once and scores pairs from many threads in shared batches."""
+
+    def __init__(self, name: str = RERANKER_NAME, max_batch: int = RERANK_MAX_BATCH,
+                 window_ms: float = RERANK_WINDOW_MS, max_queue: int = RERANK_QUEUE_SIZE,
+                 loader=load_cross_encoder):
+        self.name = name
+        self.max_batch = max_batch
+        self.window = window_ms / 1000.0
+        self._loader = loader
+        self._model = None
+        self.error = None
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._worker = None
+        self.cache = ScoreCache()
+        self.batches = 0
+        self.pairs_scored = 0
+
+    def load(self) -> bool:
+        """Load the model on first use (once per process); False if it failed."""
+        if self._model is not None or self.error is not None:
+            return self._model is not None
+        with self._lock:
+            if self._model is None and self.error is None:
+                try:
+                    self._model = self._loader(self.name)
+                except Exception as e:
+                    self.error = str(e)
+                    RERANKER_LOAD_FAILURES.inc()
+                    logger.warning("Reranker could not be loaded: %s", e)
+                else:
+                    self._worker = threading.Thread(target=self._run, name="askads-rerank", daemon=True)
+                    self._worker.start()
+        return self._model is not None
+
+    def score(self, pairs, timeout: float | None = 30.0) -> list[float]:
+        """Score (query, passage) pairs; blocks until their batch has run, at most timeout seconds overall."""
+        pairs = list(pairs)
+        if not pairs:
+            return []
+        if not self.load():
+            raise RuntimeError(f"Reranker unavailable: {self.error}")
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        fut = Future()
+        try:
+            self._queue.put((pairs, fut), timeout=timeout)
+        except queue.Full:
+            raise RerankerBusy(f"Rerank queue full ({self._queue.maxsize} requests)") from None
+        try:
+            return fut.result(None if deadline is None else max(0.0, deadline - time.perf_counter()))
+        except FutureTimeout:
+            # Drops the pairs if their batch has not started; a running batch just goes unread
+            fut.cancel()
+            raise RerankerBusy(f"Rerank not done within {timeout:g}s") from None
+
+    def score_cached(self, keys, pairs, timeout: float | None = 30.0) -> list[float]:
+        """Like ``score``, but reuses cached scores for keys seen before and only sends misses."""
+        pairs = list(pairs)
+        scores = self.cache.get_many(keys)
+        todo = [i for i, s in enumerate(scores) if s is None]
+        if todo:
+            fresh = self.score([pairs[i] for i in todo], timeout=timeout)
+            self.cache.set_many([keys[i] for i in todo], fresh)
+            for i, s in zip(todo, fresh):
+                scores[i] = s
+        return scores
+
+    def predict(self, pairs):
+        """CrossEncoder-compatible alias for ``score``."""
+        return self.score(pairs)
+
+    def _collect(self):
+        """Block for one request, then gather more until the window closes or the batch is full."""
+        batch = [self._queue.get()]
+        n = len(batch[0][0])
+        deadline = time.perf_counter() + self.window
+        while n < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            n += len(item[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            batch = [(pairs, fut) for pairs, fut in batch if fut.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            flat = [p for pairs, _ in batch for p in pairs]
+            try:
+                scores = self._model.predict(flat, batch_size=self.max_batch)
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            self.batches += 1
+            self.pairs_scored += len(flat)
+            start = 0
+            for pairs, fut in batch:
+                fut.set_result([float(s) for s in scores[start:start + len(pairs)]])
+                start += len(pairs)
+
+    def stats(self) -> dict:
+        """Batches run, pairs scored, current queue depth and score-cache counters."""
+        return {
+            "batches": self.batches,
+            "pairs": self.pairs_scored,
+            "avg_batch": round(self.pairs_scored / self.batches, 1) if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+            "cache": self.cache.stats(),
+        }
+
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def reranker_service(name: str = RERANKER_NAME) -> RerankerService:
+    """The shared service for ``name``, created on first use."""
+    with _services_lock:
+        if name not in _services:
+            _services[name] = RerankerService(name)
+        return _services[name]
@@ -0,0 +1,170 @@
+"""Loading the RAG index and embedding model outside of Streamlit.
+
+The app wraps ``load_index`` in ``st.cache_resource``; offline tools (the
+benchmark) call it directly.  A current index bundle (``askads.bundle``)
+is served memory-mapped; otherwise the individual artifacts are loaded.
+"""
+from pathlib import Path
+
+import chromadb
+import numpy as np
+from chromadb.utils import embedding_functions
+
+from askads.bundle import open_bundle
+from askads.config import (
+    BUNDLE_ENABLED, BUNDLE_PATH, DENSE_BACKEND, FAISS_PATH, META_PATH, META_STORE_DIR, SENT_INDEX_DIR,
+    SPARSE_INDEX_DIR,
+)
+from askads.corpus import doc_text
+from askads.dense import ChromaDense, FaissDense, check_consistency
+from askads.meta_store import MetaStore, load_meta_store
+from askads.models import load_embedder
+from askads.sentence_index import SentenceIndex
+from askads.sparse_index import fit_tfidf, load_sparse_index
+
+
+# E5 Embedder class for ChromaDB
+class E5Embedder(embedding_functions.EmbeddingFunction):
+    def __init__(self, model):
+        self.model = model
+    
+    def __call__(self, input: list[str]) -> list[list[float]]:
+        v = self.model.encode(["passage: " + x for x in input],
+                             normalize_embeddings=True, convert_to_numpy=True)
+        return v.tolist()
+
+
+def load_passage_embeddings(id_order, id_to_meta, collection, model, faiss_dense=None):
+    """Load stored passage embeddings as a matrix whose rows follow id_order."""
+    emb = None
+    if faiss_dense is not None and faiss_dense.count() == len(id_order):
+        emb = faiss_dense.vectors()
+    
+    missing = []
+    if emb is None:
+        # Fall back to the vectors stored in the Chroma collection
+        emb = np.zeros((len(id_order), model.get_sentence_embedding_dimension()), dtype=np.float32)
+        got = collection.get(ids=list(id_order), include=["embeddings"])
+        stored = got.get("embeddings")
+        row_of = {did: i for i, did in enumerate(got["ids"])}
+        for r, did in enumerate(id_order):
+            i = row_of.get(did)
+            if i is None or stored is None:
+                missing.append(r)
+            else:
+                emb[r] = stored[i]
+    
+    # Encode whatever is not stored anywhere, once, at load time
+    if missing:
+        texts = ["passage: " + id_to_meta[id_order[r]].get("text", "") for r in missing]
+        emb[missing] = model.encode(texts, batch_size=64, normalize_embeddings=True, convert_to_numpy=True)
+    
+    id_to_row = {did: i for i, did in enumerate(id_order)}
+    return emb, id_to_row
+
+
+def open_collection(chroma_dir: Path, model):
+    """The msads_e5 Chroma collection, created if missing."""
+    chroma_dir.mkdir(parents=True, exist_ok=True)
+    client = chromadb.PersistentClient(path=str(chroma_dir))
+    return client.get_or_create_collection(
+        name="msads_e5",
+        metadata={"hnsw:space": "cosine"},
+        embedding_function=E5Embedder(model)
+    )
+
+
+def load_from_bundle(bundle, chroma_dir: Path, model):
+    """load_index's result served from the memory-mapped index bundle."""
+    meta = bundle.meta_store()
+    id_order = meta.ids
+    tfidf, _X, bm25 = bundle.sparse_index()
+    emb = bundle.vectors()
+    id_to_row = {did: i for i, did in enumerate(id_order)}
+    
+    # Chroma is only opened when it is the selected backend
+    collection, problems = None, []
+    if DENSE_BACKEND == "chroma":
+        collection = open_collection(chroma_dir, model)
+        dense = ChromaDense(collection)
+        problems += check_consistency(id_order, None, collection)
+    else:
+        dense = FaissDense(None, id_order, matrix=emb)
+    return collection, dense, problems, meta, id_order, model, tfidf, bm25, emb, id_to_row
+
+
+def open_index_bundle(model_name: str):
+    """(bundle, problem) for the configured index bundle; (None, None) if it is disabled or absent.
+    
+    Open it once and pass the pair to both load_index and load_sentence_index.
+    """
+    return open_bundle(BUNDLE_PATH, model_name, META_PATH) if BUNDLE_ENABLED else (None, None)
+
+
+def load_sentence_index(model_name: str, sent_dir: Path = SENT_INDEX_DIR, opened_bundle=None):
+    """The sentence index from the index bundle if it has one, else from sent_dir (None if neither)."""
+    bundle, _problem = opened_bundle or open_index_bundle(model_name)
+    sent_index = bundle.sentence_index() if bundle is not None else None
+    return sent_index if sent_index is not None else SentenceIndex.open(sent_dir, model_name)
+
+
+def load_index(chroma_dir: Path, embed_model_name: str, opened_bundle=None):
+    """Load ChromaDB collection, dense backend, metadata store, embedding model, passage embeddings, and TF-IDF vectorizer.
+    
+    opened_bundle is open_index_bundle's result, if the caller already has it.
+    """
+    # Load embedding model
+    model = load_embedder(embed_model_name)
+    
+    # Packed index bundle: everything memory-mapped from one file
+    bundle, problem = opened_bundle or open_index_bundle(embed_model_name)
+    if bundle is not None:
+        return load_from_bundle(bundle, chroma_dir, model)
+    
+    if not chroma_dir.exists():
+        raise FileNotFoundError(
+            f"Missing ChromaDB directory. "
+            f"Ensure {chroma_dir} exists in the rag_index/ folder."
+        )
+    
+    # Setup ChromaDB
+    collection = open_collection(chroma_dir, model)
+    
+    # Chunk metadata: memory-mapped columns and text blob (rebuilt if meta.jsonl changed)
+    if META_PATH.exists():
+        meta = load_meta_store(META_STORE_DIR, META_PATH)
+    else:
+        # Build from ChromaDB if meta.jsonl doesn't exist
+        all_data = collection.get(include=["metadatas", "documents", "ids"])
+        metas = all_data["metadatas"] or [{}] * len(all_data["ids"])
+        docs = all_data["documents"] or [""] * len(all_data["ids"])
+        meta = MetaStore.from_records(dict(m or {}, text=d, _id=did)
+                                      for did, m, d in zip(all_data["ids"], metas, docs))
+    id_order = meta.ids
+    
+    # TF-IDF vocabulary + BM25 postings: memory-map the prebuilt index (rebuilt if meta.jsonl changed)
+    if META_PATH.exists():
+        tfidf, _X, bm25 = load_sparse_index(SPARSE_INDEX_DIR, META_PATH)
+    else:
+        tfidf, _X, bm25 = fit_tfidf([doc_text(m) for m in meta.records()])
+    
+    # FAISS index rows follow meta.jsonl, so it is only usable alongside it
+    faiss_dense = None
+    problems = [problem] if problem else []
+    if FAISS_PATH.exists() and META_PATH.exists():
+        try:
+            faiss_dense = FaissDense(FAISS_PATH, id_order)
+        except (OSError, ValueError, RuntimeError) as e:
+            problems.append(f"FAISS index could not be loaded: {e}")
+    problems += check_consistency(id_order, faiss_dense, collection)
+    
+    # Dense backend selected by ASKADS_DENSE_BACKEND (faiss or chroma)
+    if DENSE_BACKEND == "faiss" and faiss_dense is not None and faiss_dense.count() == len(id_order):
+        dense = faiss_dense
+    else:
+        dense = ChromaDense(collection)
+    
+    # Passage embeddings, addressable by id through id_to_row
+    emb, id_to_row = load_passage_embeddings(id_order, meta, collection, model, faiss_dense)
+    
+    return collection, dense, problems, meta, id_order, model, tfidf, bm25, emb, id_to_row
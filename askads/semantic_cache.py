@@ -0,0 +1,191 @@
+"""Semantic answer cache: reuse answers of past questions with a similar E5 query vector.
+
+A lookup is a single matrix-vector product against the vectors of cached
+questions, held in a matrix preallocated to ``max_items`` rows (the oldest
+entries are evicted first; entries older than ``ttl`` seconds expire).  The
+best match above ``threshold`` (cosine) is returned only if it was produced
+with the same retrieval/generation settings and every chunk it was answered
+from still has the same ``sha256``; otherwise the entry is dropped.  Entries are mirrored to a SQLite table so they survive restarts
+and are shared by workers on one host.
+"""
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+
+class SemanticCache:
+    """Past (query vector -> answer, sources) pairs with cosine-threshold lookup."""
+
+    def __init__(self, dim: int, threshold: float = 0.92, max_items: int = 2000,
+                 path: Path | None = None, near_miss_margin: float = 0.03, ttl: float | None = None):
+        self.dim = dim
+        self.threshold = threshold
+        self.max_items = max_items
+        self.near_miss_margin = near_miss_margin
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._rowids: list[int] = []
+        self._entries: list[dict] = []
+        self._created: list[float] = []
+        # Preallocated; rows [0, len(self._entries)) are live, oldest first
+        self._vecs = np.zeros((max_items, dim), dtype=np.float32)
+        self._last_rowid = 0
+        self._next_local = -1
+        self._conn = None
+        self.lookups = self.hits = self.invalidations = self.near_misses = 0
+        self._hit_sim_total = 0.0
+        if path is not None:
+            path = Path(path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(path), timeout=10, check_same_thread=False,
+                                         isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS semantic_cache ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, params TEXT NOT NULL,"
+                " vec BLOB NOT NULL, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            if ttl is not None:
+                self._conn.execute("DELETE FROM semantic_cache WHERE created < ?", (time.time() - ttl,))
+            self._refresh()
+
+    def _cutoff(self) -> float:
+        return time.time() - self.ttl if self.ttl is not None else float("-inf")
+
+    def _extend(self, items: list[tuple[int, np.ndarray, dict, float]]):
+        """Append (rowid, vec, entry, created) items, evicting the oldest beyond max_items."""
+        overflow = len(self._entries) + len(items) - self.max_items
+        if overflow > 0:
+            dropped = min(overflow, len(self._entries))
+            self._drop_front(dropped)
+            # Whatever remains is the oldest part of the new batch itself
+            skip = overflow - dropped
+            self._delete_rows([r for r, *_ in items[:skip]])
+            items = items[skip:]
+        if not items:
+            return
+        n = len(self._entries)
+        self._vecs[n:n + len(items)] = np.stack([v for _, v, _, _ in items])
+        for rowid, _, entry, created in items:
+            self._rowids.append(rowid)
+            self._entries.append(entry)
+            self._created.append(created)
+
+    def _refresh(self):
+        """Pull unexpired entries written by other workers since the last refresh."""
+        if self._conn is None:
+            return
+        rows = self._conn.execute(
+            "SELECT id, params, vec, value, created FROM semantic_cache WHERE id > ? AND created >= ? ORDER BY id",
+            (self._last_rowid, self._cutoff())
+        ).fetchall()
+        items = []
+        for rowid, params, vec, value, created in rows:
+            v = np.frombuffer(vec, dtype=np.float32)
+            if v.shape[0] == self.dim:
+                entry = json.loads(value)
+                entry["params"] = params
+                items.append((rowid, v, entry, created))
+            self._last_rowid = rowid
+        self._extend(items)
+
+    def _delete_rows(self, rowids: list[int]):
+        if self._conn is not None:
+            self._conn.executemany("DELETE FROM semantic_cache WHERE id = ?", [(r,) for r in rowids if r > 0])
+
+    def _drop_front(self, count: int):
+        """Evict the count oldest entries."""
+        if count <= 0:
+            return
+        n = len(self._entries)
+        dropped = self._rowids[:count]
+        del self._rowids[:count], self._entries[:count], self._created[:count]
+        self._vecs[:n - count] = self._vecs[count:n]
+        self._delete_rows(dropped)
+
+    def _expire(self):
+        """Evict entries older than ttl (entries are kept in insertion order)."""
+        cutoff = self._cutoff()
+        count = 0
+        while count < len(self._created) and self._created[count] < cutoff:
+            count += 1
+        self._drop_front(count)
+
+    def _remove(self, i: int):
+        n = len(self._entries)
+        rowid = self._rowids.pop(i)
+        self._entries.pop(i)
+        self._created.pop(i)
+        self._vecs[i:n - 1] = self._vecs[i + 1:n]
+        self._delete_rows([rowid])
+
+    def lookup(self, q_vec: np.ndarray, params: str, current_sha) -> dict | None:
+        """Best cached entry for q_vec under params, or None.
+
+        current_sha(chunk_id) returns the chunk's current sha256 (None if gone);
+        entries answered from changed chunks are invalidated.
+        """
+        with self._lock:
+            try:
+                # Memory is pruned before the SQLite delete, so a failure leaves no stale entries
+                self._expire()
+                self._refresh()
+            except sqlite3.Error:
+                pass
+            self.lookups += 1
+            if not self._entries:
+                return None
+            sims = self._vecs[:len(self._entries)] @ np.asarray(q_vec, dtype=np.float32)
+            same = np.array([e["params"] == params for e in self._entries])
+            sims = np.where(same, sims, -np.inf)
+            i = int(np.argmax(sims))
+            best = float(sims[i])
+            if best < self.threshold:
+                if best >= self.threshold - self.near_miss_margin:
+                    self.near_misses += 1
+                return None
+            entry = self._entries[i]
+            if any(current_sha(cid) != sha for cid, sha in entry["chunks"].items()):
+                self.invalidations += 1
+                self._remove(i)
+                return None
+            self.hits += 1
+            self._hit_sim_total += best
+            return dict(entry, similarity=best)
+
+    def add(self, q_vec: np.ndarray, params: str, answer: str, sources: list, chunks: dict):
+        """Cache an answer; chunks maps each chunk id it used to that chunk's sha256."""
+        vec = np.asarray(q_vec, dtype=np.float32).ravel()
+        entry = {"answer": answer, "sources": sources, "chunks": chunks}
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    self._conn.execute(
+                        "INSERT INTO semantic_cache (params, vec, value, created) VALUES (?, ?, ?, ?)",
+                        (params, vec.tobytes(), json.dumps(entry, ensure_ascii=False), time.time())
+                    )
+                    # Picks up our row along with anything other workers wrote
+                    self._refresh()
+                    return
+                except sqlite3.Error:
+                    pass  # fall back to a memory-only entry
+            self._extend([(self._next_local, vec, dict(entry, params=params), time.time())])
+            self._next_local -= 1
+
+    def stats(self) -> dict:
+        misses = self.lookups - self.hits
+        return {
+            "entries": len(self._entries),
+            "threshold": self.threshold,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "misses": misses,
+            "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+            "mean_hit_similarity": self._hit_sim_total / self.hits if self.hits else 0.0,
+            "near_misses": self.near_misses,
+            "invalidations": self.invalidations,
+        }
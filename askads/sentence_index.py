@@ -0,0 +1,192 @@
+"""Offline sentence-level embedding index used for context compression.
+
+For every chunk in meta.jsonl the index stores the character spans of its
+sentences and their normalized E5 "passage:" vectors.  Vectors live in one
+float16 matrix that is memory-mapped at load time; spans, row offsets and
+the chunk ``sha256`` live in ``index.json``.  Rebuilding only re-encodes
+chunks whose ``sha256`` changed.
+
+Each build writes its matrix under a new, content-addressed name
+(``vectors-<sha256 prefix>.f16``) and then atomically replaces ``index.json``,
+which names the matrix it goes with; the index and its vectors therefore
+always change together.  The previous matrix is kept for readers that are
+still opening it, older ones are removed.
+
+Build with::
+
+    python -m askads.sentence_index --meta rag_index/meta.jsonl --out rag_index/sentences
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+
+import numpy as np
+
+from askads.config import EMBED_MODEL_NAME, META_PATH, SENT_INDEX_DIR
+from askads.corpus import iter_meta
+
+INDEX_VERSION = 1
+INDEX_FILE = "index.json"
+VECTORS_FILE = "vectors.f16"
+
+SENT_SPLIT = re.compile(r'(?<=[\.\?!])\s+(?=[A-Z0-9])')
+
+
+def sentence_spans(text: str) -> list[tuple[int, int]]:
+    """Character spans of the stripped, non-empty sentences of text."""
+    text = text or ""
+    body = text.strip()
+    base = len(text) - len(text.lstrip())
+    cuts, start = [], 0
+    for m in SENT_SPLIT.finditer(body):
+        cuts.append((start, m.start()))
+        start = m.end()
+    cuts.append((start, len(body)))
+    spans = []
+    for a, b in cuts:
+        seg = body[a:b]
+        if not seg.strip():
+            continue
+        lead = len(seg) - len(seg.lstrip())
+        trail = len(seg) - len(seg.rstrip())
+        spans.append((base + a + lead, base + b - trail))
+    return spans
+
+
+def split_sentences(text: str) -> list[str]:
+    """Split text into stripped, non-empty sentences."""
+    return [text[a:b] for a, b in sentence_spans(text)]
+
+
+class SentenceIndex:
+    """Memory-mapped sentence vectors addressable by chunk id."""
+
+    def __init__(self, index_dir: Path):
+        index_dir = Path(index_dir)
+        with open(index_dir / INDEX_FILE, "r", encoding="utf-8") as f:
+            info = json.load(f)
+        count, dim = int(info.get("count", 0)), int(info.get("dim", 0))
+        if count:
+            path = index_dir / info.get("vectors", VECTORS_FILE)
+            if path.stat().st_size != count * dim * 2:
+                raise ValueError(f"{path} does not match {INDEX_FILE} ({count} x {dim} float16)")
+            vectors = np.memmap(path, dtype=np.float16, mode="r", shape=(count, dim))
+        else:
+            vectors = np.zeros((0, dim), dtype=np.float16)
+        self._setup(info, vectors)
+
+    @classmethod
+    def from_parts(cls, info: dict, vectors: np.ndarray):
+        """An index over an already loaded index.json and vector matrix (the index bundle)."""
+        idx = cls.__new__(cls)
+        idx._setup(info, vectors)
+        return idx
+
+    def _setup(self, info: dict, vectors: np.ndarray):
+        if info.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported sentence index version: {info.get('version')}")
+        self.model_name = info["model"]
+        self.dim = int(info["dim"])
+        self.count = int(info["count"])
+        self.chunks = info["chunks"]
+        self.vectors_file = info.get("vectors", VECTORS_FILE)
+        self.vectors = vectors
+
+    @classmethod
+    def open(cls, index_dir: Path, model_name: str | None = None):
+        """Open the index if it exists (and was built with model_name), else return None."""
+        if not (Path(index_dir) / INDEX_FILE).exists():
+            return None
+        idx = cls(index_dir)
+        if model_name and idx.model_name != model_name:
+            return None
+        return idx
+
+    def lookup(self, doc_id: str, sha256: str | None = None):
+        """Return (spans, float16 vectors) for a chunk, or None if absent or stale."""
+        entry = self.chunks.get(doc_id)
+        if entry is None or (sha256 and entry["sha256"] != sha256):
+            return None
+        row, spans = entry["row"], entry["spans"]
+        return spans, self.vectors[row:row + len(spans)]
+
+    def __len__(self):
+        return len(self.chunks)
+
+
+def build_sentence_index(meta_path: Path, out_dir: Path, model, model_name: str,
+                         batch_size: int = 128) -> dict:
+    """Build or incrementally refresh the sentence index for meta_path."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    old = SentenceIndex.open(out_dir, model_name)
+    dim = model.get_sentence_embedding_dimension()
+
+    # Plan rows: reuse vectors of unchanged chunks, queue the rest for encoding
+    chunks, reuse, todo = {}, [], []
+    row = 0
+    n_reused = n_encoded = 0
+    for m in iter_meta(meta_path):
+        doc_id, text = m.get("id"), m.get("text", "") or ""
+        sha = m.get("sha256", "")
+        spans = sentence_spans(text)
+        chunks[doc_id] = {"sha256": sha, "row": row, "spans": [list(s) for s in spans]}
+        prev = old.chunks.get(doc_id) if old else None
+        if prev and sha and prev["sha256"] == sha and len(prev["spans"]) == len(spans):
+            reuse.append((row, prev["row"], len(spans)))
+            n_reused += 1
+        else:
+            todo.extend((row + j, text[a:b]) for j, (a, b) in enumerate(spans))
+            n_encoded += 1
+        row += len(spans)
+
+    vectors = np.zeros((row, dim), dtype=np.float16)
+    for dst, src, n in reuse:
+        vectors[dst:dst + n] = old.vectors[src:src + n]
+    for i in range(0, len(todo), batch_size):
+        batch = todo[i:i + batch_size]
+        v = model.encode(["passage: " + s for _, s in batch], batch_size=batch_size,
+                         normalize_embeddings=True, convert_to_numpy=True)
+        vectors[[r for r, _ in batch]] = v.astype(np.float16)
+    previous = old.vectors_file if old else None
+    del old
+
+    # New vectors go under a new name; swapping index.json in then switches both at once
+    data = vectors.tobytes()
+    vec_name = f"vectors-{hashlib.sha256(data).hexdigest()[:16]}.f16"
+    tmp_vec = out_dir / (vec_name + ".tmp")
+    tmp_idx = out_dir / (INDEX_FILE + ".tmp")
+    with open(tmp_vec, "wb") as f:
+        f.write(data)
+    os.replace(tmp_vec, out_dir / vec_name)
+    with open(tmp_idx, "w", encoding="utf-8") as f:
+        json.dump({"version": INDEX_VERSION, "model": model_name, "dim": dim,
+                   "count": row, "vectors": vec_name, "chunks": chunks}, f)
+    os.replace(tmp_idx, out_dir / INDEX_FILE)
+    for path in out_dir.glob("vectors*.f16"):
+        if path.name not in (vec_name, previous):
+            path.unlink(missing_ok=True)
+
+    return {"chunks": len(chunks), "reused_chunks": n_reused, "encoded_chunks": n_encoded,
+            "encoded_sentences": len(todo), "sentences": row}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Build the sentence-level embedding index.")
+    ap.add_argument("--meta", type=Path, default=META_PATH)
+    ap.add_argument("--out", type=Path, default=SENT_INDEX_DIR)
+    ap.add_argument("--model", default=EMBED_MODEL_NAME)
+    ap.add_argument("--batch-size", type=int, default=128)
+    args = ap.parse_args(argv)
+
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(args.model)
+    stats = build_sentence_index(args.meta, args.out, model, args.model, batch_size=args.batch_size)
+    print(json.dumps(stats))
+
+
+if __name__ == "__main__":
+    main()
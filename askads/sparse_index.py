@@ -0,0 +1,125 @@
+"""Prebuilt sparse index (TF-IDF vocabulary + BM25 postings) persisted next to meta.jsonl.
+
+The fitted vocabulary and IDF weights go to ``tfidf.json``; the CSR matrix
+``X`` and the BM25 postings lists are stored as raw ``.npy`` arrays so they
+can be memory-mapped instead of refit on every process start.  ``tfidf.json`` records the
+fingerprint of the meta.jsonl it was built from; a mismatch means the index
+is stale and is rebuilt.
+
+Build with::
+
+    python -m askads.sparse_index --meta rag_index/meta.jsonl --out rag_index/sparse
+"""
+import argparse
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from askads.bm25 import B, K1, BM25Index
+from askads.config import META_PATH, SPARSE_INDEX_DIR
+from askads.corpus import doc_text, iter_meta, meta_fingerprint
+
+INDEX_VERSION = 2
+INDEX_FILE = "tfidf.json"
+TFIDF_PARAMS = {"max_df": 0.9, "min_df": 2, "ngram_range": (1, 2)}
+
+
+BM25_ARRAYS = ("indptr", "docs", "weights")
+
+
+def fit_tfidf(doc_texts: list[str]):
+    """Fit the TF-IDF vectorizer and the BM25 postings over its vocabulary."""
+    tfidf = TfidfVectorizer(**TFIDF_PARAMS)
+    X = tfidf.fit_transform(doc_texts)
+    bm25 = BM25Index.from_texts(doc_texts, tfidf.vocabulary_, ngram_range=TFIDF_PARAMS["ngram_range"])
+    return tfidf, X.tocsr(), bm25
+
+
+def save_sparse_index(out_dir: Path, tfidf, X, bm25: BM25Index, fingerprint: str):
+    """Write vocabulary, IDF weights, the CSR matrix and BM25 postings to out_dir."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for name in ("data", "indices", "indptr"):
+        np.save(out_dir / f"X_{name}.npy", getattr(X, name))
+    for name in BM25_ARRAYS:
+        np.save(out_dir / f"bm25_{name}.npy", getattr(bm25, name))
+    info = {
+        "version": INDEX_VERSION,
+        "fingerprint": fingerprint,
+        "shape": list(X.shape),
+        "bm25": {"k1": K1, "b": B},
+        "params": {k: list(v) if isinstance(v, tuple) else v for k, v in TFIDF_PARAMS.items()},
+        "vocabulary": {t: int(i) for t, i in tfidf.vocabulary_.items()},
+        "idf": tfidf.idf_.tolist(),
+    }
+    tmp = out_dir / (INDEX_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(info, f)
+    # The json is written last, so a reader never pairs it with old arrays
+    os.replace(tmp, out_dir / INDEX_FILE)
+
+
+def read_sparse_index(out_dir: Path, fingerprint: str | None = None):
+    """Load (tfidf, X, bm25) memory-mapped; None if missing, stale or unreadable."""
+    out_dir = Path(out_dir)
+    try:
+        with open(out_dir / INDEX_FILE, "r", encoding="utf-8") as f:
+            info = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if info.get("version") != INDEX_VERSION:
+        return None
+    if fingerprint is not None and info.get("fingerprint") != fingerprint:
+        return None
+    try:
+        arrays = [np.load(out_dir / f"X_{name}.npy", mmap_mode="r") for name in ("data", "indices", "indptr")]
+        postings = [np.load(out_dir / f"bm25_{name}.npy", mmap_mode="r") for name in BM25_ARRAYS]
+    except (OSError, ValueError):
+        return None
+    X = sparse.csr_matrix(tuple(arrays), shape=tuple(info["shape"]), copy=False)
+    bm25 = BM25Index(*postings, n_docs=info["shape"][0])
+
+    params = {k: tuple(v) if isinstance(v, list) else v for k, v in info["params"].items()}
+    tfidf = TfidfVectorizer(**params)
+    tfidf.vocabulary_ = info["vocabulary"]
+    tfidf.idf_ = np.asarray(info["idf"], dtype=np.float64)
+    return tfidf, X, bm25
+
+
+def load_sparse_index(out_dir: Path, meta_path: Path):
+    """Open the sparse index for meta_path, rebuilding it first if missing or stale."""
+    fingerprint = meta_fingerprint(meta_path)
+    found = read_sparse_index(out_dir, fingerprint)
+    if found is not None:
+        return found
+    tfidf, X, bm25 = fit_tfidf([doc_text(m) for m in iter_meta(meta_path)])
+    try:
+        save_sparse_index(out_dir, tfidf, X, bm25, fingerprint)
+    except OSError:
+        pass  # read-only deploy: keep the freshly fitted index in memory
+    return tfidf, X, bm25
+
+
+def build_sparse_index(meta_path: Path, out_dir: Path) -> dict:
+    """Fit and persist the sparse index for meta_path."""
+    fingerprint = meta_fingerprint(meta_path)
+    tfidf, X, bm25 = fit_tfidf([doc_text(m) for m in iter_meta(meta_path)])
+    save_sparse_index(out_dir, tfidf, X, bm25, fingerprint)
+    return {"docs": X.shape[0], "terms": X.shape[1], "nnz": int(X.nnz),
+            "postings": int(len(bm25.docs)), "fingerprint": fingerprint}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Build the persisted TF-IDF / BM25 sparse index.")
+    ap.add_argument("--meta", type=Path, default=META_PATH)
+    ap.add_argument("--out", type=Path, default=SPARSE_INDEX_DIR)
+    args = ap.parse_args(argv)
+    print(json.dumps(build_sparse_index(args.meta, args.out)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Per-stage wall-clock timings for one request, safe to record from worker threads.
+
+Stages can carry attributes (candidate counts and the like): ``stage`` yields
+a dict the caller may fill in.  Request-wide totals such as token counts go
+through ``add``.  Passing ``timer=None`` turns all of it into no-ops.
+"""
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+
+class StageTimer:
+    """Records (stage, start, end) offsets in milliseconds from the timer's creation."""
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.records = []
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str, **attrs):
+        start = time.perf_counter()
+        try:
+            yield attrs
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self.records.append({
+                    "stage": name,
+                    "start_ms": (start - self.t0) * 1000,
+                    "end_ms": (end - self.t0) * 1000,
+                    "ms": (end - start) * 1000,
+                    "thread": threading.current_thread().name,
+                    "attrs": attrs,
+                })
+
+    def mark(self, name: str):
+        """Record an instantaneous event (e.g. the first streamed token)."""
+        now = (time.perf_counter() - self.t0) * 1000
+        with self._lock:
+            self.records.append({"stage": name, "start_ms": now, "end_ms": now, "ms": 0.0,
+                                 "thread": threading.current_thread().name, "attrs": {}})
+
+    def share(self, other: "StageTimer", start: int, n: int):
+        """Record a 1/n share of every stage other recorded from index start on (work batched over n requests)."""
+        offset = (other.t0 - self.t0) * 1000
+        with other._lock:
+            shared = other.records[start:]
+        with self._lock:
+            for r in shared:
+                self.records.append(dict(r, start_ms=r["start_ms"] + offset, end_ms=r["end_ms"] + offset,
+                                         ms=r["ms"] / n, attrs=dict(r["attrs"], shared_by=n)))
+
+    def add(self, name: str, n: int = 1):
+        """Add n to a request-wide counter (e.g. prompt tokens)."""
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def summary(self) -> dict:
+        """Total milliseconds per stage name (summed if a stage ran several times)."""
+        out = {}
+        for r in self.records:
+            out[r["stage"]] = out.get(r["stage"], 0.0) + r["ms"]
+        return out
+
+    def timeline(self) -> list[dict]:
+        """Records ordered by start time; overlapping rows ran concurrently."""
+        return sorted(self.records, key=lambda r: r["start_ms"])
+
+    def wall_ms(self) -> float:
+        """Span from the first stage start to the last stage end (the critical path length)."""
+        if not self.records:
+            return 0.0
+        return max(r["end_ms"] for r in self.records) - min(r["start_ms"] for r in self.records)
+
+
+def stage(timer: StageTimer | None, name: str, **attrs):
+    """timer.stage(name), or a no-op context (yielding a scratch dict) when timing is off."""
+    return timer.stage(name, **attrs) if timer is not None else nullcontext(attrs)
+
+
+def add(timer: StageTimer | None, name: str, n: int = 1):
+    """timer.add(name, n), or nothing when timing is off."""
+    if timer is not None:
+        timer.add(name, n)
@@ -0,0 +1,75 @@
+"""Per-request traces: stage spans, candidate/token counts and one JSON log line.
+
+``RequestTrace`` is a StageTimer with a request id and request-level
+attributes (cache outcome, fallback use, ...).  ``emit`` writes the whole
+trace as a single JSON line on the ``askads.trace`` logger.  When tracing is
+disabled, ``new_trace`` returns None and every ``stage``/``add`` call in the
+pipeline degrades to a no-op.
+"""
+import json
+import logging
+import time
+import uuid
+
+from askads.timing import StageTimer
+
+trace_logger = logging.getLogger("askads.trace")
+
+
+class RequestTrace(StageTimer):
+    """Timings, counts and attributes of one chat turn."""
+
+    def __init__(self, request_id: str | None = None, **attrs):
+        super().__init__()
+        self.request_id = request_id or uuid.uuid4().hex[:12]
+        self.started_at = time.time()
+        self.attrs = dict(attrs)
+
+    def set(self, **attrs):
+        """Attach request-level attributes."""
+        with self._lock:
+            self.attrs.update(attrs)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            records = list(self.records)
+            counts = dict(self.counts)
+            attrs = dict(self.attrs)
+        total_ms = (time.perf_counter() - self.t0) * 1000
+        return {
+            "request_id": self.request_id,
+            "ts": round(self.started_at, 3),
+            "total_ms": round(total_ms, 2),
+            "wall_ms": round(self.wall_ms(), 2),
+            "stage_ms": {k: round(v, 2) for k, v in self.summary().items()},
+            "counts": counts,
+            "attrs": attrs,
+            "spans": [
+                {"stage": r["stage"], "start_ms": round(r["start_ms"], 2), "ms": round(r["ms"], 2),
+                 "thread": r["thread"], **r["attrs"]}
+                for r in sorted(records, key=lambda r: r["start_ms"])
+            ],
+        }
+
+    def emit(self, log: bool = True) -> dict:
+        """Log the trace as one JSON line (unless log is False) and return it."""
+        data = self.to_dict()
+        if log and trace_logger.isEnabledFor(logging.INFO):
+            trace_logger.info(json.dumps(data, ensure_ascii=False, default=str))
+        return data
+
+
+def new_trace(enabled: bool, **attrs) -> RequestTrace | None:
+    """A fresh trace, or None (no-op instrumentation) when tracing is off."""
+    return RequestTrace(**attrs) if enabled else None
+
+
+def configure_trace_logging(path=None):
+    """Send trace lines to stderr, or append them to ``path``; safe to call on every rerun."""
+    if trace_logger.handlers:
+        return
+    handler = logging.FileHandler(path, encoding="utf-8") if path else logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    trace_logger.addHandler(handler)
+    trace_logger.setLevel(logging.INFO)
+    trace_logger.propagate = False
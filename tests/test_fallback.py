@@ -0,0 +1,82 @@
+"""The speculative and merged fallback modes against sequential, on a small synthetic index."""
+import hashlib
+import re
+
+import numpy as np
+import pytest
+
+from askads import pipeline
+from askads.dense import FaissDense
+from askads.pipeline import make_query_context, make_query_contexts, augment_query, retrieve_with_fallback
+from askads.sparse_index import fit_tfidf
+
+DIM = 64
+QUESTION = "Who won the award at the research showcase?"
+
+
+class BagOfWordsModel:
+    """Deterministic encoder: normalized sum of hashed word vectors, so shared words mean similarity."""
+
+    def get_sentence_embedding_dimension(self):
+        return DIM
+
+    def encode(self, texts, **kw):
+        out = np.zeros((len(texts), DIM), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for w in re.findall(r"\w+", text.lower()):
+                seed = int(hashlib.md5(w.encode()).hexdigest()[:8], 16)
+                out[i] += np.random.default_rng(seed).normal(size=DIM)
+            out[i] /= np.linalg.norm(out[i]) or 1.0
+        return out
+
+
+class ReverseReranker:
+    """Scores pairs in reverse of the order given (the MMR order)."""
+
+    def score_cached(self, keys, pairs, timeout=None):
+        return [float(i) for i in range(len(pairs))]
+
+
+@pytest.fixture
+def index(monkeypatch):
+    docs = []
+    for i in range(14):
+        docs.append({"id": f"news-{i}", "url": f"https://x/news-events/news/{i}/", "section": "news-events",
+                     "text": f"Story {i}: who won the award at the research showcase, student {i} and team {i}."})
+    for i in range(8):
+        docs.append({"id": f"edu-{i}", "url": f"https://x/education/masters-programs/ms-in-applied-data-science/{i}/",
+                     "section": "education",
+                     "text": f"Page {i} of the MS in Applied Data Science program: admissions, curriculum {i}."})
+    model = BagOfWordsModel()
+    id_order = [d["id"] for d in docs]
+    id_to_meta = {d["id"]: dict(d, _id=d["id"], sha256=d["id"]) for d in docs}
+    emb = model.encode(["passage: " + d["text"] for d in docs])
+    tfidf, _X, bm25 = fit_tfidf([d["text"] for d in docs])
+    dense = FaissDense(None, id_order, matrix=emb)
+    monkeypatch.setattr(pipeline, "get_reranker", lambda *a, **kw: ReverseReranker())
+    return dense, id_to_meta, id_order, model, bm25, emb, {d: i for i, d in enumerate(id_order)}, tfidf
+
+
+def run(index, mode, use_reranker=True, k=3, shortlist=5):
+    *args, tfidf = index
+    model = args[3]
+    if mode == "sequential":
+        qctx, aug = make_query_context(QUESTION, model, tfidf), None
+    else:
+        qctx, aug = make_query_contexts([QUESTION, augment_query(QUESTION)], model, tfidf)
+    hits, used = retrieve_with_fallback(qctx, *args, k=k, shortlist=shortlist, use_reranker=use_reranker,
+                                        tfidf=tfidf, aug_qctx=aug, mode=mode)
+    return [h["_id"] for h in hits], used
+
+
+def test_speculative_matches_sequential_on_fallback(index):
+    sequential = run(index, "sequential")
+    assert sequential[1] is True
+    assert run(index, "speculative") == sequential
+    # The rerank picks beyond MMR's first k, which a rerank of only those k would miss
+    assert set(sequential[0]) != set(run(index, "sequential", use_reranker=False)[0])
+
+
+def test_merged_reports_fallback(index):
+    _hits, used = run(index, "merged")
+    assert used is True